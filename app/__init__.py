@@ -53,30 +53,17 @@ def create_app(config_class=DevConfig):
         }
 
         # ---- optional game branding ----
-        brand_icon = "icons/apple-touch-icon.png"
-        brand_icon_alt = "Geo Clue Game"
-        navbar_color = "#0d6efd"
-
-        from app.main.routes import get_active_team
+        from app.main.routes import DEFAULT_BRANDING, get_active_team, get_branding_context
+        branding = DEFAULT_BRANDING
         try:
             if current_user.is_authenticated:
                 team = get_active_team(current_user)
-                if team and team.game:
-                    game = team.game
-                    if game.data:
-                        branding = game.data.get("branding", {})
-                        brand_icon = branding.get("icon_url", brand_icon)
-                        brand_icon_alt = branding.get("icon_alt", brand_icon_alt)
-                        navbar_color=branding.get("navbar_color", navbar_color)
+                branding = get_branding_context(team.game if team else None)
         except Exception:
             # Context processors must NEVER break rendering
             pass
 
-        context.update({
-            "brand_icon": brand_icon,
-            "brand_icon_alt": brand_icon_alt,
-            "navbar_color": navbar_color
-        })
+        context.update(branding)
 
         return context
     
@@ -98,9 +85,26 @@ def create_app(config_class=DevConfig):
         from app.admin.admin_panel import setup_admin
         setup_admin(app)
 
+        from app import versions  # noqa: F401 -- registers the version bump listeners
+        from app import progress  # noqa: F401 -- registers the team progress listeners
+        from app import users  # noqa: F401 -- registers the user cache invalidation listener
+        from app.events import init_events
+        init_events(app)
+        from app.tracks import init_tracks
+        init_tracks(app)
+
         db.create_all()
         _ensure_gametypes()
 
+        from app.main.spatial import ensure_location_rtree
+        app.extensions['location_rtree'] = ensure_location_rtree(db.engine)
+
+        from app.main.cache import init_tombstone_store
+        init_tombstone_store(app)
+
+        from app.tiles.store import init_tile_proxy
+        init_tile_proxy(app)
+
     return app
 
 
@@ -115,6 +119,6 @@ def _ensure_gametypes():
 
 @login_manager.user_loader
 def load_user(user_id):
-    from app.models import User
+    from app.users import load_user as _load_user
 
-    return User.query.get(int(user_id))
\ No newline at end of file
+    return _load_user(user_id)
\ No newline at end of file
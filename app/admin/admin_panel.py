@@ -1,5 +1,3 @@
-from datetime import datetime
-
 from flask_login import current_user
 from flask import redirect, url_for, request
 from flask_admin import Admin, expose
@@ -154,12 +152,10 @@ class TeamLocationAssignmentAdmin(AdminModelView):
         """
         Called whenever a TeamLocationAssignment is deleted from the admin panel.
         """
-        from app.main.cache import deleted_tombstones, cleanup_tombstones
-
-        cleanup_tombstones()  # remove old entries
+        from app.main.cache import add_tombstone, assignment_tombstone_key
 
-        key = (model.team_id, model.location_id, model.game_id)
-        deleted_tombstones[key] = datetime.utcnow()
+        # Committed together with the delete by Flask-Admin
+        add_tombstone(assignment_tombstone_key(model.team_id, model.location_id, model.game_id))
 
 # =======================================================
 # GAME ADMINISTRATION
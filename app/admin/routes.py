@@ -55,12 +55,19 @@ def load_sample_data():
 @admin_bp.route('/clear')
 @admin_required
 def clear_data():
-    from app.models import db, Location, Character, Team, Game, team_game
+    from app.models import (db, Location, Character, Team, TeamGeofenceState, TeamProgress, TrackChunk, Game,
+                            QRToken, VersionChange, Tombstone, team_game)
     db.session.query(team_game).delete()
+    db.session.query(TeamProgress).delete()
+    db.session.query(TeamGeofenceState).delete()
+    db.session.query(TrackChunk).delete()
     db.session.query(Team).delete()
     db.session.query(Character).delete()
+    db.session.query(QRToken).delete()
     db.session.query(Location).delete()
     db.session.query(Game).delete()
+    db.session.query(VersionChange).delete()
+    db.session.query(Tombstone).delete()
     db.session.commit()
     return "All data cleared."
 
@@ -7,7 +7,7 @@ from sqlalchemy.orm.attributes import flag_modified
 
 from flask import (Blueprint, render_template, redirect, request, jsonify, 
                    url_for,session,abort,
-                   Response,current_app,flash)
+                   Response,current_app,flash,send_file)
 from flask_login import current_user, login_required
 from functools import wraps
 
@@ -15,129 +15,339 @@ from sqlalchemy.orm import Session
 
 from app.models import (Location, Character, Team, Game, User, 
                         TeamMembership,
-                        TeamLocationAssignment,db, team_game)
+                        TeamLocationAssignment, QRToken, db, team_game)
 
 from app.api import api_bp
 
 from app.main import utils
+from app.main import spatial, tile_selector, asset_pack
+from app.versions import bump_versions, changes_since
+from app.progress import get_team_progress, refresh_team_progress
+from app.events import event_stream, get_event_broker, queue_game_event
+from app.geofences import MAX_POSITION_BATCH, evaluate_positions, normalize_positions
+from app.team_geofences import apply_geofence_patch, geofence_changes_since
+from app.route_planner import generate_game_routes
+from app.tracks import flush_tracks, get_track_buffer, parse_samples, read_track, simplify_mask
+from app.tiles.store import (public_tile_template, proxy_enabled, start_game_prefetch,
+                             get_tile_store)
+from app.main.cache import (SingleFlightCache, add_tombstone, find_tombstoned, is_tombstoned,
+                            assignment_tombstone_key, sync_event_tombstone_key)
+
+
+def _set_version_etag(response, etag):
+    response.set_etag(etag)
+    # Clients must revalidate every time; the ETag makes that cheap.
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _not_modified(etag):
+    return _set_version_etag(Response(status=304), etag)
 
 
 def _iso_or_none(value):
     return value.isoformat() if value else None
 
 
-def _get_offline_zoom_levels(game):
-    default_zooms = [14, 15, 16]
-    if not game.data or not isinstance(game.data, dict):
-        return default_zooms
+def _bundle_location_fields(loc):
+    """Game-level (assignment independent) part of a bundle location."""
+    image_url = (
+        url_for('static', filename=f'images/{loc.image_url}')
+        if loc.image_url else None
+    )
+    return {
+        'id': loc.id,
+        'name': loc.name,
+        'lat': float(loc.latitude) if loc.latitude is not None else None,
+        'lon': float(loc.longitude) if loc.longitude is not None else None,
+        'clue_text': loc.clue_text,
+        'image_url': image_url,
+        'show_pin': loc.show_pin,
+    }
 
-    raw_zooms = game.data.get('offline_zooms')
-    if not isinstance(raw_zooms, list):
-        return default_zooms
 
-    zoom_levels = []
-    for zoom in raw_zooms:
-        try:
-            zoom_levels.append(int(zoom))
-        except (TypeError, ValueError):
-            continue
+def _bundle_location(fields, order_index, found, timestamp_found):
+    location = dict(fields)
+    location['order_index'] = order_index
+    location['found'] = found
+    location['timestamp_found'] = _iso_or_none(timestamp_found)
+    return location
 
-    return zoom_levels or default_zooms
 
+def _bundle_character(char):
+    return {
+        'id': char.id,
+        'name': char.name,
+        'bio': char.bio,
+        'dialogue': char.dialogue,
+        'location_id': char.location_id,
+    }
 
-def _build_offline_bundle(game, team):
-    assignments = (
-        TeamLocationAssignment.query
-        .filter_by(game_id=game.id, team_id=team.id)
-        .order_by(TeamLocationAssignment.order_index)
-        .all()
-    )
 
+def _bundle_game(game):
     branding = {}
     if game.data and isinstance(game.data, dict):
         branding = game.data.get('branding', {}) or {}
 
-    locations = []
-    for assignment in assignments:
-        loc = assignment.location
-        image_url = (
-            url_for('static', filename=f'images/{loc.image_url}')
-            if loc.image_url else None
-        )
-        locations.append({
-            'id': loc.id,
-            'order_index': assignment.order_index,
-            'name': loc.name,
-            'lat': float(loc.latitude) if loc.latitude is not None else None,
-            'lon': float(loc.longitude) if loc.longitude is not None else None,
-            'clue_text': loc.clue_text,
-            'image_url': image_url,
-            'show_pin': loc.show_pin,
-            'found': assignment.found,
-            'timestamp_found': _iso_or_none(assignment.timestamp_found),
-        })
+    return {
+        'id': game.id,
+        'name': game.name,
+        'description': game.description,
+        'gametype': game.gametype.name if game.gametype else None,
+        'bounds': {
+            'min_lat': game.min_lat,
+            'max_lat': game.max_lat,
+            'min_lon': game.min_lon,
+            'max_lon': game.max_lon,
+        },
+        'branding': branding,
+        'geofence_settings': game.get_geofence_settings(),
+        'geofences': game.get_geofence_config().get('locations', {}),
+    }
+
+
+def _bundle_team(team, found, total):
+    geofence_state, geofence_runtime = team.get_geofence_tracking()
+    return {
+        'id': team.id,
+        'name': team.name,
+        'start_time': _iso_or_none(team.start_time),
+        'end_time': _iso_or_none(team.end_time),
+        'progress': {
+            'found': found,
+            'total': total,
+        },
+        'geofence_state': geofence_state,
+        'geofence_runtime': geofence_runtime,
+        'geofence_version': team.geofence_version,
+    }
 
-    characters = []
-    for char in Character.query.filter_by(game_id=game.id).all():
-        characters.append({
-            'id': char.id,
-            'name': char.name,
-            'bio': char.bio,
-            'dialogue': char.dialogue,
-            'location_id': char.location_id,
-        })
 
-    zoom_levels = _get_offline_zoom_levels(game)
-    tile_urls = []
-    if all(v is not None for v in [game.min_lat, game.max_lat, game.min_lon, game.max_lon]):
-        tile_urls = utils.generate_tile_urls(
+def _tile_section(ranges, zoom_levels, max_tiles=utils.MAX_TILE_COUNT):
+    """Compact tile description: clients expand ranges x template lazily."""
+    ranges, dropped = utils.cap_tile_ranges(ranges, max_tiles)
+    section = {
+        'zooms': zoom_levels,
+        'template': public_tile_template(current_app.config['TILE_UPSTREAM_URL']),
+        'ranges': ranges,
+        'count': utils.count_tiles(ranges),
+    }
+    if dropped:
+        section['dropped_zooms'] = dropped
+    return section
+
+
+def _bundle_tiles(game, route_points=None):
+    """
+    Tiles for one team: a buffered corridor along its route (or disks around
+    its locations) when it has located assignments, otherwise the game's
+    bounding box. Highest zooms are dropped to fit the byte budget.
+    """
+    zoom_levels = tile_selector.offline_zoom_levels(game)
+    mode = tile_selector.game_tile_setting(game, 'offline_tile_mode', 'corridor')
+    budget = int(tile_selector.game_tile_setting(game, 'offline_tile_budget_bytes',
+                                                 current_app.config.get('OFFLINE_TILE_BUDGET_BYTES', 0)))
+    avg_tile_bytes = current_app.config.get('OFFLINE_TILE_AVG_BYTES', tile_selector.DEFAULT_AVG_TILE_BYTES)
+
+    ranges = []
+    route_points = [p for p in (route_points or []) if p[0] is not None and p[1] is not None]
+    if route_points and mode in tile_selector.MODES:
+        ranges = tile_selector.select_route_tiles(route_points, zoom_levels,
+                                                  buffer_m=tile_selector.game_buffer_m(game), mode=mode)
+    elif all(v is not None for v in [game.min_lat, game.max_lat, game.min_lon, game.max_lon]):
+        mode = 'bounds'
+        ranges = utils.tile_ranges(
             game.min_lat,
             game.min_lon,
             game.max_lat,
             game.max_lon,
             zoom_levels,
-            "https://tile.openstreetmap.org/{z}/{x}/{y}.png",
         )
 
+    ranges, dropped, estimated_bytes = tile_selector.apply_byte_budget(ranges, budget, avg_tile_bytes)
+    section = _tile_section(ranges, zoom_levels)
+    section['selection'] = mode
+    section['estimated_bytes'] = estimated_bytes
+    section['budget_bytes'] = budget
+    if dropped:
+        section['dropped_zooms'] = sorted(set(dropped) | set(section.get('dropped_zooms', [])))
+    return section
+
+
+# Game-level bundle parts, keyed by content version (see app.main.cache).
+_bundle_cache = SingleFlightCache(max_entries=512)
+
+
+def _game_bundle_part(game):
+    """Game section, characters and per-location fields, computed once per content version."""
+    def _compute():
+        characters = [_bundle_character(c) for c in Character.query.filter_by(game_id=game.id).all()]
+        locations = {
+            loc.id: _bundle_location_fields(loc)
+            for loc in Location.query.filter_by(game_id=game.id).all()
+        }
+        return {
+            'game': _bundle_game(game),
+            'characters': characters,
+            'locations': locations,
+            # Serialized entry sizes, for weighing a delta against the full bundle.
+            'characters_bytes': len(json.dumps(characters, default=str)),
+            'location_bytes': {loc_id: len(json.dumps(fields, default=str)) for loc_id, fields in locations.items()},
+        }
+
+    return _bundle_cache.get_or_compute(('game', game.id, game.content_version), _compute)
+
+
+def _team_bundle_tiles(game, game_part, location_ids):
+    """Tiles for a route, shared by every team with the same route and content version."""
+    def _compute():
+        locations = game_part['locations']
+        points = [
+            (locations[loc_id]['lat'], locations[loc_id]['lon'])
+            for loc_id in location_ids if loc_id in locations
+        ]
+        section = _bundle_tiles(game, points)
+        if proxy_enabled():
+            # Clients fetch exactly these tiles through the proxy; let misses through.
+            get_tile_store().add_area(game.id, game.content_version, section['ranges'])
+        return section
+
+    key = ('tiles', game.id, game.content_version, proxy_enabled(), tuple(location_ids))
+    return _bundle_cache.get_or_compute(key, _compute)
+
+
+def _build_offline_bundle(game, team):
+    # Only the per-team rows are read per request; everything else comes
+    # from the game-level part.
+    game_part = _game_bundle_part(game)
+    assignments = (
+        db.session.query(
+            TeamLocationAssignment.location_id,
+            TeamLocationAssignment.order_index,
+            TeamLocationAssignment.found,
+            TeamLocationAssignment.timestamp_found,
+        )
+        .filter_by(game_id=game.id, team_id=team.id)
+        .order_by(TeamLocationAssignment.order_index)
+        .all()
+    )
+
+    locations = [
+        _bundle_location(game_part['locations'][a.location_id], a.order_index, a.found, a.timestamp_found)
+        for a in assignments if a.location_id in game_part['locations']
+    ]
     found_count = sum(1 for location in locations if location['found'])
 
     return {
         'bundle_version': 1,
+        'mode': 'full',
         'generated_at': datetime.datetime.utcnow().isoformat() + 'Z',
-        'game': {
-            'id': game.id,
-            'name': game.name,
-            'description': game.description,
-            'gametype': game.gametype.name if game.gametype else None,
-            'bounds': {
-                'min_lat': game.min_lat,
-                'max_lat': game.max_lat,
-                'min_lon': game.min_lon,
-                'max_lon': game.max_lon,
-            },
-            'branding': branding,
-            'geofence_settings': game.get_geofence_settings(),
-            'geofences': game.get_geofence_config().get('locations', {}),
-        },
-        'team': {
-            'id': team.id,
-            'name': team.name,
-            'start_time': _iso_or_none(team.start_time),
-            'end_time': _iso_or_none(team.end_time),
-            'progress': {
-                'found': found_count,
-                'total': len(locations),
-            },
-            'geofence_state': team.get_geofence_state(),
-            'geofence_runtime': team.get_geofence_runtime_state(),
-        },
+        'game': game_part['game'],
+        'team': _bundle_team(team, found_count, len(locations)),
+        'locations': locations,
+        'characters': game_part['characters'],
+        'tiles': _team_bundle_tiles(game, game_part, [a.location_id for a in assignments]),
+    }
+
+
+def _parse_bundle_since(value):
+    """Parse a ``since`` token of the form '<content>.<progress>'."""
+    if not value:
+        return None
+    parts = value.split('.')
+    if len(parts) != 2:
+        return None
+    try:
+        content, progress = int(parts[0]), int(parts[1])
+    except ValueError:
+        return None
+    return content, progress
+
+
+def _build_offline_bundle_delta(game, team, since, current):
+    """
+    Return only what changed between the ``since`` and ``current``
+    (content, progress) versions, or None when a full bundle must be sent
+    (change log gap, or a delta that would not be smaller than the full one).
+    """
+    game_changes = changes_since(db.session, 'game', game.id, since[0], current[0])
+    team_changes = changes_since(db.session, 'team', team.id, since[1], current[1])
+    if game_changes is None or team_changes is None:
+        return None
+
+    location_ids = {item_id for (kind, item_id) in game_changes if kind == 'location'}
+    location_ids |= {item_id for (kind, item_id) in team_changes if kind == 'assignment'}
+    character_ids = {item_id for (kind, item_id) in game_changes if kind == 'character'}
+
+    changed_assignments = []
+    if location_ids:
+        changed_assignments = (
+            TeamLocationAssignment.query
+            .filter(
+                TeamLocationAssignment.team_id == team.id,
+                TeamLocationAssignment.game_id == game.id,
+                TeamLocationAssignment.location_id.in_(location_ids),
+            )
+            .order_by(TeamLocationAssignment.order_index)
+            .all()
+        )
+    changed_characters = []
+    if character_ids:
+        changed_characters = Character.query.filter(
+            Character.game_id == game.id,
+            Character.id.in_(character_ids),
+        ).all()
+
+    # Anything that changed but is no longer in this team's bundle is gone.
+    deleted_locations = sorted(location_ids - {a.location_id for a in changed_assignments})
+    deleted_characters = sorted(character_ids - {c.id for c in changed_characters})
+
+    locations = [
+        _bundle_location(_bundle_location_fields(a.location), a.order_index, a.found, a.timestamp_found)
+        for a in changed_assignments
+    ]
+    characters = [_bundle_character(c) for c in changed_characters]
+    deleted = {'locations': deleted_locations, 'characters': deleted_characters}
+
+    game_part = _game_bundle_part(game)
+    route = [
+        row.location_id for row in
+        db.session.query(TeamLocationAssignment.location_id)
+        .filter_by(game_id=game.id, team_id=team.id)
+        .order_by(TeamLocationAssignment.order_index)
+    ]
+    # Compare serialized sizes, tombstones included, with the entries the
+    # full bundle would carry; the game section and tiles are left out of
+    # both since a delta resends them whenever they change.
+    if location_ids or character_ids:
+        delta_bytes = len(json.dumps([locations, characters, deleted], default=str))
+        full_bytes = game_part['characters_bytes'] + sum(
+            game_part['location_bytes'].get(location_id, 0) for location_id in route
+        )
+        if delta_bytes >= full_bytes:
+            return None
+
+    progress = get_team_progress(db.session, team.id)
+    delta = {
+        'bundle_version': 1,
+        'mode': 'delta',
+        'since': {'content': since[0], 'progress': since[1]},
+        'generated_at': datetime.datetime.utcnow().isoformat() + 'Z',
+        'team': _bundle_team(team, progress.found_count, progress.total),
         'locations': locations,
         'characters': characters,
-        'tiles': {
-            'zooms': zoom_levels,
-            'urls': tile_urls,
-        },
+        'deleted': deleted,
     }
+    if ('game', game.id) in game_changes:
+        delta['game'] = _bundle_game(game)
+    else:
+        delta['game'] = {'id': game.id}
+    # Tiles follow the team's route, so they change with the game settings
+    # or with any moved, added or removed location.
+    if ('game', game.id) in game_changes or location_ids:
+        delta['tiles'] = _team_bundle_tiles(game, game_part, route)
+    return delta
+
 
 def to_float_or_none(v):
     if v is None or v == "" or v == "null":
@@ -174,39 +384,45 @@ def _set_game_admin_status(game, status):
 @api_bp.route('/api/get_nearby_locations', methods=['POST'])
 # used to be /api/locations
 def get_nearby_locations():
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     #lat, lon = data['latitude'], data['longitude']
-    lat = data.get('latitude')
-    lon = data.get('longitude')
+    lat = to_float_or_none(data.get('latitude'))
+    lon = to_float_or_none(data.get('longitude'))
     game_id = data.get('game_id')
     if not game_id:
         return jsonify({"error": "game_id required"}), 400
-    
+
+    radius_m = to_float_or_none(data.get('radius_m', request.args.get('radius_m')))
+    if radius_m is None:
+        radius_m = spatial.DEFAULT_RADIUS_M
+    try:
+        limit = int(data.get('limit', request.args.get('limit', spatial.DEFAULT_LIMIT)))
+    except (TypeError, ValueError):
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    if radius_m <= 0 or limit <= 0:
+        return jsonify({"error": "radius_m and limit must be positive"}), 400
+    radius_m = min(radius_m, spatial.MAX_RADIUS_M)
+    limit = min(limit, spatial.MAX_LIMIT)
+
     # If latitude or longitude are missing, use the first location's coordinates for the game
     if lat is None or lon is None:
         location = Location.query.filter_by(game_id=game_id).first()
         if location:
             lat = location.latitude
             lon = location.longitude
-        else:
-            return jsonify([])  # No locations for this game
-    
-    print(f"Received coordinates: ({lat}, {lon}) for game_id: {game_id}")
-
-    locations = Location.query.filter_by(game_id=game_id).all()
-    results = []
-    for loc in locations:
-        dist = utils.haversine(lat, lon, loc.latitude, loc.longitude)
-        print(f"Checking location: {loc.name} at ({loc.latitude}, {loc.longitude}), distance: {dist} meters")
-        
-        if dist < 1000:  # meters
-            results.append({
-                'id': loc.id,
-                'name': loc.name,
-                'clue': loc.clue_text,
-                'latitude': loc.latitude,
-                'longitude': loc.longitude,
-            })
+        if lat is None or lon is None:
+            return jsonify([])  # No (positioned) locations for this game
+
+    results = spatial.find_nearby_locations(
+        db.session,
+        game_id,
+        lat,
+        lon,
+        radius_m=radius_m,
+        limit=limit,
+        use_rtree=current_app.extensions.get('location_rtree', False),
+    )
     return jsonify(results)
 
 @api_bp.route('/api/interact/<int:char_id>')
@@ -273,12 +489,16 @@ def get_team_location_assignments(game_id):
     return jsonify(result)
 
 
-@api_bp.route('/api/game/<int:game_id>/offline_bundle', methods=['GET'])
-@login_required
-def offline_bundle(game_id):
-    membership = (
-        TeamMembership.query
-        .join(Team)
+def _current_team_versions(game_id):
+    """
+    (team_id, progress_version, content_version, geofence_version) for the
+    current user's team in a game, or None.
+    """
+    return (
+        db.session.query(TeamMembership.team_id, Team.progress_version, Game.content_version,
+                         Team.geofence_version)
+        .join(Team, Team.id == TeamMembership.team_id)
+        .join(Game, Game.id == Team.game_id)
         .filter(
             TeamMembership.user_id == current_user.id,
             Team.game_id == game_id,
@@ -286,12 +506,200 @@ def offline_bundle(game_id):
         .first()
     )
 
-    if not membership:
+
+def _bundle_version_info(content_version, progress_version, geofence_version):
+    # Geofence writes bump only geofence_version (app/team_geofences.py), but
+    # the bundle carries the team's geofence state, so it is part of the ETag.
+    return {
+        'content': content_version,
+        'progress': progress_version,
+        'geofence': geofence_version,
+        'token': f"{content_version}.{progress_version}",
+    }
+
+
+@api_bp.route('/api/game/<int:game_id>/offline_bundle', methods=['GET'])
+@login_required
+def offline_bundle(game_id):
+    # One indexed lookup gives membership and both versions; unchanged
+    # bundles are answered with 304 without touching locations or tiles.
+    row = _current_team_versions(game_id)
+    if not row:
         return jsonify({'error': 'User is not part of a team in this game'}), 403
 
-    game = Game.query.get_or_404(game_id)
-    bundle = _build_offline_bundle(game, membership.team)
-    return jsonify(bundle)
+    team_id, progress_version, content_version, geofence_version = row
+    current = (content_version, progress_version)
+    since = _parse_bundle_since(request.args.get('since'))
+
+    etag = f"bundle-{game_id}-{team_id}-{content_version}-{progress_version}-{geofence_version}"
+    if since:
+        etag += f"-from-{since[0]}-{since[1]}"
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
+
+    game = db.session.get(Game, game_id)
+    team = db.session.get(Team, team_id)
+
+    bundle = None
+    if since:
+        bundle = _build_offline_bundle_delta(game, team, since, current)
+    if bundle is None:
+        bundle = _build_offline_bundle(game, team)
+    bundle['version'] = _bundle_version_info(content_version, progress_version, geofence_version)
+
+    response = jsonify(bundle)
+    _set_version_etag(response, etag)
+    return response
+
+
+def _asset_pack_images(bundle):
+    """(archive_path, filesystem_path) for every static image a bundle references."""
+    static_url = current_app.static_url_path.rstrip('/') + '/'
+    urls = [loc.get('image_url') for loc in bundle.get('locations', [])]
+    icon = (bundle.get('game', {}).get('branding') or {}).get('icon_url')
+    if icon:
+        urls.append(icon if icon.startswith('/') else static_url + icon)
+
+    images = []
+    for url in urls:
+        if not url or not url.startswith(static_url):
+            continue
+        relative = os.path.normpath(url[len(static_url):])
+        if relative.startswith('..') or os.path.isabs(relative):
+            continue
+        images.append((url.lstrip('/'), os.path.join(current_app.static_folder, relative)))
+    return images
+
+
+def _asset_pack_tiles(bundle):
+    """Yield (z, x, y, data) for the bundle's tiles that are in the proxy store."""
+    store = get_tile_store()
+    tiles = bundle.get('tiles') or {}
+    for z, x, y in utils.iter_tiles(tiles.get('ranges', [])):
+        data = store.get(z, x, y)
+        if data is not None:
+            yield z, x, y, data
+
+
+def _missing_pack_tiles(bundle):
+    store = get_tile_store()
+    tiles = bundle.get('tiles') or {}
+    return [tile for tile in utils.iter_tiles(tiles.get('ranges', [])) if not store.contains(*tile)]
+
+
+def _ensure_asset_pack(game_id, include_tiles):
+    """
+    Return (path, etag) of the current user's pack, building it if needed,
+    or (None, missing tile count) while its tiles are being fetched.
+
+    Packs are built from the tile store only, and a tile pack is built only
+    once the store holds every tile of the team's selection. Until then each
+    request without a running fill starts a background prefetch of exactly
+    the missing tiles (one job per team and content version, since corridor
+    tiles differ between teams) and the caller answers 202.
+    """
+    row = _current_team_versions(game_id)
+    if not row:
+        abort(403)
+    team_id, progress_version, content_version, geofence_version = row
+
+    directory = current_app.config.get('ASSET_PACK_DIR') or os.path.join(current_app.instance_path, 'asset_packs')
+    filename = asset_pack.pack_filename(game_id, team_id, content_version, include_tiles)
+    path = os.path.join(directory, filename)
+    etag = filename[:-len('.zip')]
+
+    if not os.path.exists(path):
+        game = db.session.get(Game, game_id)
+        team = db.session.get(Team, team_id)
+        bundle = _build_offline_bundle(game, team)
+        bundle['version'] = _bundle_version_info(content_version, progress_version, geofence_version)
+        if include_tiles:
+            missing = _missing_pack_tiles(bundle)
+            if missing:
+                app = current_app._get_current_object()
+                job_key = _asset_pack_fill_key(game_id, team_id, content_version)
+                previous = app.extensions.get('tile_prefetch_jobs', {}).get(job_key)
+                if previous is not None and not previous.is_alive():
+                    app.logger.warning("Asset pack for game %s team %s still misses %s tiles; refetching",
+                                       game_id, team_id, len(missing))
+                start_game_prefetch(app, game_id, tiles=missing, job_key=job_key)
+                return None, len(missing)
+        tiles = _asset_pack_tiles(bundle) if include_tiles else ()
+        asset_pack.write_asset_pack(path, bundle, _asset_pack_images(bundle), tiles)
+        asset_pack.prune_old_packs(directory, game_id, team_id, content_version)
+
+    return path, etag
+
+
+def _asset_pack_fill_key(game_id, team_id, content_version):
+    """Key of a team's asset pack tile fill in app.extensions['tile_prefetch_jobs']."""
+    return ('asset_pack', game_id, team_id, content_version)
+
+
+def _asset_pack_preparing(missing):
+    response = jsonify({'status': 'preparing', 'missing_tiles': missing})
+    response.status_code = 202
+    response.headers['Retry-After'] = '10'
+    return response
+
+
+@api_bp.route('/api/game/<int:game_id>/asset_pack', methods=['GET'])
+@login_required
+def download_asset_pack(game_id):
+    """
+    Everything needed offline in one zip: bundle.json, images and (with
+    tiles=1, when the tile proxy is enabled) map tiles, plus manifest.json.
+    Cached on disk per content version; supports Range/If-Range for resume.
+    Answers 202 with Retry-After while missing tiles are being fetched.
+    """
+    include_tiles = request.args.get('tiles') in ('1', 'true')
+    if include_tiles and not proxy_enabled():
+        return jsonify({'error': 'Tile packs require the tile proxy'}), 400
+
+    path, etag = _ensure_asset_pack(game_id, include_tiles)
+    if path is None:
+        return _asset_pack_preparing(etag)
+    return send_file(
+        path,
+        mimetype='application/zip',
+        as_attachment=True,
+        download_name=os.path.basename(path),
+        conditional=True,
+        etag=etag,
+        max_age=0,
+    )
+
+
+@api_bp.route('/api/game/<int:game_id>/asset_pack/manifest', methods=['GET'])
+@login_required
+def asset_pack_manifest(game_id):
+    include_tiles = request.args.get('tiles') in ('1', 'true')
+    if include_tiles and not proxy_enabled():
+        return jsonify({'error': 'Tile packs require the tile proxy'}), 400
+
+    path, etag = _ensure_asset_pack(game_id, include_tiles)
+    if path is None:
+        return _asset_pack_preparing(etag)
+    manifest = asset_pack.read_manifest(path)
+    manifest['pack'] = {'etag': etag, 'size': os.path.getsize(path)}
+    return jsonify(manifest)
+
+
+@api_bp.route('/api/qr/resolve/<path:token>', methods=['GET'])
+@login_required
+def resolve_qr_token(token):
+    """Map a scanned token (raw or 'geokr:qr:' payload) to its game and location."""
+    row = QRToken.resolve(token)
+    if row is None:
+        return jsonify({"success": False, "error": "Unknown QR code"}), 404
+    if not row.game.qr_enabled:
+        return jsonify({"success": False, "error": "QR validation is not enabled for this game"}), 403
+
+    return jsonify({
+        "success": True,
+        "game_id": row.game_id,
+        "location_id": row.location_id,
+    })
 
 
 # Adjustable distance threshold in meters
@@ -378,8 +786,9 @@ def mark_location_found_simple(location_id):
         assignment.timestamp_found = datetime.datetime.utcnow()
 
         # Check if all locations assigned to the team are now found
-        all_found = all(a.found for a in assignment.team.location_assignments)
-        if all_found and assignment.team.end_time is None:
+        db.session.flush()
+        progress = get_team_progress(db.session, team_id)
+        if progress.is_complete and assignment.team.end_time is None:
             assignment.team.end_time = datetime.datetime.utcnow()
             flash("You Finished!", "success")  # <--- Flash success message here
 
@@ -388,24 +797,16 @@ def mark_location_found_simple(location_id):
     return redirect(url_for('main.findloc'))
 
 def build_progress_response(assignment):
-    team = assignment.team
-    game = assignment.game
-
-    # Calculate progress
-    all_assignments = TeamLocationAssignment.query.filter_by(team_id=team.id).all()
-    total = len(all_assignments)
-    found = sum(1 for a in all_assignments if a.found)
-
-    # Find next location (not found yet)
-    next_loc = next((a.location for a in all_assignments if not a.found), None)
+    progress = get_team_progress(db.session, assignment.team_id)
+    next_loc = db.session.get(Location, progress.next_location_id) if progress.next_location_id else None
 
     return {
         "success": True,
         "status": "found" if assignment.found else "pending",
         "location_id": assignment.location_id,
         "team_progress": {
-            "found": found,
-            "total": total
+            "found": progress.found_count,
+            "total": progress.total
         },
         "next_location": {
             "id": next_loc.id,
@@ -461,15 +862,62 @@ def _ensure_legacy_map_assignments(team, game_id):
     db.session.flush()
 
 
+def _validate_found_event(team, assignment, location_id, data, expected_assignment):
+    """
+    Run the per-method checks for a found event against an assignment.
+    Returns (error_payload, status_code, distance_m); error_payload is None when
+    the event may be applied. expected_assignment is a callable returning the
+    team's current (first unfound) assignment, only evaluated for QR checks.
+    """
+    method = (data.get("method") or "direct").lower()
+    metadata = data.get('metadata') or {}
+
+    if method == 'qr':
+        game = team.game if team else None
+        if not game or not game.qr_enabled:
+            return {"success": False, "error": "QR validation is not enabled for this game"}, 403, None
+
+        qr_token = metadata.get('qrToken') or metadata.get('qr_token') or data.get('qr_token')
+        if not qr_token:
+            return {"success": False, "error": "Missing QR token"}, 400, None
+
+        matched_location_id = game.find_location_id_for_qr_token(qr_token)
+        if matched_location_id != location_id:
+            return {"success": False, "error": "QR code does not match this clue"}, 403, None
+
+        current = expected_assignment()
+        if current and current.location_id != location_id:
+            return {"success": False, "error": "QR code is valid, but not for the current clue"}, 403, None
+
+    distance = None
+
+    # Normal mode: only geolocation-based validations require a proximity check.
+    if method == "geo":
+        user_lat = data.get("lat")
+        user_lon = data.get("lon")
+        if user_lat is None or user_lon is None:
+            return {"success": False, "error": "Missing lat/lon for proximity check"}, 400, None
+
+        target_lat = assignment.location.latitude
+        target_lon = assignment.location.longitude
+        distance = utils.haversine(user_lat, user_lon, target_lat, target_lon)
+
+        if distance > PROXIMITY_THRESHOLD_METERS:
+            return {
+                "success": False,
+                "message": "Too far from location",
+                "distance_m": round(distance, 2)
+            }, 403, distance
+
+    return None, 200, distance
+
+
 @api_bp.route('/api/location/<int:location_id>/found', methods=['POST'])
 @login_required
 def mark_location_found(location_id):
     data = request.get_json() or {}
     game_id = data.get("game_id")
-    user_lat = data.get("lat")
-    user_lon = data.get("lon")
     method = (data.get("method") or "direct").lower()
-    metadata = data.get('metadata') or {}
 
     # Validate input
     if not game_id:
@@ -505,45 +953,20 @@ def mark_location_found(location_id):
     if assignment.found:
         return jsonify(build_progress_response(assignment)), 200
 
-    if method == 'qr':
-        game = membership.team.game if membership.team else None
-        if not game or not game.qr_enabled:
-            return jsonify({"success": False, "error": "QR validation is not enabled for this game"}), 403
-
-        qr_token = metadata.get('qrToken') or metadata.get('qr_token') or data.get('qr_token')
-        if not qr_token:
-            return jsonify({"success": False, "error": "Missing QR token"}), 400
-
-        matched_location_id = game.find_location_id_for_qr_token(qr_token)
-        if matched_location_id != location_id:
-            return jsonify({"success": False, "error": "QR code does not match this clue"}), 403
-
-        expected_assignment = (
+    error, status, distance = _validate_found_event(
+        membership.team,
+        assignment,
+        location_id,
+        data,
+        lambda: (
             TeamLocationAssignment.query
             .filter_by(team_id=membership.team_id, game_id=game_id, found=False)
             .order_by(TeamLocationAssignment.order_index)
             .first()
-        )
-        if expected_assignment and expected_assignment.location_id != location_id:
-            return jsonify({"success": False, "error": "QR code is valid, but not for the current clue"}), 403
-
-    distance = None
-
-    # Normal mode: only geolocation-based validations require a proximity check.
-    if method == "geo":
-        if user_lat is None or user_lon is None:
-            return jsonify({"success": False, "error": "Missing lat/lon for proximity check"}), 400
-
-        target_lat = assignment.location.latitude
-        target_lon = assignment.location.longitude
-        distance = utils.haversine(user_lat, user_lon, target_lat, target_lon)
-
-        if distance > PROXIMITY_THRESHOLD_METERS:
-            return jsonify({
-                "success": False,
-                "message": "Too far from location",
-                "distance_m": round(distance, 2)
-            }), 403
+        ),
+    )
+    if error:
+        return jsonify(error), status
 
     # Mark as found
     assignment.found = True
@@ -559,6 +982,190 @@ def mark_location_found(location_id):
     return jsonify(response), 200
 
 
+# Upper bound on events accepted by one /api/sync/batch request
+MAX_SYNC_BATCH_EVENTS = 200
+
+
+def _sync_event_key(event):
+    client_event_id = event.get('client_event_id')
+    if client_event_id:
+        return f"event:{client_event_id}"
+
+    queue_key = event.get('queue_key')
+    if queue_key:
+        return f"queue:{queue_key}"
+    return None
+
+
+def _to_int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@api_bp.route('/api/sync/batch', methods=['POST'])
+@login_required
+def sync_batch():
+    """
+    Apply many queued found events in one request and one transaction.
+    Expects JSON: { "events": [{ "location_id", "game_id", "method", "client_event_id", "queue_key", ... }] }
+    Returns one result per event, in request order, with status
+    'synced', 'duplicate' or 'failed' so the client can settle its queue.
+    """
+    payload = request.get_json(silent=True) or {}
+    events = payload.get('events')
+    if not isinstance(events, list):
+        return jsonify({"success": False, "error": "events must be a list"}), 400
+    if len(events) > MAX_SYNC_BATCH_EVENTS:
+        return jsonify({"success": False, "error": f"At most {MAX_SYNC_BATCH_EVENTS} events per batch"}), 413
+
+    now = datetime.datetime.utcnow()
+    results = []
+    seen_keys = {}
+    # Events already applied by an earlier request (shared idempotency store)
+    replayed = find_tombstoned([
+        sync_event_tombstone_key(current_user.id, event.get('client_event_id'))
+        for event in events
+        if isinstance(event, dict) and event.get('client_event_id')
+    ])
+    teams_by_game = {}         # game_id -> Team or None (one membership query per game)
+    assignments_by_team = {}   # team_id -> {location_id: assignment} (one query per team)
+
+    def _team_for_game(game_id):
+        if game_id not in teams_by_game:
+            membership = TeamMembership.query.join(Team).filter(
+                TeamMembership.user_id == current_user.id,
+                Team.game_id == game_id
+            ).first()
+            teams_by_game[game_id] = membership.team if membership else None
+        return teams_by_game[game_id]
+
+    def _assignments_for(team, game_id):
+        if team.id not in assignments_by_team:
+            rows = (
+                TeamLocationAssignment.query
+                .filter_by(team_id=team.id, game_id=game_id)
+                .order_by(TeamLocationAssignment.order_index)
+                .all()
+            )
+            if not rows:
+                _ensure_legacy_map_assignments(team, game_id)
+                rows = (
+                    TeamLocationAssignment.query
+                    .filter_by(team_id=team.id, game_id=game_id)
+                    .order_by(TeamLocationAssignment.order_index)
+                    .all()
+                )
+            assignments_by_team[team.id] = {row.location_id: row for row in rows}
+        return assignments_by_team[team.id]
+
+    for index, event in enumerate(events):
+        event = event if isinstance(event, dict) else {}
+        result = {
+            'index': index,
+            'client_event_id': event.get('client_event_id'),
+            'queue_key': event.get('queue_key'),
+            'location_id': event.get('location_id'),
+        }
+        results.append(result)
+
+        def _fail(status_code, error):
+            result.update({'status': 'failed', 'http_status': status_code, 'error': error})
+
+        key = _sync_event_key(event)
+        if key and key in seen_keys:
+            first = results[seen_keys[key]]
+            result.update({
+                'status': 'duplicate' if first['status'] != 'failed' else 'failed',
+                'http_status': first['http_status'],
+                'duplicate_of': first['index'],
+            })
+            if first.get('error'):
+                result['error'] = first['error']
+            continue
+        if key:
+            seen_keys[key] = index
+
+        event_key = None
+        if event.get('client_event_id'):
+            event_key = sync_event_tombstone_key(current_user.id, event['client_event_id'])
+            if event_key in replayed:
+                result.update({'status': 'duplicate', 'http_status': 200, 'replayed': True})
+                continue
+
+        game_id = _to_int_or_none(event.get('game_id'))
+        location_id = _to_int_or_none(event.get('location_id'))
+        if not game_id or not location_id:
+            _fail(400, "Missing game_id or location_id")
+            continue
+        result['location_id'] = location_id
+
+        team = _team_for_game(game_id)
+        if not team:
+            _fail(403, "User is not part of a team in this game")
+            continue
+
+        team_assignments = _assignments_for(team, game_id)
+        assignment = team_assignments.get(location_id)
+        if not assignment:
+            if is_tombstoned(assignment_tombstone_key(team.id, location_id, game_id)):
+                _fail(409, "This assignment was recently deleted")
+            else:
+                _fail(404, "Location not assigned to your team")
+            continue
+
+        result['team_id'] = team.id
+        method = (event.get("method") or "direct").lower()
+        result['method'] = method
+
+        if assignment.found:
+            result.update({'status': 'duplicate', 'http_status': 200})
+            continue
+
+        error, status, distance = _validate_found_event(
+            team,
+            assignment,
+            location_id,
+            event,
+            lambda: next(
+                (a for a in sorted(team_assignments.values(), key=lambda a: a.order_index) if not a.found),
+                None,
+            ),
+        )
+        if error:
+            _fail(status, error.get('error') or error.get('message'))
+            if distance is not None:
+                result['distance_m'] = round(distance, 2)
+            continue
+
+        assignment.found = True
+        assignment.timestamp_found = now
+        if event_key:
+            add_tombstone(event_key, kind='sync_event')
+        result.update({'status': 'synced', 'http_status': 200})
+        if distance is not None:
+            result['distance_m'] = round(distance, 2)
+
+    # Summarize before committing so the expired assignments are not reloaded one by one.
+    progress = []
+    for team_id, team_assignments in assignments_by_team.items():
+        progress.append({
+            'team_id': team_id,
+            'found': sum(1 for a in team_assignments.values() if a.found),
+            'total': len(team_assignments),
+        })
+
+    db.session.commit()
+
+    return jsonify({
+        'success': True,
+        'applied': sum(1 for r in results if r['status'] == 'synced'),
+        'results': results,
+        'team_progress': progress,
+    }), 200
+
+
 @api_bp.route('/api/admin/team/<int:team_id>/location/<int:location_id>/confirm_found', methods=['POST'])
 @admin_required
 def admin_confirm_location_found(team_id, location_id):
@@ -597,6 +1204,12 @@ def admin_confirm_location_found(team_id, location_id):
         game_id=game_id,
         reason=reason
     )
+    queue_game_event(db.session, game_id, 'override', {
+        'team_id': team_id,
+        'location_id': location_id,
+        'reason': reason,
+        'admin_user_id': current_user.id,
+    })
     db.session.commit()
 
     response = build_progress_response(assignment)
@@ -608,26 +1221,88 @@ def admin_confirm_location_found(team_id, location_id):
 
 
 
+TILE_PAGE_SIZE = 500
+MAX_TILE_PAGE_SIZE = 5000
+
 @api_bp.route('/api/tile-list')
 def tile_list():
-    # Example bounding box around a campus
-    min_lat = float(request.args.get('min_lat'))
-    min_lng = float(request.args.get('min_lng'))
-    max_lat = float(request.args.get('max_lat'))
-    max_lng = float(request.args.get('max_lng'))
-    zooms = request.args.get('zooms', '14,15,16')
-    zoom_levels = [int(z) for z in zooms.split(',')]
+    """
+    Tiles covering a bounding box. By default returns the compact
+    {template, ranges, count} form; format=urls pages explicit URLs
+    (offset/limit) for clients that cannot expand ranges themselves.
+    """
+    min_lat = to_float_or_none(request.args.get('min_lat'))
+    min_lng = to_float_or_none(request.args.get('min_lng'))
+    max_lat = to_float_or_none(request.args.get('max_lat'))
+    max_lng = to_float_or_none(request.args.get('max_lng'))
+    if None in (min_lat, min_lng, max_lat, max_lng):
+        return jsonify({"error": "min_lat, min_lng, max_lat and max_lng are required"}), 400
 
-    tile_url_template = "https://tile.openstreetmap.org/{z}/{x}/{y}.png"
+    zooms = request.args.get('zooms', '14,15,16')
+    try:
+        zoom_levels = sorted({int(z) for z in zooms.split(',') if z.strip()})
+    except ValueError:
+        return jsonify({"error": "zooms must be a comma-separated list of integers"}), 400
+    if not zoom_levels or zoom_levels[0] < 0 or zoom_levels[-1] > utils.MAX_TILE_ZOOM:
+        return jsonify({"error": f"zooms must be between 0 and {utils.MAX_TILE_ZOOM}"}), 400
 
-    tiles = utils.generate_tile_urls(min_lat, min_lng, max_lat, max_lng, zoom_levels, tile_url_template)
-    return jsonify(tiles)
+    ranges = utils.tile_ranges(min_lat, min_lng, max_lat, max_lng, zoom_levels)
+    count = utils.count_tiles(ranges)
+    if count > utils.MAX_TILE_COUNT:
+        return jsonify({
+            "error": f"Request covers {count} tiles; the limit is {utils.MAX_TILE_COUNT}",
+            "count": count,
+            "max_count": utils.MAX_TILE_COUNT,
+        }), 400
+
+    if request.args.get('format') != 'urls':
+        return jsonify(_tile_section(ranges, zoom_levels))
+
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', TILE_PAGE_SIZE, type=int)
+    offset = max(offset, 0)
+    limit = min(max(limit, 1), MAX_TILE_PAGE_SIZE)
+
+    template = public_tile_template(current_app.config['TILE_UPSTREAM_URL'])
+    urls = list(utils.iter_tile_urls(ranges, template, offset=offset, limit=limit))
+    next_offset = offset + len(urls)
+    return jsonify({
+        'count': count,
+        'offset': offset,
+        'limit': limit,
+        'urls': urls,
+        'next_offset': next_offset if next_offset < count else None,
+    })
 
 # ============================================================
 # GAME
 # ============================================================
 
-def assign_locations_to_teams(game_id):
+def _plan_assignments(teams, routes, location_ids, num_locations_per_team, rng):
+    """Yield (team_id, location_id, order_index) for every team's route."""
+    if routes:
+        # Cycle through routes if there are more teams than routes
+        route_cycle = cycle(routes)
+        for team in teams:
+            for i, loc_id in enumerate(next(route_cycle)):
+                yield team.id, loc_id, i
+    else:
+        # Fallback: Random assignment
+        for team in teams:
+            assigned = rng.sample(location_ids, min(num_locations_per_team, len(location_ids)))
+            for i, loc_id in enumerate(assigned):
+                yield team.id, loc_id, i
+
+
+def assign_locations_to_teams(game_id, rng=None):
+    """
+    Give every team of the game its route, skipping pairs that already exist.
+
+    Existing (team, location) pairs are loaded once and all missing rows go
+    in with a single bulk INSERT. The caller owns the commit. Returns a report
+    dict: mode, teams, created, skipped, elapsed_ms.
+    """
+    started = time.perf_counter()
     game = Game.query.get(game_id)
     if not game:
         raise ValueError(f"Game with ID {game_id} not found.")
@@ -635,54 +1310,97 @@ def assign_locations_to_teams(game_id):
     teams = Team.query.filter_by(game_id=game_id).all()
     if not teams:
         raise ValueError(f"No teams found for game ID {game_id}.")
-    
+
     # Check if 'routes' is defined in game.data
     routes = None
     num_locations_per_team=5
     if game.data and isinstance(game.data, dict):
         routes = game.data.get('routes')
         num_locations_per_team = game.data.get('num_locations_per_team', num_locations_per_team)
-    
-    created_count = 0
-    if routes and isinstance(routes, list) and all(isinstance(r, list) for r in routes):
-        # Assign based on predefined routes
-        route_cycle = cycle(routes)  # Cycle through routes if there are more teams than routes
-        for team in teams:
-            route = next(route_cycle)
-            for i, loc_id in enumerate(route):
-                exists = TeamLocationAssignment.query.filter_by(
-                    team_id=team.id, location_id=loc_id, game_id=game_id
-                ).first()
-                if not exists:
-                    assignment = TeamLocationAssignment(
-                        team_id=team.id,
-                        location_id=loc_id,
-                        game_id=game_id,
-                        order_index=i  # Assign the order_index
-                    )
-                    db.session.add(assignment)
-                    created_count += 1
-    else:
-        # Fallback: Random assignment
-        all_location_ids = [loc.id for loc in Location.query.filter_by(game_id=game_id).all()]
-        for team in teams:
-            assigned = random.sample(all_location_ids, min(num_locations_per_team, len(all_location_ids)))
-            for i, loc_id in enumerate(assigned):
-                exists = TeamLocationAssignment.query.filter_by(
-                    team_id=team.id, location_id=loc_id, game_id=game_id
-                ).first()
-                if not exists:
-                    assignment = TeamLocationAssignment(
-                        team_id=team.id,
-                        location_id=loc_id,
-                        game_id=game_id,
-                        order_index=i # Assign the order_index
-                    )
-                    db.session.add(assignment)
-                    created_count += 1
+    if not (routes and isinstance(routes, list) and all(isinstance(r, list) for r in routes)):
+        routes = None
 
-    db.session.commit()
-    return f"Assigned {created_count} location(s) to teams in game {game_id}."
+    location_ids = []
+    if routes is None:
+        location_ids = [row.id for row in db.session.query(Location.id).filter_by(game_id=game_id).order_by(Location.id)]
+
+    existing = set(
+        db.session.query(TeamLocationAssignment.team_id, TeamLocationAssignment.location_id)
+        .filter(TeamLocationAssignment.team_id.in_([team.id for team in teams]))
+    )
+
+    rows = []
+    skipped = 0
+    for team_id, loc_id, order_index in _plan_assignments(
+        teams, routes, location_ids, num_locations_per_team, rng or random
+    ):
+        if (team_id, loc_id) in existing:
+            skipped += 1
+            continue
+        existing.add((team_id, loc_id))
+        rows.append({
+            'team_id': team_id,
+            'location_id': loc_id,
+            'game_id': game_id,
+            'order_index': order_index,
+            'found': False,
+        })
+
+    if rows:
+        # A bulk INSERT skips the flush listeners; keep versions and progress in step.
+        db.session.execute(TeamLocationAssignment.__table__.insert(), rows)
+        team_ids = {row['team_id'] for row in rows}
+        bump_versions(db.session, team_ids=team_ids)
+        refresh_team_progress(db.session, team_ids=team_ids)
+
+    report = {
+        'mode': 'routes' if routes else 'shuffled',
+        'teams': len(teams),
+        'created': len(rows),
+        'skipped': skipped,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+    current_app.logger.info("Assigned locations for game %s: %s", game_id, report)
+    return report
+
+
+def _delete_game_assignments(game_id):
+    """Set-based delete of a game's assignments; returns the row count."""
+    deleted = (
+        TeamLocationAssignment.query
+        .filter_by(game_id=game_id)
+        .delete(synchronize_session='fetch')
+    )
+    if deleted:
+        bump_versions(db.session, game_teams=[game_id])
+        refresh_team_progress(db.session, game_ids=[game_id])
+        queue_game_event(db.session, game_id, 'reset', {'scope': 'game', 'deleted': deleted})
+    return deleted
+
+
+def _reset_found_assignments(game_id=None, team_id=None):
+    """Set-based found/timestamp reset for a game or team; returns the rows changed."""
+    query = TeamLocationAssignment.query.filter(
+        db.or_(TeamLocationAssignment.found.is_(True), TeamLocationAssignment.timestamp_found.isnot(None))
+    )
+    if game_id is not None:
+        query = query.filter(TeamLocationAssignment.game_id == game_id)
+    if team_id is not None:
+        query = query.filter(TeamLocationAssignment.team_id == team_id)
+
+    reset = query.update({'found': False, 'timestamp_found': None}, synchronize_session='evaluate')
+    if reset:
+        if team_id is not None:
+            bump_versions(db.session, team_ids=[team_id])
+            refresh_team_progress(db.session, team_ids=[team_id])
+            if game_id is None:
+                game_id = db.session.query(Team.game_id).filter(Team.id == team_id).scalar()
+            queue_game_event(db.session, game_id, 'reset', {'scope': 'team', 'team_id': team_id, 'reset': reset})
+        else:
+            bump_versions(db.session, game_teams=[game_id])
+            refresh_team_progress(db.session, game_ids=[game_id])
+            queue_game_event(db.session, game_id, 'reset', {'scope': 'game', 'reset': reset})
+    return reset
 
 
 @api_bp.route('/api/game/<int:game_id>/start_game', methods=['POST'])
@@ -694,7 +1412,7 @@ def start_game(game_id):
     
     try:
         # Delete existing assignments for this game
-        deleted_count = TeamLocationAssignment.query.filter_by(game_id=game_id).delete()
+        deleted_count = _delete_game_assignments(game_id)
         db.session.commit()
     except Exception as e:
         db.session.rollback()
@@ -702,19 +1420,23 @@ def start_game(game_id):
 
     try:
         # Assign new locations
-        assign_locations_to_teams(game.id)
+        assignment_report = assign_locations_to_teams(game.id)
         _set_game_admin_status(game, 'ongoing')
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         return jsonify({"success": False, "message": f"Failed to assign locations: {str(e)}"}), 500
 
+    if proxy_enabled():
+        start_game_prefetch(current_app._get_current_object(), game.id)
+
     return jsonify({
         "success": True,
         "message": f"Game '{game.name}' started and locations assigned!",
         "game_id": game.id,
         "status": game.get_admin_status(),
-        "deleted_assignments": deleted_count
+        "deleted_assignments": deleted_count,
+        "assignments": assignment_report,
     }), 200
 
 @api_bp.route('/api/game/<int:game_id>/clear_assignments', methods=['POST'])
@@ -727,7 +1449,7 @@ def clear_assignments(game_id):
             return jsonify({"success": False, "message": "Game not found"}), 404
 
         # Delete all TeamLocationAssignment rows for this game
-        deleted_count = TeamLocationAssignment.query.filter_by(game_id=game_id).delete()
+        deleted_count = _delete_game_assignments(game_id)
         _set_game_admin_status(game, 'ready')
         db.session.commit()
         return jsonify({
@@ -735,6 +1457,7 @@ def clear_assignments(game_id):
             "message": f"Deleted all {deleted_count} team location assignments for game {game_id}.",
             "game_id": game.id,
             "status": game.get_admin_status(),
+            "deleted_assignments": deleted_count,
         })
     except Exception as e:
         db.session.rollback()
@@ -751,19 +1474,16 @@ def reset_game_locations(game_id):
     if not game:
         return jsonify({"success": False, "message": "Game not found"}), 404
 
-    assignments = TeamLocationAssignment.query.filter_by(game_id=game.id).all()
-    for assignment in assignments:
-        assignment.found = False
-        assignment.timestamp_found = None
-
+    reset_count = _reset_found_assignments(game_id=game.id)
     _set_game_admin_status(game, 'ready')
     db.session.commit()
 
     return jsonify({
         "success": True,
-        "message": f"Reset {len(assignments)} location assignments for game '{game.name}'.",
+        "message": f"Reset {reset_count} location assignments for game '{game.name}'.",
         "game_id": game.id,
         "status": game.get_admin_status(),
+        "reset_assignments": reset_count,
     })
 
 
@@ -784,10 +1504,7 @@ def reset_locations(team_id):
         return jsonify({"error": f"No team found with id {team_id}"}), 404
 
     # Reset all assignments for this team
-    assignments = TeamLocationAssignment.query.filter_by(team_id=team.id).all()
-    for a in assignments:
-        a.found = False
-        a.timestamp_found = None  # reset timestamp if you have one
+    reset_count = _reset_found_assignments(team_id=team.id)
 
     if team.game:
         _set_game_admin_status(team.game, 'ready')
@@ -795,30 +1512,36 @@ def reset_locations(team_id):
 
     return jsonify({
         "success": True,
-        "message": f"Reset {len(assignments)} location assignments for team {team.name} (id={team.id})",
+        "message": f"Reset {reset_count} location assignments for team {team.name} (id={team.id})",
         "game_id": team.game_id,
         "status": team.game.get_admin_status() if team.game else None,
+        "reset_assignments": reset_count,
     })
 
 
 @api_bp.route('/api/game/state', methods=['GET'])
 @login_required
 def get_game_state():
-    start_time = time.time()
     game_id = request.args.get('game_id', type=int)
     team_id = request.args.get('team_id', type=int)
 
     if not game_id or not team_id:
         return jsonify({"error": "Missing game_id or team_id"}), 400
 
+    progress_version = (
+        db.session.query(Team.progress_version)
+        .filter(Team.id == team_id, Team.game_id == game_id)
+        .scalar()
+    )
+    etag = f"state-{game_id}-{team_id}-{progress_version or 0}"
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
+
     # Query all locations for this game assigned to this team
-    db_query_start_time = time.time()
     assignments = TeamLocationAssignment.query.filter_by(
         game_id=game_id,
         team_id=team_id
     ).order_by(TeamLocationAssignment.id).all()
-    db_query_duration = time.time() - db_query_start_time
-    print(f"DEBUG: get_game_state DB query took {db_query_duration:.4f}s")
 
     locations_found = []
     current_index = 0
@@ -831,74 +1554,190 @@ def get_game_state():
         if a.found:
             current_index = idx + 1  # current_index points to next location to find
 
-    total_duration = time.time() - start_time
-    print(f"DEBUG: get_game_state total duration was {total_duration:.4f}s")
-    
-    return jsonify({
+    response = jsonify({
         "game_id": game_id,
         "team_id": team_id,
         "current_index": current_index,
         "locations_found": locations_found
     })
+    return _set_version_etag(response, etag)
 
-def get_game_status_data(game_filter=None):
+@api_bp.route('/api/game/<int:game_id>/events', methods=['GET'])
+@login_required
+def game_events(game_id):
     """
-    Fetches and prepares game status data for a given filter.
-    Returns a list of dictionaries with all game and team details, including all_game_selfies.
+    Server-Sent Events stream of found / reset / override / geofence events.
+    Admins see every team; players see their own team's and game-wide events.
     """
-    if game_filter:
-        games_to_process = Game.query.filter(game_filter).order_by(Game.name).all()
-    else:
-        games_to_process = Game.query.order_by(Game.name).all()
-
-    games_with_data = []
-    for game in games_to_process:
-        game_locations_map = {loc.id: loc.name for loc in game.locations}
-        game_data = {
-            "id": game.id,
-            "name": game.name,
-            "locations": [{"id": loc.id, "name": loc.name} for loc in game.locations],
-            "locations_map": game_locations_map,
-            "selfies": [],  # optional, per-game selfies
-            "teams": [],
-            "all_game_selfies": []  # <-- add combined selfies here
+    if not db.session.query(Game.id).filter_by(id=game_id).first():
+        return jsonify({"error": "Game not found"}), 404
+
+    team_ids = None
+    if not current_user.is_admin:
+        team_ids = {
+            row.team_id for row in db.session.query(TeamMembership.team_id)
+            .join(Team).filter(TeamMembership.user_id == current_user.id, Team.game_id == game_id)
         }
+        if not team_ids:
+            return jsonify({"error": "User is not part of a team in this game"}), 403
 
-        for team in game.teams:
-            team_data_dict = {}
-            if team.data and isinstance(team.data, str):
-                try:
-                    team_data_dict = json.loads(team.data)
-                except json.JSONDecodeError:
-                    pass
-            elif team.data:
-                team_data_dict = team.data
-
-            selfies = team_data_dict.get('selfies', {})
-            locations_map = {loc.id: loc.name for loc in game.locations}
-
-            # Add team info
-            game_data["teams"].append({
-                "id": team.id,
-                "name": team.name,
-                "selfies": selfies,
-                "locations_map": locations_map,
-            })
+    broker = get_event_broker()
+    if broker is None:
+        return jsonify({"error": "Live events are disabled"}), 404
 
-            # Collect all selfies for the game
-            for loc_id, filename in selfies.items():
-                loc_name = game_data["locations_map"].get(int(loc_id), None)  # ensure loc_id matches type
-                if loc_name:
-                    game_data["all_game_selfies"].append({
-                        "loc_id": loc_id,
-                        "filename": filename,
-                        "team_name": team.name,
-                        "loc_name": loc_name
-                    })
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id not in (None, '') else None
+    except ValueError:
+        last_event_id = None
+
+    subscription = broker.subscribe(game_id, last_event_id, team_ids)
+    config = current_app.config
+    stream = event_stream(
+        broker,
+        subscription,
+        heartbeat_s=config.get('EVENTS_HEARTBEAT_SECONDS', 15),
+        max_duration_s=config.get('EVENTS_STREAM_MAX_SECONDS'),
+        retry_ms=config.get('EVENTS_RETRY_MS', 3000),
+    )
+    # The stream never touches the database; end the read transaction so the
+    # pooled connection goes back before the response starts streaming.
+    db.session.rollback()
+
+    response = Response(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+_status_cache = SingleFlightCache(256)
+GAME_STATUS_PAGE_SIZE = 50
+MAX_GAME_STATUS_PAGE_SIZE = 200
+
+
+def _team_selfies(data):
+    if data and isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except json.JSONDecodeError:
+            return {}
+    if not isinstance(data, dict):
+        return {}
+    return dict(data.get('selfies', {}) or {})
+
+
+def _build_game_status(game_id, name, locations, teams):
+    locations_map = {loc_id: loc_name for loc_id, loc_name in locations}
+    game_data = {
+        "id": game_id,
+        "name": name,
+        "locations": [{"id": loc_id, "name": loc_name} for loc_id, loc_name in locations],
+        "locations_map": locations_map,
+        "selfies": [],  # optional, per-game selfies
+        "teams": [],
+        "all_game_selfies": [],
+    }
+
+    for team_id, team_name, team_data in teams:
+        selfies = _team_selfies(team_data)
+        game_data["teams"].append({
+            "id": team_id,
+            "name": team_name,
+            "selfies": selfies,
+        })
+
+        # Collect all selfies for the game
+        for loc_id, filename in selfies.items():
+            try:
+                loc_name = locations_map.get(int(loc_id))
+            except (TypeError, ValueError):
+                loc_name = None
+            if loc_name:
+                game_data["all_game_selfies"].append({
+                    "loc_id": loc_id,
+                    "filename": filename,
+                    "team_name": team_name,
+                    "loc_name": loc_name
+                })
+    return game_data
+
+
+def get_game_status_data(game_ids=None, offset=0, limit=None):
+    """
+    Status snapshots (locations, teams, selfies) for games ordered by name.
 
-        games_with_data.append(game_data)
+    Returns (games, total). Each game's snapshot is cached per content
+    version and team versions, so a dashboard poll is two small queries
+    until something in one of the games changes. Treat the result as read-only.
+    """
+    games_query = db.session.query(Game.id, Game.name, Game.content_version)
+    if game_ids is not None:
+        games_query = games_query.filter(Game.id.in_(game_ids))
+    total = games_query.count()
+    games_query = games_query.order_by(Game.name, Game.id).offset(offset)
+    if limit is not None:
+        games_query = games_query.limit(limit)
+    games = games_query.all()
+    if not games:
+        return [], total
+
+    page_ids = [game.id for game in games]
+    # Any team added, removed or changed (selfies live in team.data) moves this.
+    team_versions = {
+        row.game_id: (row.teams, row.versions, row.last_id)
+        for row in db.session.query(
+            Team.game_id,
+            db.func.count(Team.id).label('teams'),
+            db.func.sum(Team.progress_version).label('versions'),
+            db.func.max(Team.id).label('last_id'),
+        )
+        .filter(Team.game_id.in_(page_ids))
+        .group_by(Team.game_id)
+    }
 
-    return games_with_data
+    keys = {
+        game.id: ('status', game.id, game.content_version, team_versions.get(game.id))
+        for game in games
+    }
+    loaded = {}
+
+    def _load_missing():
+        # One query each for the locations and teams of every uncached game.
+        missing = [game.id for game in games if keys[game.id] not in _status_cache]
+        locations, teams = {}, {}
+        if missing:
+            for row in (db.session.query(Location.game_id, Location.id, Location.name)
+                        .filter(Location.game_id.in_(missing)).order_by(Location.id)):
+                locations.setdefault(row.game_id, []).append((row.id, row.name))
+            for row in (db.session.query(Team.game_id, Team.id, Team.name, Team.data)
+                        .filter(Team.game_id.in_(missing)).order_by(Team.id)):
+                teams.setdefault(row.game_id, []).append((row.id, row.name, row.data))
+        loaded.update(locations=locations, teams=teams)
+
+    snapshots = []
+    for game in games:
+        def _compute(game=game):
+            if not loaded:
+                _load_missing()
+            return _build_game_status(
+                game.id, game.name,
+                loaded['locations'].get(game.id, []),
+                loaded['teams'].get(game.id, []),
+            )
+        snapshots.append(_status_cache.get_or_compute(keys[game.id], _compute))
+    return snapshots, total
+
+
+def parse_game_status_args(args):
+    """(game_ids, offset, limit) from ?games=1,2&offset=&limit= query args."""
+    game_ids = None
+    selected = args.get('games')
+    if selected:
+        game_ids = [int(gid) for gid in selected.split(',') if gid.strip().isdigit()]
+    offset = max(0, args.get('offset', 0, type=int) or 0)
+    limit = args.get('limit', GAME_STATUS_PAGE_SIZE, type=int) or GAME_STATUS_PAGE_SIZE
+    limit = max(1, min(limit, MAX_GAME_STATUS_PAGE_SIZE))
+    return game_ids, offset, limit
 
 
 # # main.py or wherever your routes live
@@ -931,42 +1770,194 @@ def get_game_status_data(game_filter=None):
 @login_required
 def api_game_status():
     """Returns game status data as JSON for the JavaScript frontend."""
-    games_with_data = get_game_status_data()
-    return jsonify(games_with_data)
+    game_ids, offset, limit = parse_game_status_args(request.args)
+    games_with_data, total = get_game_status_data(game_ids, offset=offset, limit=limit)
+    response = jsonify(games_with_data)
+    response.headers['X-Total-Count'] = str(total)
+    return response
 
 
-@api_bp.route('/api/team/<int:team_id>/geofence_state', methods=['GET', 'POST'])
+def _queue_geofence_event(team, version, changed):
+    if changed:
+        queue_game_event(db.session, team.game_id, 'geofence', {
+            'team_id': team.id,
+            'version': version,
+            'fence_ids': changed,
+        })
+
+
+@api_bp.route('/api/team/<int:team_id>/geofence_state', methods=['GET', 'POST', 'PATCH'])
 @login_required
 def api_team_geofence_state(team_id):
+    """
+    GET:   full state, or with ?since=<version> only the fences written after it.
+    PATCH: {"geofence_state": {fence_id: entry|null}, "geofence_runtime": {...},
+           "deleted": [fence_id, ...]} writes just those fences.
+    POST:  replaces both dicts (older clients); unchanged fences are not rewritten.
+    """
     team = Team.query.get_or_404(team_id)
     membership = TeamMembership.query.filter_by(user_id=current_user.id, team_id=team_id).first()
     if not membership and not getattr(current_user, 'is_admin', False):
         return jsonify({'success': False, 'message': 'Forbidden'}), 403
 
     if request.method == 'GET':
+        since = request.args.get('since', type=int)
+        if since is not None:
+            return jsonify({'success': True, 'team_id': team.id, **geofence_changes_since(db.session, team, since)})
+        geofence_state, geofence_runtime = team.get_geofence_tracking()
         return jsonify({
             'success': True,
             'team_id': team.id,
-            'geofence_state': team.get_geofence_state(),
-            'geofence_runtime': team.get_geofence_runtime_state(),
+            'version': team.geofence_version,
+            'geofence_state': geofence_state,
+            'geofence_runtime': geofence_runtime,
         })
 
     payload = request.get_json(silent=True) or {}
-    team.set_geofence_tracking(
+    if request.method == 'PATCH':
+        deleted = payload.get('deleted') or []
+        if not isinstance(deleted, list):
+            return jsonify({'success': False, 'message': 'deleted must be a list of fence ids'}), 400
+        version, changed = apply_geofence_patch(
+            db.session, team,
+            state=_normalize_tracking_payload(payload.get('geofence_state')),
+            runtime=_normalize_tracking_payload(payload.get('geofence_runtime')),
+            deleted=deleted,
+        )
+        _queue_geofence_event(team, version, changed)
+        db.session.commit()
+        return jsonify({'success': True, 'team_id': team.id, 'version': version, 'changed': changed})
+
+    version, changed = team.set_geofence_tracking(
         geofence_state=_normalize_tracking_payload(payload.get('geofence_state')),
         geofence_runtime=_normalize_tracking_payload(payload.get('geofence_runtime')),
     )
-    db.session.add(team)
+    _queue_geofence_event(team, version, changed)
     db.session.commit()
 
+    geofence_state, geofence_runtime = team.get_geofence_tracking()
     return jsonify({
         'success': True,
         'team_id': team.id,
-        'geofence_state': team.get_geofence_state(),
-        'geofence_runtime': team.get_geofence_runtime_state(),
+        'version': version,
+        'changed': changed,
+        'geofence_state': geofence_state,
+        'geofence_runtime': geofence_runtime,
     })
 
 
+@api_bp.route('/api/team/<int:team_id>/geofence_positions', methods=['POST'])
+@login_required
+def api_team_geofence_positions(team_id):
+    """
+    Evaluate a batch of positions ({"positions": [{"lat", "lon", "t"}, ...]},
+    t as ISO 8601 or epoch ms) against the game's geofences and store the
+    resulting team geofence state. Only the team's current target location
+    is watched unless "location_ids" is given, as on the client.
+    """
+    team = Team.query.get_or_404(team_id)
+    membership = TeamMembership.query.filter_by(user_id=current_user.id, team_id=team_id).first()
+    if not membership and not getattr(current_user, 'is_admin', False):
+        return jsonify({'success': False, 'message': 'Forbidden'}), 403
+
+    payload = request.get_json(silent=True) or {}
+    raw_positions = payload.get('positions')
+    if not isinstance(raw_positions, list):
+        return jsonify({'success': False, 'message': 'positions must be a list'}), 400
+    if len(raw_positions) > MAX_POSITION_BATCH:
+        return jsonify({'success': False, 'message': f'At most {MAX_POSITION_BATCH} positions per batch'}), 413
+
+    location_ids = payload.get('location_ids')
+    if location_ids is not None:
+        try:
+            location_ids = [int(location_id) for location_id in location_ids]
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'location_ids must be a list of ids'}), 400
+    else:
+        progress = get_team_progress(db.session, team.id)
+        location_ids = [progress.next_location_id] if progress and progress.next_location_id else []
+
+    positions = normalize_positions(raw_positions)
+    triggered, geofence_state, geofence_runtime = evaluate_positions(
+        team.game.get_compiled_geofences(),
+        positions,
+        *team.get_geofence_tracking(),
+        location_ids=location_ids,
+    )
+
+    # Untouched fences compare equal and are skipped.
+    version, changed = apply_geofence_patch(db.session, team, state=geofence_state, runtime=geofence_runtime)
+    _queue_geofence_event(team, version, changed)
+    db.session.commit()
+
+    return jsonify({
+        'success': True,
+        'team_id': team.id,
+        'evaluated': len(positions),
+        'triggered': triggered,
+        'version': version,
+        'geofence_state': geofence_state,
+        'geofence_runtime': geofence_runtime,
+    })
+
+
+@api_bp.route('/api/team/<int:team_id>/track', methods=['GET', 'POST'])
+@login_required
+def api_team_track(team_id):
+    """
+    POST: {"samples": [[t_ms, lat, lon, accuracy], ...]} (or {"t", "lat", "lon",
+          "accuracy"} dicts) buffers GPS samples for the team's track; 202.
+    GET:  the whole stored track as [t_ms, lat, lon, accuracy] rows in time
+          order, optionally thinned with ?simplify=<meters>.
+    """
+    team = Team.query.get_or_404(team_id)
+    membership = TeamMembership.query.filter_by(user_id=current_user.id, team_id=team_id).first()
+    if not membership and not getattr(current_user, 'is_admin', False):
+        return jsonify({'success': False, 'message': 'Forbidden'}), 403
+
+    if request.method == 'GET':
+        # Include whatever this worker still has buffered for the team; other
+        # workers' samples arrive within their flush interval.
+        flush_tracks(db.session, team_ids=[team.id])
+        t_ms, lat, lon, acc = read_track(db.session, team.id)
+        simplify = request.args.get('simplify', type=float)
+        if simplify and len(t_ms):
+            keep = simplify_mask(lat, lon, simplify)
+            t_ms, lat, lon, acc = t_ms[keep], lat[keep], lon[keep], acc[keep]
+        accuracy = [None if value != value else int(value) for value in acc.tolist()]
+        return jsonify({
+            'success': True,
+            'team_id': team.id,
+            'count': len(t_ms),
+            'points': [list(point) for point in zip(t_ms.tolist(), lat.tolist(), lon.tolist(), accuracy)],
+        })
+
+    payload = request.get_json(silent=True) or {}
+    raw_samples = payload.get('samples')
+    if not isinstance(raw_samples, list):
+        return jsonify({'success': False, 'message': 'samples must be a list'}), 400
+    max_batch = current_app.config.get('TRACK_MAX_BATCH', 5000)
+    if len(raw_samples) > max_batch:
+        return jsonify({'success': False, 'message': f'At most {max_batch} samples per batch'}), 413
+
+    arrays, rejected = parse_samples(raw_samples)
+    buffer = get_track_buffer()
+    buffer.add(team.id, team.game_id, arrays)
+    # Write out every team that is due, not just this one.
+    try:
+        flush_tracks(db.session, due_only=True)
+    except Exception:
+        current_app.logger.exception("Track flush failed; samples stay buffered")
+
+    return jsonify({
+        'success': True,
+        'team_id': team.id,
+        'accepted': len(arrays[0]),
+        'rejected': rejected,
+        'buffered': buffer.buffered(team.id),
+    }), 202
+
+
 # ====================================================================
 # LOCATION ADMIN
 # ====================================================================
@@ -981,7 +1972,7 @@ def get_game_locations():
 
     game = Game.query.get(game_id)
     locations = Location.query.filter_by(game_id=game_id).all()
-    geofence_map = game.get_geofence_config().get('locations', {}) if game else {}
+    geofences = game.get_compiled_geofences() if game else None
     return jsonify([
         {
             "id": loc.id,
@@ -991,7 +1982,7 @@ def get_game_locations():
             "latitude": loc.latitude,
             "longitude": loc.longitude,
             "show_pin": loc.show_pin,
-            "has_geofence": bool(geofence_map.get(str(loc.id))),
+            "has_geofence": bool(geofences and geofences.fences_for(loc.id)),
         } for loc in locations
     ])
 
@@ -1005,7 +1996,6 @@ def location_detail(loc_id):
     loc = Location.query.get_or_404(loc_id)
 
     if request.method == 'GET':
-        geofence_map = loc.game.get_geofence_config().get('locations', {}) if loc.game else {}
         return jsonify({
             "id": loc.id,
             "name": loc.name,
@@ -1014,7 +2004,7 @@ def location_detail(loc_id):
             "latitude": loc.latitude,
             "longitude": loc.longitude,
             "show_pin": loc.show_pin,
-            "has_geofence": bool(geofence_map.get(str(loc.id))),
+            "has_geofence": bool(loc.game and loc.game.get_compiled_geofences().fences_for(loc.id)),
         })
 
     elif request.method == 'PUT':
@@ -1040,7 +2030,7 @@ def location_detail(loc_id):
             "latitude": loc.latitude,
             "longitude": loc.longitude,
             "show_pin": loc.show_pin,
-            "has_geofence": bool(loc.game and loc.game.get_location_geofences(loc.id)),
+            "has_geofence": bool(loc.game and loc.game.get_compiled_geofences().fences_for(loc.id)),
         }})
 
     elif request.method == 'DELETE':
@@ -1206,6 +2196,54 @@ def save_all_routes(game_id):
 
     return jsonify(success=True, message="All routes saved successfully!", routes=validated_routes)
 
+@api_bp.route('/api/game/<int:game_id>/routes/generate', methods=['POST'])
+@admin_required
+def generate_routes(game_id):
+    """
+    Generate routes from the game's locations (see app/route_planner.py).
+    Expects JSON: { "count": 5, "route_length": 8, "start_location_id": 1,
+                    "finish_location_id": 2, "balance": true, "seed": 42,
+                    "save": true }
+    All fields are optional; count defaults to the number of teams and
+    route_length to every location. With save (the default) the routes
+    replace game.data['routes'].
+    """
+    game = Game.query.get_or_404(game_id)
+    payload = request.get_json(silent=True) or {}
+
+    try:
+        count = payload.get('count')
+        count = int(count) if count is not None else max(1, Team.query.filter_by(game_id=game.id).count())
+        options = {'balance': bool(payload.get('balance', True))}
+        for key, option in (('route_length', 'route_length'), ('start_location_id', 'start_id'),
+                            ('finish_location_id', 'finish_id'), ('seed', 'seed')):
+            if payload.get(key) is not None:
+                options[option] = int(payload[key])
+    except (TypeError, ValueError):
+        return jsonify(error="count, route_length, location ids and seed must be integers"), 400
+
+    started = time.perf_counter()
+    try:
+        planned = generate_game_routes(db.session, game, count, **options)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    routes = [route for route, _length in planned]
+    if payload.get('save', True):
+        game.data = game.data or {}
+        game.data['routes'] = routes
+        flag_modified(game, 'data')
+        db.session.commit()
+
+    return jsonify(
+        success=True,
+        saved=bool(payload.get('save', True)),
+        routes=routes,
+        lengths_m=[round(length, 1) for _route, length in planned],
+        elapsed_ms=elapsed_ms,
+    )
+
 
 
 # ====================================================================
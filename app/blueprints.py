@@ -13,4 +13,7 @@ def register_blueprints(app):
     app.register_blueprint(teams_bp)
 
     from app.api import api_bp
-    app.register_blueprint(api_bp)
\ No newline at end of file
+    app.register_blueprint(api_bp)
+
+    from app.tiles import tiles_bp
+    app.register_blueprint(tiles_bp)
\ No newline at end of file
@@ -22,6 +22,59 @@ class BaseConfig:
     SESSION_COOKIE_SECURE = False    # True only in HTTPS
     REMEMBER_COOKIE_SECURE = False           # True in prod HTTPS
 
+    # Shared tombstone / idempotency store (app.main.cache)
+    TOMBSTONE_TTL_SECONDS = 3600
+    TOMBSTONE_PURGE_INTERVAL_SECONDS = 300
+
+    # Bundle change log (app.versions); older delta requests get a full bundle
+    VERSION_CHANGE_RETENTION_SECONDS = 7 * 24 * 3600
+
+    # Offline tile selection (app.main.tile_selector); games may override
+    # these with offline_tile_budget_bytes / offline_buffer_m in Game.data
+    OFFLINE_TILE_BUDGET_BYTES = 50 * 1024 * 1024
+    OFFLINE_TILE_AVG_BYTES = 20000
+
+    # Optional server-side tile proxy (app.tiles). When enabled, bundles point
+    # at /tiles/<z>/<x>/<y>.png, served from an MBTiles file in the instance
+    # folder unless TILE_STORE_PATH is set.
+    TILE_PROXY_ENABLED = os.getenv('TILE_PROXY_ENABLED', '').lower() in ('1', 'true', 'yes')
+    TILE_UPSTREAM_URL = "https://tile.openstreetmap.org/{z}/{x}/{y}.png"
+    TILE_STORE_PATH = os.getenv('TILE_STORE_PATH')
+    TILE_STORE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+    TILE_PREFETCH_CONCURRENCY = 4
+    TILE_FETCH_TIMEOUT_SECONDS = 10
+    TILE_USER_AGENT = 'geokr-tile-proxy/1.0'
+
+    # Offline asset packs (app.main.asset_pack); defaults to <instance>/asset_packs
+    ASSET_PACK_DIR = os.getenv('ASSET_PACK_DIR')
+
+    # Per-process cache of logged-in users and their roles (app.users); off by
+    # default. With a TTL, role changes made by other workers are picked up
+    # only once the entry expires, so deployments opt in knowingly.
+    USER_CACHE_TTL_SECONDS = int(os.getenv('USER_CACHE_TTL_SECONDS', '0'))
+
+    # Live game events (app.events, /api/game/<id>/events). Each open stream
+    # occupies a worker thread until EVENTS_STREAM_MAX_SECONDS, then the
+    # browser reconnects; run gunicorn with threaded workers (see Procfile).
+    # EVENTS_REDIS_URL shares events between worker processes. Without it a
+    # multi-worker deployment silently misses events published elsewhere.
+    EVENTS_BUFFER_SIZE = 256
+    EVENTS_SUBSCRIBER_QUEUE = 100
+    EVENTS_HEARTBEAT_SECONDS = 15
+    EVENTS_STREAM_MAX_SECONDS = 300
+    EVENTS_RETRY_MS = 3000
+    EVENTS_REDIS_URL = os.getenv('EVENTS_REDIS_URL')
+
+    # Team GPS tracks (app.tracks, /api/team/<id>/track). Samples are buffered
+    # per worker and written as one chunk per team every TRACK_FLUSH_SECONDS
+    # (by a background thread as well as on ingest) or TRACK_CHUNK_MAX_POINTS
+    # samples. TRACK_SIMPLIFY_M > 0 thins chunks with Douglas-Peucker at that
+    # tolerance before they are stored.
+    TRACK_FLUSH_SECONDS = int(os.getenv('TRACK_FLUSH_SECONDS', '10'))
+    TRACK_CHUNK_MAX_POINTS = 2000
+    TRACK_SIMPLIFY_M = float(os.getenv('TRACK_SIMPLIFY_M', '0'))
+    TRACK_MAX_BATCH = 5000
+
 class DevConfig(BaseConfig):
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///game.db'
@@ -0,0 +1,286 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+from flask import current_app
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, attributes
+
+from app import progress  # noqa: F401 -- its after_flush listener must run before ours
+from app.models import TeamLocationAssignment, TeamProgress
+
+# Live game events (Server-Sent Events).
+#
+# Writes queue events on the session (found / reset from the flush listener
+# below, override / geofence / bulk resets via queue_game_event()); they are
+# published only after the transaction commits and dropped on rollback.
+#
+# EventBroker keeps, per game, a ring buffer of recent events and the set of
+# open subscriptions. Each subscription is a bounded in-memory queue read by
+# one streaming response, so a subscriber never holds a DB connection. Event
+# ids increase per game; a client reconnecting with Last-Event-ID gets the
+# buffered events after that id, or a 'resync' event when they have been
+# dropped from the buffer (or the worker restarted) and it must refetch state.
+#
+# By default events stay in the publishing process. With EVENTS_REDIS_URL set
+# (requires the optional `redis` package) they go through Redis pub/sub, which
+# also assigns the ids, so every worker's broker sees every game's events.
+
+RESYNC = 'resync'
+
+
+def format_sse(event_id, event_type, data):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    def __init__(self, game_id, team_ids, max_queue):
+        self.game_id = game_id
+        self.team_ids = team_ids
+        self.replay = []
+        self._queue = queue.Queue(maxsize=max_queue)
+
+    def wants(self, data):
+        # Game-wide events (no team_id) go to everyone.
+        team_id = data.get('team_id')
+        return self.team_ids is None or team_id is None or team_id in self.team_ids
+
+    def push(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # Too slow to keep up: drop the backlog and ask for a resync.
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._queue.put_nowait((item[0], RESYNC, {'reason': 'overflow'}))
+
+    def get(self, timeout):
+        """Next (event_id, event_type, data), or None after timeout seconds."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class _Channel:
+    __slots__ = ('buffer', 'last_id', 'subscribers')
+
+    def __init__(self, buffer_size):
+        self.buffer = deque(maxlen=buffer_size)
+        self.last_id = 0
+        self.subscribers = set()
+
+
+class EventBroker:
+    """In-process per-game fan-out with a bounded replay buffer."""
+
+    def __init__(self, buffer_size=256, max_queue=100):
+        self.buffer_size = buffer_size
+        self.max_queue = max_queue
+        self.backend = None
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def _channel(self, game_id):
+        channel = self._channels.get(game_id)
+        if channel is None:
+            channel = self._channels[game_id] = _Channel(self.buffer_size)
+        return channel
+
+    def publish(self, game_id, event_type, data):
+        if self.backend is not None:
+            self.backend.publish(game_id, event_type, data)
+            return None
+        return self.deliver(game_id, None, event_type, data)
+
+    def deliver(self, game_id, event_id, event_type, data):
+        """Buffer an event (numbering it when event_id is None) and fan it out."""
+        with self._lock:
+            channel = self._channel(game_id)
+            if event_id is None:
+                event_id = channel.last_id + 1
+            channel.last_id = max(channel.last_id, event_id)
+            item = (event_id, event_type, data)
+            channel.buffer.append(item)
+            subscribers = list(channel.subscribers)
+        for subscription in subscribers:
+            if subscription.wants(data):
+                subscription.push(item)
+        return event_id
+
+    def subscribe(self, game_id, last_event_id=None, team_ids=None):
+        subscription = Subscription(game_id, team_ids, self.max_queue)
+        with self._lock:
+            channel = self._channel(game_id)
+            channel.subscribers.add(subscription)
+            if last_event_id is not None:
+                buffered = list(channel.buffer)
+                oldest = buffered[0][0] if buffered else channel.last_id + 1
+                if last_event_id > channel.last_id or last_event_id < oldest - 1:
+                    subscription.replay = [(channel.last_id, RESYNC, {'reason': 'gap'})]
+                else:
+                    subscription.replay = [
+                        item for item in buffered
+                        if item[0] > last_event_id and subscription.wants(item[2])
+                    ]
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            channel = self._channels.get(subscription.game_id)
+            if channel is not None:
+                channel.subscribers.discard(subscription)
+
+    def subscriber_count(self, game_id):
+        with self._lock:
+            channel = self._channels.get(game_id)
+            return len(channel.subscribers) if channel else 0
+
+
+class RedisEventBackend:
+    """Share events between workers through Redis pub/sub."""
+
+    CHANNEL_PREFIX = 'geokr:events:'
+
+    def __init__(self, broker, url):
+        import redis  # optional dependency, only needed with EVENTS_REDIS_URL
+
+        self.broker = broker
+        self.client = redis.Redis.from_url(url)
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.psubscribe(f'{self.CHANNEL_PREFIX}*')
+        self._thread = threading.Thread(target=self._listen, name='game-events-redis', daemon=True)
+        self._thread.start()
+
+    def publish(self, game_id, event_type, data):
+        event_id = self.client.incr(f'{self.CHANNEL_PREFIX}seq:{game_id}')
+        payload = json.dumps({'id': event_id, 'type': event_type, 'data': data})
+        self.client.publish(f'{self.CHANNEL_PREFIX}{game_id}', payload)
+
+    def _listen(self):
+        for message in self._pubsub.listen():
+            try:
+                game_id = int(message['channel'].decode().rsplit(':', 1)[1])
+                payload = json.loads(message['data'])
+            except (ValueError, KeyError, AttributeError):
+                continue
+            self.broker.deliver(game_id, payload['id'], payload['type'], payload['data'])
+
+
+def event_stream(broker, subscription, heartbeat_s, max_duration_s=None, retry_ms=3000, clock=time.monotonic):
+    """
+    Yield SSE text for a subscription: replayed events, then live ones, with a
+    comment line every heartbeat_s of silence. Ends after max_duration_s so the
+    worker thread is recycled; EventSource reconnects with Last-Event-ID.
+    """
+    deadline = clock() + max_duration_s if max_duration_s else None
+    try:
+        yield f"retry: {int(retry_ms)}\n\n"
+        for event_id, event_type, data in subscription.replay:
+            yield format_sse(event_id, event_type, data)
+        while deadline is None or clock() < deadline:
+            item = subscription.get(heartbeat_s)
+            if item is None:
+                yield ': heartbeat\n\n'
+                continue
+            yield format_sse(*item)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def get_event_broker(app=None):
+    app = app or current_app
+    return app.extensions.get('event_broker')
+
+
+def init_events(app):
+    broker = EventBroker(
+        buffer_size=app.config.get('EVENTS_BUFFER_SIZE', 256),
+        max_queue=app.config.get('EVENTS_SUBSCRIBER_QUEUE', 100),
+    )
+    redis_url = app.config.get('EVENTS_REDIS_URL')
+    if redis_url:
+        broker.backend = RedisEventBackend(broker, redis_url)
+    app.extensions['event_broker'] = broker
+    return broker
+
+
+def queue_game_event(session, game_id, event_type, data):
+    """Publish an event for game_id once the session's transaction commits."""
+    if game_id is None:
+        return
+    session.info.setdefault('game_events', []).append((game_id, event_type, dict(data)))
+
+
+def _assignment_events(session):
+    events = []
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, TeamLocationAssignment):
+            continue
+        if obj in session.new:
+            was_found = False
+        else:
+            history = attributes.get_history(obj, 'found')
+            if not history.has_changes():
+                continue
+            was_found = bool(history.deleted[0]) if history.deleted else False
+        now_found = bool(obj.found)
+        if now_found == was_found:
+            continue
+        events.append((obj.game_id, 'found' if now_found else 'reset', {
+            'team_id': obj.team_id,
+            'location_id': obj.location_id,
+            'timestamp_found': obj.timestamp_found.isoformat() if now_found and obj.timestamp_found else None,
+        }))
+    return events
+
+
+@event.listens_for(Session, 'after_flush')
+def _queue_assignment_events(session, flush_context):
+    events = _assignment_events(session)
+    if not events:
+        return
+
+    # TeamProgress was refreshed by app/progress.py earlier in this flush.
+    table = TeamProgress.__table__
+    team_ids = {data['team_id'] for _game_id, _type, data in events}
+    progress = {
+        row.team_id: {'found': row.found_count, 'total': row.total}
+        for row in session.connection().execute(
+            select(table.c.team_id, table.c.found_count, table.c.total).where(table.c.team_id.in_(team_ids))
+        )
+    }
+    for game_id, event_type, data in events:
+        data['team_progress'] = progress.get(data['team_id'])
+        queue_game_event(session, game_id, event_type, data)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_after_commit(session):
+    events = session.info.pop('game_events', None)
+    if not events:
+        return
+    try:
+        broker = get_event_broker()
+    except RuntimeError:
+        # No app context (e.g. a script using the models directly).
+        return
+    if broker is None:
+        return
+    for game_id, event_type, data in events:
+        broker.publish(game_id, event_type, data)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_after_rollback(session, previous_transaction):
+    session.info.pop('game_events', None)
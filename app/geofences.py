@@ -0,0 +1,723 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from types import MappingProxyType
+
+import numpy as np
+
+# Compiled geofence configuration.
+#
+# Game.data['geofences'] / ['geofence_settings'] are free-form JSON written by
+# the admin UI. compile_geofences() validates and normalizes them once into
+# immutable __slots__ objects grouped by location id, so per-request callers
+# get a location's fences with a dict lookup instead of re-normalizing the
+# whole blob. Compiled configs are memoized per (game id, content version);
+# any write to Game.data bumps the content version (see app/versions.py).
+#
+# evaluate_positions() is the server-side counterpart of the enter/exit logic
+# in static/js/geofences.js: it replays a batch of timestamped positions
+# against a team's geofence history/runtime dicts (same shape the client
+# persists) and returns the messages that fired. Candidate fences for a
+# position come from a per-config FenceGrid, so the work per position depends
+# on the fences nearby, not on how many fences the game has.
+#
+# Fences are circles (center + radius_m) or polygons / multipolygons given as
+# GeoJSON coordinates ([lon, lat] pairs; later rings of a polygon are holes).
+# Every fence carries a lat/lon bounding box for the grid and quick rejection;
+# polygon fences also get an EdgeTable, their edges bucketed into latitude
+# bands, so a ray-casting test only looks at the edges near the point's
+# latitude and runs vectorized over a whole batch of points.
+
+DEFAULT_SETTINGS = MappingProxyType({
+    'enabled': False,
+    'poll_interval_s': 20,
+    'default_cooldown_s': 300,
+    'default_repeat_every_s': 180,
+})
+
+MAX_CACHED_CONFIGS = 256
+MAX_POSITION_BATCH = 2000
+
+GRID_CELL_M = 250.0
+# A fence spanning more cells than this is checked for every position instead.
+MAX_CELLS_PER_FENCE = 256
+METERS_PER_DEGREE_LAT = 111320.0
+EARTH_RADIUS_M = 6371000
+
+POLYGON_SHAPES = ('polygon', 'multipolygon')
+MAX_POLYGON_VERTICES = 5000
+
+
+def _coerce_positive_int(value, default):
+    try:
+        parsed = int(value)
+    except (TypeError, ValueError):
+        return default
+    return parsed if parsed > 0 else default
+
+
+def _coerce_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Frozen:
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+
+def _lon_scale(lat):
+    return max(math.cos(math.radians(lat)), 0.01)
+
+
+def _circle_bbox(lat, lon, radius_m):
+    d_lat = radius_m / METERS_PER_DEGREE_LAT
+    d_lon = radius_m / (METERS_PER_DEGREE_LAT * _lon_scale(lat))
+    return (lat - d_lat, lon - d_lon, lat + d_lat, lon + d_lon)
+
+
+class EdgeTable(_Frozen):
+    """
+    Non-horizontal polygon edges as arrays (start lat/lon, end lat, lon per
+    degree of lat), indexed by latitude band. Holes and multipolygon parts
+    need no special casing: ray-casting parity over all rings gives the
+    right answer.
+    """
+
+    __slots__ = ('lat0', 'lon0', 'lat1', 'slope', 'band_origin', 'band_height', 'bands')
+
+    def __init__(self, rings):
+        edges = [
+            (a[0], a[1], b[0], b[1])
+            for ring in rings
+            for a, b in zip(ring, ring[1:] + ring[:1])
+            if a[0] != b[0]
+        ]
+        table = np.array(edges, dtype=np.float64).reshape(-1, 4)
+        lat0, lon0, lat1, lon1 = table.T
+        object.__setattr__(self, 'lat0', lat0)
+        object.__setattr__(self, 'lon0', lon0)
+        object.__setattr__(self, 'lat1', lat1)
+        object.__setattr__(self, 'slope', (lon1 - lon0) / (lat1 - lat0))
+
+        # About sqrt(edges) bands keeps both the band count and the edges per
+        # band small.
+        low = np.minimum(lat0, lat1)
+        high = np.maximum(lat0, lat1)
+        origin = float(low.min()) if len(edges) else 0.0
+        span = (float(high.max()) - origin) if len(edges) else 0.0
+        band_count = max(1, int(math.sqrt(len(edges))))
+        height = span / band_count if span > 0 else 1.0
+        first = np.clip(((low - origin) // height).astype(np.int64), 0, band_count - 1)
+        last = np.clip(((high - origin) // height).astype(np.int64), 0, band_count - 1)
+        bands = tuple(
+            np.flatnonzero((first <= band) & (last >= band)) for band in range(band_count)
+        )
+        object.__setattr__(self, 'band_origin', origin)
+        object.__setattr__(self, 'band_height', height)
+        object.__setattr__(self, 'bands', bands)
+
+    def contains(self, lats, lons):
+        """Boolean array: which (lat, lon) points lie inside (even-odd rule)."""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        inside = np.zeros(lats.shape, dtype=bool)
+        band_ids = np.clip(((lats - self.band_origin) // self.band_height).astype(np.int64), 0, len(self.bands) - 1)
+
+        for band in np.unique(band_ids):
+            edge_ids = self.bands[band]
+            if not len(edge_ids):
+                continue
+            point_ids = np.flatnonzero(band_ids == band)
+            lat = lats[point_ids, None]
+            lat0 = self.lat0[edge_ids]
+            # Half-open test so a vertex shared by two edges is counted once.
+            spans = (lat0 > lat) != (self.lat1[edge_ids] > lat)
+            crossing_lon = self.lon0[edge_ids] + (lat - lat0) * self.slope[edge_ids]
+            crossings = np.count_nonzero(spans & (lons[point_ids, None] < crossing_lon), axis=1)
+            inside[point_ids] = crossings % 2 == 1
+        return inside
+
+
+class CompiledFence(_Frozen):
+    __slots__ = (
+        'id', 'location_id', 'enabled', 'shape', 'center_lat', 'center_lon', 'radius_m',
+        'trigger', 'message', 'cooldown_s', 'once_per_team', 'priority',
+        'repeat_while', 'repeat_every_s', 'metadata', 'polygons', 'bbox', 'edges',
+    )
+
+    def __init__(self, **fields):
+        fields.setdefault('polygons', None)
+        if fields['polygons']:
+            rings = [ring for polygon in fields['polygons'] for ring in polygon]
+            lats = [lat for ring in rings for lat, _lon in ring]
+            lons = [lon for ring in rings for _lat, lon in ring]
+            fields['bbox'] = (min(lats), min(lons), max(lats), max(lons))
+            fields['center_lat'] = (fields['bbox'][0] + fields['bbox'][2]) / 2
+            fields['center_lon'] = (fields['bbox'][1] + fields['bbox'][3]) / 2
+            fields['edges'] = EdgeTable(rings)
+        else:
+            fields['bbox'] = _circle_bbox(fields['center_lat'], fields['center_lon'], fields['radius_m'])
+            fields['edges'] = None
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields[name])
+
+    def contains_many(self, lats, lons):
+        """Boolean array over a batch of points; bounding-box rejection first."""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        inside = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+        candidates = np.flatnonzero(inside)
+        if not len(candidates):
+            return inside
+        if self.edges is not None:
+            inside[candidates] = self.edges.contains(lats[candidates], lons[candidates])
+        else:
+            inside[candidates] = _distance_many(
+                lats[candidates], lons[candidates], self.center_lat, self.center_lon
+            ) <= self.radius_m
+        return inside
+
+    def contains(self, lat, lon):
+        return bool(self.contains_many([lat], [lon])[0])
+
+    def geojson_coordinates(self):
+        if self.polygons is None:
+            return None
+        polygons = [[[[lon, lat] for lat, lon in ring] for ring in polygon] for polygon in self.polygons]
+        return polygons[0] if self.shape == 'polygon' else polygons
+
+    def to_dict(self):
+        fence = {
+            'id': self.id,
+            'enabled': self.enabled,
+            'shape': self.shape,
+            'center': {'lat': self.center_lat, 'lon': self.center_lon},
+            'radius_m': self.radius_m,
+            'trigger': self.trigger,
+            'message': self.message,
+            'cooldown_s': self.cooldown_s,
+            'once_per_team': self.once_per_team,
+            'priority': self.priority,
+            'repeat_while': self.repeat_while,
+            'repeat_every_s': self.repeat_every_s,
+            'metadata': dict(self.metadata),
+            'location_id': self.location_id,
+        }
+        if self.polygons is not None:
+            min_lat, min_lon, max_lat, max_lon = self.bbox
+            fence['coordinates'] = self.geojson_coordinates()
+            fence['bbox'] = [min_lon, min_lat, max_lon, max_lat]
+        return fence
+
+
+class CompiledGeofenceConfig(_Frozen):
+    __slots__ = ('settings', 'by_location', '_as_dict', '_grid')
+
+    def __init__(self, settings, by_location):
+        object.__setattr__(self, 'settings', MappingProxyType(dict(settings)))
+        object.__setattr__(self, 'by_location', MappingProxyType(dict(by_location)))
+        object.__setattr__(self, '_as_dict', None)
+        object.__setattr__(self, '_grid', None)
+
+    @property
+    def enabled(self):
+        return bool(self.settings['enabled'])
+
+    def fences_for(self, location_id):
+        try:
+            return self.by_location.get(int(location_id), ())
+        except (TypeError, ValueError):
+            return ()
+
+    def has_fences(self):
+        return self.enabled and bool(self.by_location)
+
+    def as_dict(self):
+        """The legacy {'settings', 'locations'} dict form; built once, treat as read-only."""
+        if self._as_dict is None:
+            object.__setattr__(self, '_as_dict', {
+                'settings': dict(self.settings),
+                'locations': {
+                    str(location_id): [fence.to_dict() for fence in fences]
+                    for location_id, fences in self.by_location.items()
+                },
+            })
+        return self._as_dict
+
+    def grid(self):
+        """FenceGrid over the enabled fences; built once per config."""
+        if self._grid is None:
+            object.__setattr__(self, '_grid', FenceGrid(
+                fence for fences in self.by_location.values() for fence in fences if fence.enabled
+            ))
+        return self._grid
+
+
+def compile_settings(data):
+    if not data or not isinstance(data, dict):
+        return dict(DEFAULT_SETTINGS)
+
+    settings = dict(data.get('geofence_settings', {}) or {})
+    raw_geofences = data.get('geofences', {}) or {}
+
+    enabled = settings.get('enabled')
+    if enabled is None:
+        enabled = bool(raw_geofences)
+
+    return {
+        'enabled': bool(enabled),
+        'poll_interval_s': _coerce_positive_int(settings.get('poll_interval_s'), DEFAULT_SETTINGS['poll_interval_s']),
+        'default_cooldown_s': _coerce_positive_int(settings.get('default_cooldown_s'), DEFAULT_SETTINGS['default_cooldown_s']),
+        'default_repeat_every_s': _coerce_positive_int(settings.get('default_repeat_every_s'), DEFAULT_SETTINGS['default_repeat_every_s']),
+    }
+
+
+def _parse_ring(raw_ring):
+    if not isinstance(raw_ring, (list, tuple)):
+        raise ValueError('Each ring must be a list of [lon, lat] points.')
+    ring = []
+    for point in raw_ring:
+        if not isinstance(point, (list, tuple)) or len(point) < 2:
+            raise ValueError('Each point must be a [lon, lat] pair.')
+        lon, lat = _coerce_float(point[0]), _coerce_float(point[1])
+        if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError('Point coordinates must be a valid [lon, lat] pair.')
+        if not ring or ring[-1] != (lat, lon):
+            ring.append((lat, lon))
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring.pop()
+    if len(set(ring)) < 3:
+        raise ValueError('Each ring needs at least three distinct points.')
+    return tuple(ring)
+
+
+def parse_polygon_coordinates(shape, coordinates):
+    """
+    Validate GeoJSON Polygon / MultiPolygon coordinates ([lon, lat] points;
+    a bare ring is accepted for 'polygon'). Returns a tuple of polygons, each
+    a tuple of rings of (lat, lon) with the closing point dropped. Raises
+    ValueError with a message suitable for the admin form.
+    """
+    if isinstance(coordinates, dict):
+        shape = str(coordinates.get('type') or shape).lower()
+        coordinates = coordinates.get('coordinates')
+    if shape not in POLYGON_SHAPES:
+        raise ValueError('Shape must be polygon or multipolygon.')
+    if not isinstance(coordinates, (list, tuple)) or not coordinates:
+        raise ValueError('Polygon coordinates are required.')
+
+    if shape == 'polygon':
+        if isinstance(coordinates[0], (list, tuple)) and coordinates[0] and not isinstance(coordinates[0][0], (list, tuple)):
+            coordinates = [coordinates]
+        raw_polygons = [coordinates]
+    else:
+        raw_polygons = coordinates
+
+    polygons = []
+    for raw_polygon in raw_polygons:
+        if not isinstance(raw_polygon, (list, tuple)) or not raw_polygon:
+            raise ValueError('Each polygon must be a list of rings.')
+        polygons.append(tuple(_parse_ring(ring) for ring in raw_polygon))
+
+    if sum(len(ring) for polygon in polygons for ring in polygon) > MAX_POLYGON_VERTICES:
+        raise ValueError(f'Polygons are limited to {MAX_POLYGON_VERTICES} points per fence.')
+    return tuple(polygons)
+
+
+def _compile_fence(fence, location_id, index, settings):
+    if not isinstance(fence, dict):
+        return None
+
+    shape = (fence.get('shape') or '').strip().lower()
+    trigger = (fence.get('trigger') or '').strip().lower()
+    repeat_while = fence.get('repeat_while')
+    repeat_while = (repeat_while or '').strip().lower() if repeat_while else None
+
+    polygons = None
+    if shape in POLYGON_SHAPES:
+        try:
+            polygons = parse_polygon_coordinates(shape, fence.get('coordinates'))
+        except ValueError:
+            return None
+        # CompiledFence centers polygons on their bounding box.
+        center_lat = center_lon = radius_m = None
+    elif shape == 'circle':
+        center = dict(fence.get('center', {}) or {})
+        center_lat = _coerce_float(center.get('lat'))
+        center_lon = _coerce_float(center.get('lon'))
+        radius_m = _coerce_float(fence.get('radius_m'))
+        if center_lat is None or center_lon is None or radius_m is None or radius_m <= 0:
+            return None
+    else:
+        return None
+
+    if trigger not in {'enter', 'exit'}:
+        return None
+
+    message = (fence.get('message') or '').strip()
+    if not message:
+        return None
+
+    if repeat_while not in {'inside', 'outside'}:
+        repeat_while = None
+
+    return CompiledFence(
+        id=str(fence.get('id') or f'location-{location_id}-fence-{index + 1}'),
+        location_id=location_id,
+        enabled=bool(fence.get('enabled', True)),
+        shape=shape,
+        center_lat=center_lat,
+        center_lon=center_lon,
+        radius_m=radius_m,
+        trigger=trigger,
+        message=message,
+        cooldown_s=_coerce_positive_int(fence.get('cooldown_s'), settings['default_cooldown_s']),
+        once_per_team=bool(fence.get('once_per_team', False)),
+        priority=int(fence.get('priority', 0) or 0),
+        repeat_while=repeat_while,
+        repeat_every_s=(
+            _coerce_positive_int(fence.get('repeat_every_s'), settings['default_repeat_every_s'])
+            if repeat_while else None
+        ),
+        metadata=MappingProxyType(dict(fence.get('metadata', {}) or {})),
+        polygons=polygons,
+    )
+
+
+def compile_geofences(data):
+    """Validate and normalize a Game.data blob into a CompiledGeofenceConfig."""
+    settings = compile_settings(data)
+    if not data or not isinstance(data, dict):
+        return CompiledGeofenceConfig(settings, {})
+
+    by_location = {}
+    for raw_location_id, fences in (data.get('geofences', {}) or {}).items():
+        try:
+            location_id = int(raw_location_id)
+        except (TypeError, ValueError):
+            continue
+        if not isinstance(fences, list):
+            continue
+
+        compiled = tuple(
+            fence for fence in (
+                _compile_fence(raw, location_id, index, settings)
+                for index, raw in enumerate(fences)
+            ) if fence is not None
+        )
+        if compiled:
+            by_location[location_id] = compiled
+
+    return CompiledGeofenceConfig(settings, by_location)
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_compiled_geofences(game_id, content_version, data):
+    """Memoized compile_geofences() for a persisted, unmodified game."""
+    key = (game_id, content_version)
+    with _cache_lock:
+        compiled = _cache.get(key)
+        if compiled is not None:
+            _cache.move_to_end(key)
+            return compiled
+
+    compiled = compile_geofences(data)
+    with _cache_lock:
+        _cache[key] = compiled
+        while len(_cache) > MAX_CACHED_CONFIGS:
+            _cache.popitem(last=False)
+    return compiled
+
+
+def clear_geofence_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+class FenceGrid:
+    """
+    Uniform lat/lon grid of fence bounding boxes. candidates(lat, lon) returns
+    the fences whose box covers that point's cell (a superset of the fences
+    containing it); oversized fences are always returned.
+    """
+
+    def __init__(self, fences, cell_m=GRID_CELL_M):
+        self.fences = tuple(fences)
+        ref_lat = (sum(f.center_lat for f in self.fences) / len(self.fences)) if self.fences else 0.0
+        self.cell_lat = cell_m / METERS_PER_DEGREE_LAT
+        self.cell_lon = cell_m / (METERS_PER_DEGREE_LAT * _lon_scale(ref_lat))
+        self.cells = {}
+        always = []
+
+        for fence in self.fences:
+            min_lat, min_lon, max_lat, max_lon = fence.bbox
+            row0, col0 = self._cell(min_lat, min_lon)
+            row1, col1 = self._cell(max_lat, max_lon)
+            if (row1 - row0 + 1) * (col1 - col0 + 1) > MAX_CELLS_PER_FENCE:
+                always.append(fence)
+                continue
+            for row in range(row0, row1 + 1):
+                for col in range(col0, col1 + 1):
+                    self.cells.setdefault((row, col), []).append(fence)
+
+        self.always = tuple(always)
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_lat), math.floor(lon / self.cell_lon)
+
+    def candidates(self, lat, lon):
+        cell = self.cells.get(self._cell(lat, lon), ())
+        return [*cell, *self.always] if self.always else cell
+
+    def containing(self, lat, lon):
+        return [fence for fence in self.candidates(lat, lon) if fence.contains(lat, lon)]
+
+    def containing_batch(self, lats, lons):
+        """For each point, the set of ids of the fences containing it."""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        result = [set() for _ in range(len(lats))]
+        if not len(lats):
+            return result
+
+        # Group points by candidate fence, then test each fence once over its points.
+        points_by_fence = {}
+        rows = np.floor(lats / self.cell_lat).astype(np.int64)
+        cols = np.floor(lons / self.cell_lon).astype(np.int64)
+        for index, cell in enumerate(zip(rows.tolist(), cols.tolist())):
+            for fence in self.cells.get(cell, ()):
+                points_by_fence.setdefault(fence, []).append(index)
+        every_point = list(range(len(lats)))
+        for fence in self.always:
+            points_by_fence[fence] = every_point
+
+        for fence, point_ids in points_by_fence.items():
+            point_ids = np.asarray(point_ids)
+            for index in point_ids[fence.contains_many(lats[point_ids], lons[point_ids])].tolist():
+                result[index].add(fence.id)
+        return result
+
+
+def _distance_many(lats, lons, lat, lon):
+    """Haversine distances in meters (app.main.utils.haversine, vectorized)."""
+    phi1, phi2 = np.radians(lats), math.radians(lat)
+    a = (np.sin((phi2 - phi1) / 2) ** 2
+         + np.cos(phi1) * math.cos(phi2) * np.sin(np.radians(lon - lons) / 2) ** 2)
+    return EARTH_RADIUS_M * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def _parse_time_ms(value):
+    """Epoch milliseconds from an ISO 8601 string or an epoch-ms number."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if math.isfinite(value) else None
+    if isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp() * 1000
+    return None
+
+
+def _iso(ms):
+    # Same form as JavaScript's Date.prototype.toISOString().
+    moment = datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.') + f"{moment.microsecond // 1000:03d}Z"
+
+
+def normalize_positions(raw_positions, now_ms=None):
+    """
+    Validate [{'lat', 'lon', 't'}, ...] into time-ordered (ms, lat, lon)
+    tuples; entries without a usable lat/lon are dropped and a missing 't'
+    means now.
+    """
+    now_ms = time.time() * 1000 if now_ms is None else now_ms
+    positions = []
+    for raw in raw_positions or ():
+        if not isinstance(raw, dict):
+            continue
+        lat = _coerce_float(raw.get('lat', raw.get('latitude')))
+        lon = _coerce_float(raw.get('lon', raw.get('longitude')))
+        if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            continue
+        ms = _parse_time_ms(raw.get('t', raw.get('timestamp')))
+        positions.append((now_ms if ms is None else ms, lat, lon))
+    positions.sort(key=lambda position: position[0])
+    return positions
+
+
+def _latest_notification_ms(runtime_entry, history_entry):
+    stamps = [
+        _parse_time_ms(runtime_entry.get('last_notification_at')),
+        _parse_time_ms(runtime_entry.get('last_reminder_at')),
+        _parse_time_ms(history_entry.get('last_triggered_at')),
+        _parse_time_ms(history_entry.get('last_reminder_at')),
+    ]
+    stamps = [stamp for stamp in stamps if stamp]
+    return max(stamps) if stamps else None
+
+
+def _should_notify_transition(fence, history_entry, last_notification_ms, now_ms):
+    if fence.once_per_team and int(history_entry.get('times_triggered') or 0) > 0:
+        return False
+    if not last_notification_ms:
+        return True
+    return now_ms - last_notification_ms >= fence.cooldown_s * 1000
+
+
+def _should_notify_reminder(fence, current_state, history_entry, runtime_entry, now_ms):
+    if not fence.repeat_while or fence.repeat_while != current_state or not fence.repeat_every_s:
+        return False
+    if fence.once_per_team and int(history_entry.get('times_triggered') or 0) > 0:
+        return False
+    last_reminder_ms = (_parse_time_ms(runtime_entry.get('last_reminder_at'))
+                        or _latest_notification_ms(runtime_entry, history_entry))
+    if not last_reminder_ms:
+        return True
+    return now_ms - last_reminder_ms >= fence.repeat_every_s * 1000
+
+
+def _evaluate_fence(fence, inside, now_ms, history, runtime):
+    """Apply one observation of one fence; returns the triggered entry or None."""
+    runtime_entry = runtime.get(fence.id)
+    runtime_entry = dict(runtime_entry) if isinstance(runtime_entry, dict) else {
+        'fence_id': fence.id, 'location_id': fence.location_id,
+    }
+    history_entry = history.get(fence.id)
+    history_entry = dict(history_entry) if isinstance(history_entry, dict) else {
+        'fence_id': fence.id, 'location_id': fence.location_id, 'times_triggered': 0,
+    }
+
+    # A position older than this fence's last evaluation was already covered
+    # by an earlier (possibly overlapping) batch.
+    last_evaluated_ms = _parse_time_ms(runtime_entry.get('last_evaluated_at'))
+    if last_evaluated_ms is not None and now_ms <= last_evaluated_ms:
+        return None
+
+    current_state = 'inside' if inside else 'outside'
+    previous_state = runtime_entry.get('current_state')
+    transition = None
+    if previous_state != current_state:
+        transition = 'enter' if inside else 'exit'
+
+    reason = None
+    if transition and fence.trigger == transition and _should_notify_transition(
+            fence, history_entry, _latest_notification_ms(runtime_entry, history_entry), now_ms):
+        reason = 'transition'
+    elif not transition and _should_notify_reminder(fence, current_state, history_entry, runtime_entry, now_ms):
+        reason = 'reminder'
+
+    now_iso = _iso(now_ms)
+    runtime_entry.update({
+        'fence_id': fence.id,
+        'location_id': fence.location_id,
+        'inside': inside,
+        'current_state': current_state,
+        'last_evaluated_at': now_iso,
+    })
+    if transition:
+        runtime_entry['last_transition'] = transition
+        runtime_entry['last_transition_at'] = now_iso
+
+    triggered = None
+    if reason:
+        runtime_entry.update({'last_notification_at': now_iso, 'last_message': fence.message, 'last_message_at': now_iso})
+        history_entry.update({
+            'location_id': fence.location_id,
+            'times_triggered': int(history_entry.get('times_triggered') or 0) + 1,
+            'last_triggered_at': now_iso,
+            'last_transition': transition or current_state,
+        })
+        if reason == 'reminder':
+            runtime_entry['last_reminder_at'] = now_iso
+            history_entry['last_reminder_at'] = now_iso
+        triggered = {
+            'fence_id': fence.id,
+            'location_id': fence.location_id,
+            'message': fence.message,
+            'reason': reason,
+            'state': current_state,
+            'transition': transition,
+            'at': now_iso,
+        }
+
+    runtime[fence.id] = runtime_entry
+    history[fence.id] = history_entry
+    return triggered
+
+
+def evaluate_positions(config, positions, geofence_state=None, geofence_runtime=None, location_ids=None):
+    """
+    Replay time-ordered (ms, lat, lon) positions against config's enabled
+    fences, restricted to location_ids when given (the client only watches
+    the team's current target). Containment for the whole batch is computed
+    up front. Mirrors static/js/geofences.js, including cooldown_s,
+    once_per_team, repeat_while and repeat_every_s.
+
+    At each position only these fences are looked at: those containing it
+    (via the grid), those last seen inside (possible exits), repeat-while-
+    outside fences, and exit fences not seen yet. Any other fence is outside
+    and unchanged, so skipping it cannot fire anything.
+
+    Returns (triggered, geofence_state, geofence_runtime); the input dicts
+    are not modified.
+    """
+    history = dict(geofence_state or {})
+    runtime = dict(geofence_runtime or {})
+    triggered = []
+    if not config.enabled or not positions:
+        return triggered, history, runtime
+
+    scope = None if location_ids is None else {int(location_id) for location_id in location_ids}
+    grid = config.grid()
+    in_scope = [fence for fence in grid.fences if scope is None or fence.location_id in scope]
+    if not in_scope:
+        return triggered, history, runtime
+
+    order = {fence.id: index for index, fence in enumerate(grid.fences)}
+    by_id = {fence.id: fence for fence in in_scope}
+    # Fences whose outside observations matter even when nowhere near them.
+    watch_outside = [fence for fence in in_scope if fence.repeat_while == 'outside']
+    unseen_exit = [fence for fence in in_scope if fence.trigger == 'exit' and fence.id not in runtime]
+    tracked_inside = {
+        fence_id for fence_id, entry in runtime.items()
+        if fence_id in by_id and isinstance(entry, dict) and entry.get('current_state') == 'inside'
+    }
+
+    containing = grid.containing_batch([lat for _ms, lat, _lon in positions], [lon for _ms, _lat, lon in positions])
+    for (now_ms, _lat, _lon), fence_ids in zip(positions, containing):
+        inside = fence_ids & by_id.keys()
+        looked_at = inside | tracked_inside
+        looked_at.update(fence.id for fence in watch_outside)
+        looked_at.update(fence.id for fence in unseen_exit)
+        unseen_exit = []
+
+        fences = sorted((by_id[fence_id] for fence_id in looked_at), key=lambda f: (-f.priority, order[f.id]))
+        for fence in fences:
+            fired = _evaluate_fence(fence, fence.id in inside, now_ms, history, runtime)
+            if fired is not None:
+                triggered.append(fired)
+        tracked_inside = {
+            fence_id for fence_id in looked_at
+            if isinstance(runtime.get(fence_id), dict) and runtime[fence_id].get('current_state') == 'inside'
+        }
+
+    return triggered, history, runtime
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import zipfile
+from datetime import datetime
+
+# Offline asset packs.
+#
+# One zip per (game, team, content version) holding bundle.json, the clue and
+# branding images and, optionally, map tiles, plus manifest.json listing the
+# sha256 and size of every other member. Packs are written to a temporary
+# file and renamed into place so a reader never sees a partial archive;
+# older versions for the same game/team are removed once a new one lands.
+#
+# The bundle inside a pack is a snapshot; clients bring it up to date with a
+# delta request using its version token.
+
+MANIFEST_NAME = 'manifest.json'
+BUNDLE_NAME = 'bundle.json'
+_PACK_NAME_RE = re.compile(r'^game-(\d+)-team-(\d+)-v(\d+)(?:-tiles)?\.zip$')
+
+
+def pack_filename(game_id, team_id, content_version, include_tiles):
+    suffix = '-tiles' if include_tiles else ''
+    return f"game-{game_id}-team-{team_id}-v{content_version}{suffix}.zip"
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_asset_pack(path, bundle, images=(), tiles=()):
+    """
+    Write a pack to ``path``.
+
+    images: iterable of (archive_path, filesystem_path); missing files are skipped.
+    tiles:  iterable of (z, x, y, data) stored under tiles/z/x/y.png.
+    Returns the manifest dict.
+    """
+    files = []
+
+    def _add(zf, name, data, compress):
+        zf.writestr(name, data, compress_type=zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED)
+        files.append({'path': name, 'size': len(data), 'sha256': _sha256(data)})
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as fh, zipfile.ZipFile(fh, 'w') as zf:
+            _add(zf, BUNDLE_NAME, json.dumps(bundle, separators=(',', ':')).encode(), compress=True)
+
+            seen = set()
+            for archive_path, fs_path in images:
+                if archive_path in seen or not os.path.isfile(fs_path):
+                    continue
+                seen.add(archive_path)
+                with open(fs_path, 'rb') as img:
+                    # Images and tiles are already compressed; store them as-is.
+                    _add(zf, archive_path, img.read(), compress=False)
+
+            for z, x, y, data in tiles:
+                _add(zf, f"tiles/{z}/{x}/{y}.png", data, compress=False)
+
+            manifest = {
+                'game_id': bundle.get('game', {}).get('id'),
+                'team_id': bundle.get('team', {}).get('id'),
+                'version': bundle.get('version'),
+                'created_at': datetime.utcnow().isoformat() + 'Z',
+                'files': files,
+            }
+            zf.writestr(MANIFEST_NAME, json.dumps(manifest, indent=1), compress_type=zipfile.ZIP_DEFLATED)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return manifest
+
+
+def read_manifest(path):
+    with zipfile.ZipFile(path) as zf:
+        return json.loads(zf.read(MANIFEST_NAME))
+
+
+def prune_old_packs(directory, game_id, team_id, content_version):
+    """Remove packs of the same game/team built for other content versions."""
+    for name in os.listdir(directory):
+        match = _PACK_NAME_RE.match(name)
+        if not match:
+            continue
+        g, t, v = (int(part) for part in match.groups())
+        if g == game_id and t == team_id and v != content_version:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
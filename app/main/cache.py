@@ -1,12 +1,175 @@
 # You can put this in a common module imported by both your API and admin code
-from datetime import datetime
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
 
-# Simple in-memory tombstone cache for deleted records
-# Each entry: (team_id, location_id, game_id) -> deletion timestamp
-deleted_tombstones = {}  # (team_id, location_id, game_id) -> timestamp
+from app.models import db, Tombstone
 
-def cleanup_tombstones(expire_seconds=3600):
+# Tombstone / idempotency store.
+#
+# Entries live in the `tombstone` table so every gunicorn worker sees the same
+# set. Lookups are primary-key reads that ignore expired rows, and expiry is a
+# range delete over the indexed expires_at column, run on a schedule (see
+# start_tombstone_purge_scheduler) instead of on every request.
+
+DEFAULT_TOMBSTONE_TTL_SECONDS = 3600
+
+
+def assignment_tombstone_key(team_id, location_id, game_id):
+    return f"assignment:{team_id}:{location_id}:{game_id}"
+
+
+def sync_event_tombstone_key(user_id, client_event_id):
+    return f"event:{user_id}:{client_event_id}"
+
+
+def _ttl_seconds(ttl_seconds=None):
+    if ttl_seconds is not None:
+        return ttl_seconds
+    from flask import current_app
+    return current_app.config.get('TOMBSTONE_TTL_SECONDS', DEFAULT_TOMBSTONE_TTL_SECONDS)
+
+
+def add_tombstone(key, kind='assignment', ttl_seconds=None, session=None):
+    """Record (or refresh) a tombstone. The caller owns the commit."""
+    session = session or db.session
     now = datetime.utcnow()
-    for key, ts in list(deleted_tombstones.items()):
-        if (now - ts).total_seconds() > expire_seconds:
-            del deleted_tombstones[key]
+    session.merge(Tombstone(
+        key=key,
+        kind=kind,
+        created_at=now,
+        expires_at=now + timedelta(seconds=_ttl_seconds(ttl_seconds)),
+    ))
+
+
+def is_tombstoned(key, session=None):
+    session = session or db.session
+    return session.query(Tombstone.key).filter(
+        Tombstone.key == key,
+        Tombstone.expires_at > datetime.utcnow(),
+    ).first() is not None
+
+
+def find_tombstoned(keys, session=None):
+    """Return the subset of keys that currently have a live tombstone."""
+    keys = [key for key in keys if key]
+    if not keys:
+        return set()
+    session = session or db.session
+    rows = session.query(Tombstone.key).filter(
+        Tombstone.key.in_(keys),
+        Tombstone.expires_at > datetime.utcnow(),
+    ).all()
+    return {row.key for row in rows}
+
+
+def purge_expired_tombstones(session=None):
+    """Delete expired tombstones; returns the number of rows removed."""
+    session = session or db.session
+    deleted = (
+        session.query(Tombstone)
+        .filter(Tombstone.expires_at <= datetime.utcnow())
+        .delete(synchronize_session=False)
+    )
+    session.commit()
+    return deleted
+
+
+def start_tombstone_purge_scheduler(app):
+    """Purge expired tombstones (and aged-out bundle change-log rows) every
+    TOMBSTONE_PURGE_INTERVAL_SECONDS in a daemon thread."""
+    from app.versions import purge_version_changes
+
+    interval = app.config.get('TOMBSTONE_PURGE_INTERVAL_SECONDS')
+    if not interval or app.testing:
+        return None
+    retention = app.config.get('VERSION_CHANGE_RETENTION_SECONDS')
+
+    def _run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    purge_expired_tombstones()
+                    if retention:
+                        purge_version_changes(retention)
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception("Tombstone purge failed")
+                finally:
+                    db.session.remove()
+
+    thread = threading.Thread(target=_run, name='tombstone-purge', daemon=True)
+    thread.start()
+    return thread
+
+
+def init_tombstone_store(app):
+    @app.cli.command('purge-tombstones')
+    def purge_tombstones_command():
+        """Delete expired tombstones (for cron-style scheduling)."""
+        print(f"Purged {purge_expired_tombstones()} expired tombstone(s).")
+
+    start_tombstone_purge_scheduler(app)
+
+
+# In-process memo cache with single-flight.
+#
+# Values are keyed by something that changes whenever the value would (e.g.
+# a content version), so entries never need invalidating; old keys simply
+# age out of the LRU. Concurrent misses for the same key wait for the first
+# caller's computation instead of repeating it. The cache is per worker
+# process; each worker computes a given key at most once at a time.
+
+class SingleFlightCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._values = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, computing it (once) on a miss."""
+        while True:
+            with self._lock:
+                if key in self._values:
+                    self._values.move_to_end(key)
+                    return self._values[key]
+                flight = self._in_flight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._in_flight[key] = threading.Event()
+
+            if not leader:
+                flight.wait()
+                # Loop: either the value is cached now, or the leader failed
+                # and this caller becomes the next leader.
+                continue
+
+            try:
+                value = compute()
+            except BaseException:
+                with self._lock:
+                    del self._in_flight[key]
+                flight.set()
+                raise
+
+            with self._lock:
+                self._values[key] = value
+                while len(self._values) > self.max_entries:
+                    self._values.popitem(last=False)
+                del self._in_flight[key]
+            flight.set()
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._values
+
+    def __len__(self):
+        return len(self._values)
@@ -13,12 +13,14 @@ import qrcode
 #from datetime import timedelta
 from flask import (Blueprint, render_template, redirect, request, jsonify, 
                    url_for,session,send_from_directory,
-                   Response,current_app,flash)
+                   Response,current_app,flash,g)
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 
 from werkzeug.utils import secure_filename
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, inspect
+from sqlalchemy.orm import joinedload
+from types import MappingProxyType
 
 
 from functools import wraps
@@ -31,9 +33,10 @@ from app.models import (db,
 from app.main import main_bp
 
 from app.main import utils
-from app.main.cache import deleted_tombstones, cleanup_tombstones
+from app.main.cache import SingleFlightCache, is_tombstoned, assignment_tombstone_key
+from app.geofences import POLYGON_SHAPES, parse_polygon_coordinates
 
-from app.api.routes import get_game_status_data
+from app.api.routes import get_game_status_data, parse_game_status_args
 
 import random
 
@@ -59,28 +62,77 @@ def get_active_team_db(user):
     #session['active_team_id'] = membership.team_id
     return membership.team if membership else None
 
+def _load_membership(user, team_id=None):
+    """One query for a membership with its team and game eagerly loaded."""
+    query = (
+        TeamMembership.query
+        .filter_by(user_id=user.id)
+        .options(joinedload(TeamMembership.team).joinedload(Team.game))
+    )
+    if team_id:
+        return query.filter_by(team_id=team_id).first()
+    return query.order_by(TeamMembership.id).first()
+
+
 def get_active_team(user):
+    """
+    The user's active team (session['active_team_id'] if they are still a
+    member, else their first membership). Cached in flask.g for the rest of
+    the request, so the context processors and the view share one lookup.
+    """
     team_id = session.get('active_team_id')
+    cached = g.get('_active_team')
+    if cached is not None and cached[0] == (user.id, team_id):
+        return cached[1]
+
+    team = None
     if team_id:
-        team = Team.query.get(team_id)
-        membership = TeamMembership.query.filter_by(
-            user_id=user.id,
-            team_id=team_id,
-        ).first()
-        if team and membership:
-            return team
+        membership = _load_membership(user, team_id)
+        team = membership.team if membership else None
         # If session team is not valid, fall through to default behavior
 
-    # Default to the first team in their memberships if no active team is set
-    first_membership = (
-        TeamMembership.query
-        .filter_by(user_id=user.id)
-        .order_by(TeamMembership.id)
-        .first()
-    )
-    if first_membership:
-        session['active_team_id'] = first_membership.team_id
-        return first_membership.team
+    if team is None:
+        # Default to the first team in their memberships if no active team is set
+        first_membership = _load_membership(user)
+        if first_membership:
+            session['active_team_id'] = first_membership.team_id
+            team = first_membership.team
+
+    g._active_team = ((user.id, session.get('active_team_id')), team)
+    return team
+
+
+@main_bp.before_app_request
+def _reset_active_team_cache():
+    # flask.g can outlive a request when an app context is already pushed.
+    g.pop('_active_team', None)
+
+
+_branding_cache = SingleFlightCache(256)
+DEFAULT_BRANDING = MappingProxyType({
+    'brand_icon': 'icons/apple-touch-icon.png',
+    'brand_icon_alt': 'Geo Clue Game',
+    'navbar_color': '#0d6efd',
+})
+
+
+def get_branding_context(game):
+    """Navbar branding for templates; cached per (game, content version)."""
+    if not game:
+        return DEFAULT_BRANDING
+
+    def _build():
+        branding = _get_game_branding(game)
+        return MappingProxyType({
+            'brand_icon': branding.get('icon_url', DEFAULT_BRANDING['brand_icon']),
+            'brand_icon_alt': branding.get('icon_alt', DEFAULT_BRANDING['brand_icon_alt']),
+            'navbar_color': branding.get('navbar_color', DEFAULT_BRANDING['navbar_color']),
+        })
+
+    state = inspect(game)
+    if not state.persistent or state.attrs.data.history.has_changes():
+        return _build()
+    return _branding_cache.get_or_compute((game.id, game.content_version), _build)
 
 
 def _slugify_team_name(team_name, fallback='team'):
@@ -270,12 +322,21 @@ def _build_location_geofence_form_state(game, location):
 
     settings = game.get_geofence_settings()
     center = dict((primary_fence or {}).get('center', {}) or {})
+    shape = (primary_fence or {}).get('shape', 'circle')
+    polygon_geojson = ''
+    if shape in POLYGON_SHAPES:
+        polygon_geojson = json.dumps({
+            'type': 'Polygon' if shape == 'polygon' else 'MultiPolygon',
+            'coordinates': primary_fence['coordinates'],
+        })
 
     return {
         'enabled': bool(fences),
+        'shape': 'polygon' if shape in POLYGON_SHAPES else 'circle',
+        'polygon_geojson': polygon_geojson,
         'center_lat': center.get('lat', location.latitude if location.latitude is not None else ''),
         'center_lon': center.get('lon', location.longitude if location.longitude is not None else ''),
-        'radius_m': (primary_fence or {}).get('radius_m', 75),
+        'radius_m': (primary_fence or {}).get('radius_m') or 75,
         'enter_message': (enter_fence or {}).get('message', ''),
         'enter_repeat_every_s': (enter_fence or {}).get('repeat_every_s', settings.get('default_repeat_every_s', 180)),
         'exit_message': (exit_fence or {}).get('message', ''),
@@ -301,18 +362,25 @@ def _coerce_float_form_value(value):
 def _build_location_geofence_definitions(location, form_state):
     fences = []
 
-    center_lat = form_state['center_lat']
-    center_lon = form_state['center_lon']
-    radius_m = form_state['radius_m']
     once_per_team = form_state['once_per_team']
+    if form_state.get('polygons'):
+        polygons = [[[[lon, lat] for lat, lon in ring] for ring in polygon] for polygon in form_state['polygons']]
+        area = (
+            {'shape': 'polygon', 'coordinates': polygons[0]} if len(polygons) == 1
+            else {'shape': 'multipolygon', 'coordinates': polygons}
+        )
+    else:
+        area = {
+            'shape': 'circle',
+            'center': {'lat': form_state['center_lat'], 'lon': form_state['center_lon']},
+            'radius_m': form_state['radius_m'],
+        }
 
     if form_state['enter_message']:
         fences.append({
             'id': f'location-{location.id}-enter',
             'enabled': True,
-            'shape': 'circle',
-            'center': {'lat': center_lat, 'lon': center_lon},
-            'radius_m': radius_m,
+            **area,
             'trigger': 'enter',
             'message': form_state['enter_message'],
             'cooldown_s': form_state['enter_repeat_every_s'],
@@ -327,9 +395,7 @@ def _build_location_geofence_definitions(location, form_state):
         fences.append({
             'id': f'location-{location.id}-exit',
             'enabled': True,
-            'shape': 'circle',
-            'center': {'lat': center_lat, 'lon': center_lon},
-            'radius_m': radius_m,
+            **area,
             'trigger': 'exit',
             'message': form_state['exit_message'],
             'cooldown_s': form_state['exit_repeat_every_s'],
@@ -355,6 +421,8 @@ def _render_location_geofence_editor(game, location, form_state=None):
 def _save_location_geofence_from_form(game, location):
     form_state = {
         'enabled': request.form.get('enabled') == '1',
+        'shape': 'polygon' if request.form.get('shape') == 'polygon' else 'circle',
+        'polygon_geojson': (request.form.get('polygon_geojson') or '').strip(),
         'center_lat': request.form.get('center_lat'),
         'center_lon': request.form.get('center_lon'),
         'radius_m': _coerce_int_form_value(request.form.get('radius_m'), 75),
@@ -368,11 +436,22 @@ def _save_location_geofence_from_form(game, location):
     errors = []
     center_lat = _coerce_float_form_value(form_state['center_lat'])
     center_lon = _coerce_float_form_value(form_state['center_lon'])
-    if center_lat is None or center_lon is None:
-        errors.append('Center latitude and longitude are required.')
+    polygons = None
+    if form_state['shape'] == 'polygon':
+        try:
+            geometry = json.loads(form_state['polygon_geojson'] or 'null')
+            if isinstance(geometry, dict) and geometry.get('type') == 'Feature':
+                geometry = geometry.get('geometry')
+            polygons = parse_polygon_coordinates('polygon', geometry)
+        except ValueError as exc:
+            message = str(exc) if not isinstance(exc, json.JSONDecodeError) else 'Polygon must be valid GeoJSON.'
+            errors.append(message)
+    else:
+        if center_lat is None or center_lon is None:
+            errors.append('Center latitude and longitude are required.')
 
-    if form_state['radius_m'] is None or form_state['radius_m'] <= 0:
-        errors.append('Radius must be a positive number of meters.')
+        if form_state['radius_m'] is None or form_state['radius_m'] <= 0:
+            errors.append('Radius must be a positive number of meters.')
 
     if form_state['enabled'] and not form_state['enter_message'] and not form_state['exit_message']:
         errors.append('Provide at least an enter or exit message, or disable geofencing for this location.')
@@ -392,6 +471,7 @@ def _save_location_geofence_from_form(game, location):
 
     form_state['center_lat'] = center_lat
     form_state['center_lon'] = center_lon
+    form_state['polygons'] = polygons
 
     if form_state['enabled']:
         fences = _build_location_geofence_definitions(location, form_state)
@@ -537,7 +617,7 @@ def map_page():
     game = team.game
     assignments = (
         TeamLocationAssignment.query
-        .filter_by(team_id=team.id)
+        .filter_by(team_id=team.id, game_id=team.game_id)
         .order_by(TeamLocationAssignment.order_index)
         .all()
     )
@@ -630,13 +710,7 @@ def map_page():
 @login_required
 def main_page():
     #team = get_active_team(current_user)
-    team_id = session.get('active_team_id')
-    if team_id:
-        team = Team.query.get(team_id)
-    else:
-        team = get_active_team(current_user)
-        if team:
-            session['active_team_id'] = team.id
+    team = get_active_team(current_user)
 
     if not team:
         current_app.logger.info("main_page: No active team found for user %s", current_user.id)
@@ -646,7 +720,7 @@ def main_page():
     actions=['check_clues']
     # If user has "mapper" role and cookie is set, append "mapper" to actions
     if (
-        any(role.role.name == "mapper" for role in current_user.user_roles)
+        current_user.has_role('mapper')
         and request.cookies.get('mapper_mode') == '1'
     ):
         actions.append('mapper')
@@ -659,13 +733,7 @@ def main_page():
 @main_bp.route('/map/debug')
 @login_required
 def debug_map():
-    team_id = session.get('active_team_id')
-    if team_id:
-        team = Team.query.get(team_id)
-    else:
-        team = get_active_team(current_user)
-        if team:
-            session['active_team_id'] = team.id
+    team = get_active_team(current_user)
 
     if not team:
         current_app.logger.info("main_page: No active team found for user %s", current_user.id)
@@ -707,7 +775,7 @@ def findloc():
     actions=['check_clues']
     # If user has "mapper" role and cookie is set, append "mapper" to actions
     if (
-        any(role.role.name == "mapper" for role in current_user.user_roles)
+        current_user.has_role('mapper')
         and request.cookies.get('mapper_mode') == '1'
     ):
         actions.append('mapper')
@@ -716,7 +784,7 @@ def findloc():
     # 🧠 Fetch the locations assigned to this team
     assignments = (
         TeamLocationAssignment.query
-        .filter_by(team_id=team.id)
+        .filter_by(team_id=team.id, game_id=team.game_id)
         .order_by(TeamLocationAssignment.order_index)
         .all())
     
@@ -923,7 +991,7 @@ def account():
     location_mode = request.cookies.get('location_mode', 'none')  # default "none"
 
     options = []
-    if any(role.role.name == "mapper" for role in current_user.user_roles):
+    if current_user.has_role('mapper'):
         options.append("mapper")
 
     default_brand_icon = 'icons/apple-touch-icon.png'
@@ -1302,10 +1370,7 @@ def mark_location_found():
         return jsonify({"error": "Missing required parameters"}), 400
 
     # --- Database Operations ---
-    cleanup_tombstones()  # remove expired tombstones
-
-    key = (team_id, location_id, game_id)
-    if key in deleted_tombstones:
+    if is_tombstoned(assignment_tombstone_key(team_id, location_id, game_id)):
         return jsonify({
             "success": False,
             "team_id": team_id,
@@ -1388,10 +1453,8 @@ def mark_location_found():
     db.session.commit()
 
     # Compute current_index for client display
-    from sqlalchemy import func
-    found_count = db.session.query(func.count(TeamLocationAssignment.id))\
-        .filter_by(team_id=team_id, game_id=game_id, found=True).scalar()
-    current_index = max(0, found_count - 1)
+    from app.progress import get_team_progress
+    current_index = max(0, get_team_progress(db.session, team_id).found_count - 1)
 
     current_app.logger.info("Returning success response.")
     return jsonify({
@@ -1503,15 +1566,10 @@ def game_admin_qr_labels(game_id):
 @login_required
 def game_status():
     """Renders the game status HTML page."""
-    all_games = Game.query.order_by(Game.name).all()
-    
-    selected_games_param = request.args.get('games')
-    game_filter = None
-    if selected_games_param:
-        selected_game_ids = [int(gid) for gid in selected_games_param.split(',') if gid.isdigit()]
-        game_filter = Game.id.in_(selected_game_ids)
-    
-    games_with_data = get_game_status_data(game_filter)
+    all_games = db.session.query(Game.id, Game.name).order_by(Game.name).all()
+
+    game_ids, offset, limit = parse_game_status_args(request.args)
+    games_with_data, _total = get_game_status_data(game_ids, offset=offset, limit=limit)
         
     return render_template(
         'game/game_status.html',
@@ -0,0 +1,159 @@
+import math
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.main import utils
+
+# Nearby-location queries.
+#
+# On SQLite the location table is mirrored into an R*Tree virtual table that
+# is kept in sync by triggers, so inserts, updates and deletes from any code
+# path (ORM, admin panel, CSV import, raw SQL) stay indexed. Other databases
+# fall back to a plain bounding-box filter on the composite
+# (game_id, latitude, longitude) index declared on Location.
+
+RTREE_TABLE = 'location_rtree'
+
+METERS_PER_DEGREE_LAT = 111320.0
+DEFAULT_RADIUS_M = 1000
+MAX_RADIUS_M = 50000
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+RTREE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {RTREE_TABLE} USING rtree(id, min_lat, max_lat, min_lon, max_lon)",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {RTREE_TABLE}_ai AFTER INSERT ON location
+    WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+    BEGIN
+        INSERT OR REPLACE INTO {RTREE_TABLE} VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {RTREE_TABLE}_au AFTER UPDATE OF id, latitude, longitude ON location
+    BEGIN
+        DELETE FROM {RTREE_TABLE} WHERE id = OLD.id;
+        INSERT INTO {RTREE_TABLE}
+            SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+            WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {RTREE_TABLE}_ad AFTER DELETE ON location
+    BEGIN
+        DELETE FROM {RTREE_TABLE} WHERE id = OLD.id;
+    END
+    """,
+    # Backfill rows that predate the index (or were written while it was missing).
+    f"""
+    INSERT INTO {RTREE_TABLE}
+        SELECT id, latitude, latitude, longitude, longitude FROM location
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+          AND id NOT IN (SELECT id FROM {RTREE_TABLE})
+    """,
+]
+
+
+def ensure_location_rtree(engine):
+    """Create (or repair) the R*Tree mirror of the location table.
+
+    Returns True when the R*Tree is usable, False when the database is not
+    SQLite or the rtree module is unavailable.
+    """
+    if engine.dialect.name != 'sqlite':
+        return False
+
+    try:
+        with engine.begin() as conn:
+            for statement in RTREE_DDL:
+                conn.execute(text(statement))
+    except OperationalError:
+        return False
+    return True
+
+
+def bounding_box(lat, lon, radius_m):
+    """Return (min_lat, max_lat, min_lon, max_lon) enclosing a circle of radius_m."""
+    dlat = radius_m / METERS_PER_DEGREE_LAT
+    cos_lat = math.cos(math.radians(lat))
+    if cos_lat < 1e-6:
+        dlon = 180.0
+    else:
+        dlon = min(180.0, dlat / cos_lat)
+
+    return (
+        max(-90.0, lat - dlat),
+        min(90.0, lat + dlat),
+        lon - dlon,
+        lon + dlon,
+    )
+
+
+def _candidate_rows(session, game_id, box, use_rtree):
+    min_lat, max_lat, min_lon, max_lon = box
+
+    if use_rtree:
+        sql = f"""
+            SELECT l.id, l.name, l.clue_text, l.latitude, l.longitude
+            FROM {RTREE_TABLE} r JOIN location l ON l.id = r.id
+            WHERE r.max_lat >= :min_lat AND r.min_lat <= :max_lat
+              AND r.max_lon >= :min_lon AND r.min_lon <= :max_lon
+              AND l.game_id = :game_id
+        """
+    else:
+        sql = """
+            SELECT id, name, clue_text, latitude, longitude
+            FROM location
+            WHERE game_id = :game_id
+              AND latitude BETWEEN :min_lat AND :max_lat
+              AND longitude BETWEEN :min_lon AND :max_lon
+        """
+
+    return session.execute(text(sql), {
+        'game_id': game_id,
+        'min_lat': min_lat,
+        'max_lat': max_lat,
+        'min_lon': min_lon,
+        'max_lon': max_lon,
+    }).all()
+
+
+def find_nearby_locations(session, game_id, lat, lon, radius_m=DEFAULT_RADIUS_M, limit=DEFAULT_LIMIT, use_rtree=True):
+    """Return up to ``limit`` locations of a game within ``radius_m`` of (lat, lon).
+
+    Candidates come from the spatial prefilter; exact haversine distances are
+    only computed for those survivors. Results are dicts sorted by distance.
+    """
+    box = bounding_box(lat, lon, radius_m)
+
+    # A box that crosses the antimeridian is split into two queries.
+    boxes = [box]
+    if box[2] < -180.0:
+        boxes = [(box[0], box[1], -180.0, box[3]), (box[0], box[1], box[2] + 360.0, 180.0)]
+    elif box[3] > 180.0:
+        boxes = [(box[0], box[1], box[2], 180.0), (box[0], box[1], -180.0, box[3] - 360.0)]
+
+    seen = set()
+    results = []
+    for part in boxes:
+        for row in _candidate_rows(session, game_id, part, use_rtree):
+            if row.id in seen:
+                continue
+            seen.add(row.id)
+
+            distance = utils.haversine(lat, lon, row.latitude, row.longitude)
+            if distance > radius_m:
+                continue
+
+            results.append({
+                'id': row.id,
+                'name': row.name,
+                'clue': row.clue_text,
+                'latitude': row.latitude,
+                'longitude': row.longitude,
+                'distance_m': round(distance, 2),
+            })
+
+    results.sort(key=lambda item: item['distance_m'])
+    return results[:limit]
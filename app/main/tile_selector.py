@@ -0,0 +1,198 @@
+import math
+
+from app.main import utils
+
+# Team-specific tile selection.
+#
+# Instead of every tile in the game's bounding box, pick the tiles that a team
+# can actually see: a disk of buffer_m around each assigned location and, in
+# corridor mode, a buffered capsule along each leg of the route (ordered by
+# TeamLocationAssignment.order_index). Geometry is done in fractional tile
+# coordinates of each zoom, so a tile is kept when its square comes within
+# the buffer radius of a point or leg.
+#
+# The result uses the same {z, x_min, x_max, y_min, y_max} range format as
+# utils.tile_ranges(): adjacent columns with identical y spans are merged.
+
+EARTH_CIRCUMFERENCE_M = 40075016.686
+DEFAULT_BUFFER_M = 150
+DEFAULT_AVG_TILE_BYTES = 20000
+MODES = ('corridor', 'disks')
+DEFAULT_OFFLINE_ZOOMS = [14, 15, 16]
+
+
+def game_tile_setting(game, key, default):
+    if game.data and isinstance(game.data, dict) and game.data.get(key) is not None:
+        return game.data[key]
+    return default
+
+
+def offline_zoom_levels(game):
+    """Zooms listed in game.data['offline_zooms'], or DEFAULT_OFFLINE_ZOOMS."""
+    raw_zooms = game_tile_setting(game, 'offline_zooms', None)
+    if not isinstance(raw_zooms, list):
+        return list(DEFAULT_OFFLINE_ZOOMS)
+
+    zoom_levels = []
+    for zoom in raw_zooms:
+        try:
+            zoom_levels.append(int(zoom))
+        except (TypeError, ValueError):
+            continue
+
+    return zoom_levels or list(DEFAULT_OFFLINE_ZOOMS)
+
+
+def game_buffer_m(game):
+    try:
+        return float(game_tile_setting(game, 'offline_buffer_m', DEFAULT_BUFFER_M))
+    except (TypeError, ValueError):
+        return DEFAULT_BUFFER_M
+
+
+def padded_bounds_ranges(game):
+    """
+    Tile ranges of the game's bounds padded by its route buffer (corridors
+    reach past the bounds) at its offline zooms; [] for a game without bounds.
+    """
+    if None in (game.min_lat, game.max_lat, game.min_lon, game.max_lon):
+        return []
+    pad_lat = game_buffer_m(game) / 111320.0
+    pad_lon = pad_lat / max(0.01, math.cos(math.radians(max(abs(game.min_lat), abs(game.max_lat)))))
+    return utils.tile_ranges(game.min_lat - pad_lat, game.min_lon - pad_lon,
+                             game.max_lat + pad_lat, game.max_lon + pad_lon, offline_zoom_levels(game))
+
+
+def _tile_coords(lat, lon, zoom):
+    lat = max(-utils.MAX_MERCATOR_LAT, min(utils.MAX_MERCATOR_LAT, lat))
+    n = 2 ** zoom
+    fx = (lon + 180.0) / 360.0 * n
+    fy = (1 - math.log(math.tan(math.radians(lat)) + 1 / math.cos(math.radians(lat))) / math.pi) / 2 * n
+    return fx, fy
+
+
+def _buffer_in_tiles(lat, zoom, buffer_m):
+    meters_per_tile = EARTH_CIRCUMFERENCE_M * math.cos(math.radians(lat)) / (2 ** zoom)
+    return buffer_m / max(meters_per_tile, 1e-9)
+
+
+def _point_segment_distance(px, py, ax, ay, bx, by):
+    dx, dy = bx - ax, by - ay
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        return math.hypot(px - ax, py - ay)
+    t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length_sq))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def _point_square_distance(px, py, x, y):
+    dx = max(x - px, 0.0, px - (x + 1))
+    dy = max(y - py, 0.0, py - (y + 1))
+    return math.hypot(dx, dy)
+
+
+def _segment_square_distance(ax, ay, bx, by, x, y):
+    """Distance between segment a-b and the unit tile square at (x, y)."""
+    # Clip the segment to the square (Liang-Barsky); any overlap means 0.
+    t0, t1 = 0.0, 1.0
+    dx, dy = bx - ax, by - ay
+    for p, q in ((-dx, ax - x), (dx, x + 1 - ax), (-dy, ay - y), (dy, y + 1 - ay)):
+        if p == 0:
+            if q < 0:
+                break
+            continue
+        r = q / p
+        if p < 0:
+            t0 = max(t0, r)
+        else:
+            t1 = min(t1, r)
+    else:
+        if t0 <= t1:
+            return 0.0
+
+    return min(
+        _point_square_distance(ax, ay, x, y),
+        _point_square_distance(bx, by, x, y),
+        _point_segment_distance(x, y, ax, ay, bx, by),
+        _point_segment_distance(x + 1, y, ax, ay, bx, by),
+        _point_segment_distance(x, y + 1, ax, ay, bx, by),
+        _point_segment_distance(x + 1, y + 1, ax, ay, bx, by),
+    )
+
+
+def _tiles_near_segment(a, b, radius, n, tiles):
+    (ax, ay), (bx, by) = a, b
+    x_lo = max(0, int(math.floor(min(ax, bx) - radius)))
+    x_hi = min(n - 1, int(math.floor(max(ax, bx) + radius)))
+    y_lo = max(0, int(math.floor(min(ay, by) - radius)))
+    y_hi = min(n - 1, int(math.floor(max(ay, by) + radius)))
+
+    for x in range(x_lo, x_hi + 1):
+        for y in range(y_lo, y_hi + 1):
+            if (x, y) not in tiles and _segment_square_distance(ax, ay, bx, by, x, y) <= radius:
+                tiles.add((x, y))
+
+
+def _tiles_to_ranges(zoom, tiles):
+    """Collapse a set of (x, y) tiles into column runs, merging equal neighbours."""
+    columns = {}
+    for x, y in sorted(tiles):
+        runs = columns.setdefault(x, [])
+        if runs and runs[-1][1] == y - 1:
+            runs[-1][1] = y
+        else:
+            runs.append([y, y])
+
+    ranges = []
+    open_runs = {}
+    for x in sorted(columns):
+        next_open = {}
+        for y_min, y_max in columns[x]:
+            r = open_runs.get((y_min, y_max))
+            if r is not None and r['x_max'] == x - 1:
+                r['x_max'] = x
+            else:
+                r = {'z': zoom, 'x_min': x, 'x_max': x, 'y_min': y_min, 'y_max': y_max}
+                ranges.append(r)
+            next_open[(y_min, y_max)] = r
+        open_runs = next_open
+    return ranges
+
+
+def select_route_tiles(points, zoom_levels, buffer_m=DEFAULT_BUFFER_M, mode='corridor'):
+    """
+    Tile ranges covering buffer_m around the (lat, lon) points, which must be
+    in route order. mode='corridor' also covers each leg between consecutive
+    points; mode='disks' covers the points only.
+    """
+    points = [(lat, lon) for lat, lon in points if lat is not None and lon is not None]
+    if not points:
+        return []
+
+    ranges = []
+    for zoom in sorted(set(zoom_levels)):
+        n = 2 ** zoom
+        coords = [_tile_coords(lat, lon, zoom) for lat, lon in points]
+        radii = [_buffer_in_tiles(lat, zoom, buffer_m) for lat, _ in points]
+
+        tiles = set()
+        for coord, radius in zip(coords, radii):
+            _tiles_near_segment(coord, coord, radius, n, tiles)
+        if mode == 'corridor':
+            for i in range(len(coords) - 1):
+                _tiles_near_segment(coords[i], coords[i + 1], max(radii[i], radii[i + 1]), n, tiles)
+
+        ranges.extend(_tiles_to_ranges(zoom, tiles))
+    return ranges
+
+
+def apply_byte_budget(ranges, budget_bytes, avg_tile_bytes=DEFAULT_AVG_TILE_BYTES):
+    """Drop the highest zooms until the estimated download fits budget_bytes.
+
+    Returns (kept_ranges, dropped_zooms, estimated_bytes).
+    """
+    max_tiles = utils.MAX_TILE_COUNT
+    if budget_bytes:
+        max_tiles = min(max_tiles, budget_bytes // max(avg_tile_bytes, 1))
+    kept, dropped = utils.cap_tile_ranges(ranges, max_tiles)
+    return kept, dropped, utils.count_tiles(kept) * avg_tile_bytes
@@ -10,25 +10,83 @@ def haversine(lat1, lon1, lat2, lon2):
     a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
     return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
+# Web Mercator is undefined at the poles; tile math clamps to this latitude.
+MAX_MERCATOR_LAT = 85.05112878
+MAX_TILE_ZOOM = 19
+# Hard cap on the number of tiles one bundle or tile-list request may describe.
+MAX_TILE_COUNT = 50000
+
+
 def latlng_to_tile(lat, lng, zoom):
-    x = int((lng + 180) / 360 * (2 ** zoom))
-    y = int((1 - math.log(math.tan(math.radians(lat)) + 1 / math.cos(math.radians(lat))) / math.pi) / 2 * (2 ** zoom))
-    return x, y
+    lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+    n = 2 ** zoom
+    x = int((lng + 180) / 360 * n)
+    y = int((1 - math.log(math.tan(math.radians(lat)) + 1 / math.cos(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_ranges(min_lat, min_lng, max_lat, max_lng, zoom_levels):
+    """
+    Compact description of the tiles covering a bounding box: one
+    {z, x_min, x_max, y_min, y_max} range per zoom (inclusive bounds).
+    """
+    ranges = []
+    for z in sorted(set(zoom_levels)):
+        x_a, y_a = latlng_to_tile(min_lat, min_lng, z)
+        x_b, y_b = latlng_to_tile(max_lat, max_lng, z)
+        ranges.append({
+            'z': z,
+            'x_min': min(x_a, x_b),
+            'x_max': max(x_a, x_b),
+            'y_min': min(y_a, y_b),
+            'y_max': max(y_a, y_b),
+        })
+    return ranges
+
+
+def range_tile_count(r):
+    return (r['x_max'] - r['x_min'] + 1) * (r['y_max'] - r['y_min'] + 1)
+
+
+def count_tiles(ranges):
+    return sum(range_tile_count(r) for r in ranges)
+
 
-def generate_tile_urls(min_lat, min_lng, max_lat, max_lng, zoom_levels, tile_url_template):
-    tiles = set()
+def cap_tile_ranges(ranges, max_tiles=MAX_TILE_COUNT):
+    """Drop the highest zooms until the ranges fit in max_tiles.
 
-    for z in zoom_levels:
-        x_min, y_max = latlng_to_tile(min_lat, min_lng, z)
-        x_max, y_min = latlng_to_tile(max_lat, max_lng, z)
+    Returns (kept_ranges, dropped_zooms).
+    """
+    kept = sorted(ranges, key=lambda r: r['z'])
+    dropped = []
+    while kept and count_tiles(kept) > max_tiles:
+        top = kept[-1]['z']
+        dropped.append(top)
+        kept = [r for r in kept if r['z'] != top]
+    return kept, sorted(dropped)
 
-        for x in range(min(x_min, x_max), max(x_min, x_max) + 1):
-            for y in range(min(y_min, y_max), max(y_min, y_max) + 1):
-                tile_url = tile_url_template.format(z=z, x=x, y=y)
-                tiles.add(tile_url)
 
-    return sorted(tiles)
+def iter_tiles(ranges, offset=0):
+    """Yield (z, x, y) for the ranges in order, skipping the first ``offset``
+    tiles arithmetically instead of enumerating them."""
+    for r in ranges:
+        count = range_tile_count(r)
+        if offset >= count:
+            offset -= count
+            continue
 
+        height = r['y_max'] - r['y_min'] + 1
+        start_x, start_y = divmod(offset, height)
+        offset = 0
+        for x in range(r['x_min'] + start_x, r['x_max'] + 1):
+            for y in range(r['y_min'] + start_y, r['y_max'] + 1):
+                yield r['z'], x, y
+            start_y = 0
 
 
+def iter_tile_urls(ranges, tile_url_template, offset=0, limit=None):
+    for i, (z, x, y) in enumerate(iter_tiles(ranges, offset)):
+        if limit is not None and i >= limit:
+            return
+        yield tile_url_template.format(z=z, x=x, y=y)
 
@@ -1,6 +1,7 @@
 
 from . import db
 
+from sqlalchemy import inspect
 from sqlalchemy.dialects.sqlite import JSON
 from sqlalchemy.ext.mutable import MutableDict
 
@@ -9,20 +10,6 @@ from datetime import datetime
 import secrets
 
 
-def _coerce_positive_int(value, default):
-    try:
-        parsed = int(value)
-    except (TypeError, ValueError):
-        return default
-    return parsed if parsed > 0 else default
-
-
-def _coerce_float(value):
-    try:
-        return float(value)
-    except (TypeError, ValueError):
-        return None
-
 team_game = db.Table('team_game',
     db.Column('team_id', db.Integer, db.ForeignKey('team.id'), primary_key=True),
     db.Column('game_id', db.Integer, db.ForeignKey('game.id'), primary_key=True)
@@ -47,12 +34,16 @@ class Game(db.Model):
     min_lon = db.Column(db.Float, nullable=True)
     max_lon = db.Column(db.Float, nullable=True)
 
+    # bumped on every player-visible content change (see app/versions.py)
+    content_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
     # relationships
     gametype = db.relationship('GameType', back_populates='games')
     locations = db.relationship('Location', back_populates='game', lazy=True)
     characters = db.relationship('Character', backref='game', lazy=True)
     teams = db.relationship('Team', back_populates='game') # <-- FIXED
     team_location_assignments = db.relationship('TeamLocationAssignment', back_populates='game', cascade='all, delete-orphan')
+    qr_tokens = db.relationship('QRToken', back_populates='game', cascade='all, delete-orphan')
 
     def __str__(self):
         return self.name
@@ -145,6 +136,18 @@ class Game(db.Model):
     def get_qr_token(self, location_id):
         return self.get_qr_config().get('tokens', {}).get(str(location_id))
 
+    def _sync_qr_token_row(self, location_id, token):
+        """Mirror one blob token into the indexed qr_token table; True if a row changed."""
+        location_id = int(location_id)
+        row = next((r for r in self.qr_tokens if r.location_id == location_id), None)
+        if row is None:
+            self.qr_tokens.append(QRToken(token=token, location_id=location_id))
+            return True
+        if row.token != token:
+            row.token = token
+            return True
+        return False
+
     def set_qr_token(self, location_id, token):
         data = dict(self.data or {})
         qr = dict(data.get('qr', {}) or {})
@@ -153,6 +156,7 @@ class Game(db.Model):
         qr['tokens'] = tokens
         data['qr'] = qr
         self.data = data
+        self._sync_qr_token_row(location_id, token)
         return token
 
     def ensure_qr_tokens(self, location_ids, token_factory=None):
@@ -167,6 +171,9 @@ class Game(db.Model):
             if not tokens.get(key):
                 tokens[key] = token_factory()
                 changed = True
+            # Also backfills rows for tokens that predate the qr_token table.
+            if self._sync_qr_token_row(location_id, tokens[key]):
+                changed = True
 
         qr['tokens'] = tokens
         qr['enabled'] = bool(qr.get('enabled'))
@@ -178,118 +185,42 @@ class Game(db.Model):
         return tokens, changed
 
     def find_location_id_for_qr_token(self, token):
-        raw = (token or '').strip()
-        if not raw:
+        row = QRToken.resolve(token)
+        if row is None or row.game_id != self.id:
             return None
+        return row.location_id
 
-        if raw.startswith('geokr:qr:'):
-            raw = raw.split('geokr:qr:', 1)[1].strip()
-
-        for location_id, location_token in self.get_qr_config().get('tokens', {}).items():
-            if raw == location_token:
-                try:
-                    return int(location_id)
-                except (TypeError, ValueError):
-                    return None
-        return None
+    def get_compiled_geofences(self):
+        """
+        Validated, immutable geofence config (see app/geofences.py). Memoized on
+        the instance and, for persisted unmodified games, per content version.
+        """
+        from app.geofences import compile_geofences, get_compiled_geofences
 
-    def get_geofence_settings(self):
-        defaults = {
-            'enabled': False,
-            'poll_interval_s': 20,
-            'default_cooldown_s': 300,
-            'default_repeat_every_s': 180,
-        }
-        if not self.data or not isinstance(self.data, dict):
-            return defaults
+        data = self.data if isinstance(self.data, dict) else None
+        raw = (data.get('geofences') if data else None, data.get('geofence_settings') if data else None)
 
-        settings = dict(self.data.get('geofence_settings', {}) or {})
-        raw_geofences = self.data.get('geofences', {}) or {}
+        cached = self.__dict__.get('_compiled_geofences')
+        if cached is not None and cached[0] is raw[0] and cached[1] is raw[1]:
+            return cached[2]
 
-        enabled = settings.get('enabled')
-        if enabled is None:
-            enabled = bool(raw_geofences)
+        state = inspect(self)
+        if state.persistent and self.content_version and not state.attrs.data.history.has_changes():
+            compiled = get_compiled_geofences(self.id, self.content_version, data)
+        else:
+            compiled = compile_geofences(data)
+        self.__dict__['_compiled_geofences'] = (raw[0], raw[1], compiled)
+        return compiled
 
-        return {
-            'enabled': bool(enabled),
-            'poll_interval_s': _coerce_positive_int(settings.get('poll_interval_s'), defaults['poll_interval_s']),
-            'default_cooldown_s': _coerce_positive_int(settings.get('default_cooldown_s'), defaults['default_cooldown_s']),
-            'default_repeat_every_s': _coerce_positive_int(settings.get('default_repeat_every_s'), defaults['default_repeat_every_s']),
-        }
+    def get_geofence_settings(self):
+        return dict(self.get_compiled_geofences().settings)
 
     def get_geofence_config(self):
-        settings = self.get_geofence_settings()
-        if not self.data or not isinstance(self.data, dict):
-            return {'settings': settings, 'locations': {}}
-
-        raw_locations = self.data.get('geofences', {}) or {}
-        normalized_locations = {}
-
-        for location_id, fences in raw_locations.items():
-            try:
-                location_key = str(int(location_id))
-            except (TypeError, ValueError):
-                continue
-
-            if not isinstance(fences, list):
-                continue
-
-            normalized_fences = []
-            for index, fence in enumerate(fences):
-                if not isinstance(fence, dict):
-                    continue
-
-                shape = (fence.get('shape') or '').strip().lower()
-                trigger = (fence.get('trigger') or '').strip().lower()
-                repeat_while = fence.get('repeat_while')
-                repeat_while = (repeat_while or '').strip().lower() if repeat_while else None
-
-                center = dict(fence.get('center', {}) or {})
-                center_lat = _coerce_float(center.get('lat'))
-                center_lon = _coerce_float(center.get('lon'))
-                radius_m = _coerce_float(fence.get('radius_m'))
-
-                if shape != 'circle':
-                    continue
-                if trigger not in {'enter', 'exit'}:
-                    continue
-                if center_lat is None or center_lon is None or radius_m is None or radius_m <= 0:
-                    continue
-
-                message = (fence.get('message') or '').strip()
-                if not message:
-                    continue
-
-                if repeat_while not in {'inside', 'outside'}:
-                    repeat_while = None
-
-                normalized_fences.append({
-                    'id': str(fence.get('id') or f'location-{location_key}-fence-{index + 1}'),
-                    'enabled': bool(fence.get('enabled', True)),
-                    'shape': shape,
-                    'center': {'lat': center_lat, 'lon': center_lon},
-                    'radius_m': radius_m,
-                    'trigger': trigger,
-                    'message': message,
-                    'cooldown_s': _coerce_positive_int(fence.get('cooldown_s'), settings['default_cooldown_s']),
-                    'once_per_team': bool(fence.get('once_per_team', False)),
-                    'priority': int(fence.get('priority', 0) or 0),
-                    'repeat_while': repeat_while,
-                    'repeat_every_s': (
-                        _coerce_positive_int(fence.get('repeat_every_s'), settings['default_repeat_every_s'])
-                        if repeat_while else None
-                    ),
-                    'metadata': dict(fence.get('metadata', {}) or {}),
-                    'location_id': int(location_key),
-                })
-
-            if normalized_fences:
-                normalized_locations[location_key] = normalized_fences
-
-        return {'settings': settings, 'locations': normalized_locations}
+        """{'settings': ..., 'locations': {str(location_id): [fence dict, ...]}}; treat as read-only."""
+        return self.get_compiled_geofences().as_dict()
 
     def get_location_geofences(self, location_id):
-        return list(self.get_geofence_config().get('locations', {}).get(str(location_id), []))
+        return [fence.to_dict() for fence in self.get_compiled_geofences().fences_for(location_id)]
 
     def set_location_geofences(self, location_id, fences):
         data = dict(self.data or {})
@@ -312,11 +243,11 @@ class Game(db.Model):
         settings['enabled'] = bool(raw_locations)
         data['geofence_settings'] = settings
         self.data = data
+        self.__dict__.pop('_compiled_geofences', None)
         return cleaned_fences
 
     def has_geofences(self):
-        config = self.get_geofence_config()
-        return bool(config.get('settings', {}).get('enabled')) and any(config.get('locations', {}).values())
+        return self.get_compiled_geofences().has_fences()
 
 class GameType(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -338,8 +269,13 @@ class Location(db.Model):
     image_url = db.Column(db.String(300), nullable=True) 
     show_pin = db.Column(db.Boolean, nullable=True, default=None)
 
+    __table_args__ = (
+        db.Index('ix_location_game_lat_lon', 'game_id', 'latitude', 'longitude'),
+    )
+
     game = db.relationship('Game', back_populates='locations')  # <-- Add this line
     team_assignments = db.relationship('TeamLocationAssignment', back_populates='location', cascade='all, delete-orphan')
+    qr_tokens = db.relationship('QRToken', back_populates='location', cascade='all, delete-orphan')
 
     def __str__(self):
         return self.name
@@ -367,31 +303,57 @@ class Team(db.Model):
     memberships = db.relationship('TeamMembership', back_populates='team', cascade="all, delete-orphan")
     #data = db.Column(JSON, default=lambda: {})
     data = db.Column(MutableDict.as_mutable(db.JSON), default=dict)
+    # bumped on every assignment / team state change (see app/versions.py)
+    progress_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # bumped on every geofence state write (see app/team_geofences.py)
+    geofence_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     game = db.relationship('Game', back_populates='teams')
     location_assignments = db.relationship('TeamLocationAssignment', back_populates='team', cascade='all, delete-orphan')
+    progress = db.relationship('TeamProgress', back_populates='team', uselist=False, cascade='all, delete-orphan')
+    geofence_states = db.relationship('TeamGeofenceState', back_populates='team', cascade='all, delete-orphan')
+    track_chunks = db.relationship('TrackChunk', back_populates='team', cascade='all, delete-orphan')
 
     def __str__(self):
         return self.name
 
+    def get_geofence_tracking(self):
+        """
+        (geofence_state, geofence_runtime) dicts keyed by fence id: the
+        TeamGeofenceState rows over any entries still in Team.data from
+        before the table existed.
+        """
+        data = self.data if isinstance(self.data, dict) else {}
+        state = {
+            fence_id: dict(entry) for fence_id, entry in (data.get('geofence_state') or {}).items()
+            if isinstance(entry, dict)
+        }
+        runtime = {
+            fence_id: dict(entry) for fence_id, entry in (data.get('geofence_runtime') or {}).items()
+            if isinstance(entry, dict)
+        }
+        for row in self.geofence_states:
+            for target, entry in ((state, row.state), (runtime, row.runtime)):
+                if entry is None:
+                    target.pop(row.fence_id, None)
+                else:
+                    target[row.fence_id] = dict(entry)
+        return state, runtime
+
     def get_geofence_state(self):
-        if not self.data or not isinstance(self.data, dict):
-            return {}
-        return dict(self.data.get('geofence_state', {}) or {})
+        return self.get_geofence_tracking()[0]
 
     def get_geofence_runtime_state(self):
-        if not self.data or not isinstance(self.data, dict):
-            return {}
-        return dict(self.data.get('geofence_runtime', {}) or {})
+        return self.get_geofence_tracking()[1]
 
     def set_geofence_tracking(self, geofence_state=None, geofence_runtime=None):
-        data = dict(self.data or {})
-        if geofence_state is not None:
-            data['geofence_state'] = dict(geofence_state or {})
-        if geofence_runtime is not None:
-            data['geofence_runtime'] = dict(geofence_runtime or {})
-        self.data = data
-        return self.data
+        """Replace the whole state and/or runtime dict; only changed fences are written."""
+        from app.team_geofences import apply_geofence_patch
+
+        return apply_geofence_patch(
+            inspect(self).session or db.session, self,
+            state=geofence_state, runtime=geofence_runtime, replace=True,
+        )
     
 class User(db.Model,UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -407,13 +369,21 @@ class User(db.Model,UserMixin):
     def __str__(self):
         return self.display_name
     
+    @property
+    def role_names(self):
+        """Frozen set of role names; primed by the user loader (app/users.py)."""
+        names = self.__dict__.get('_role_names')
+        if names is None:
+            names = frozenset(ur.role.name for ur in self.user_roles if ur.role)
+            self.__dict__['_role_names'] = names
+        return names
+
     @property
     def is_admin(self):
-        return any(ur.role.name == 'admin' for ur in self.user_roles)
-        #return self.user_roles.join(Role).filter(Role.name == 'admin').count() > 0
+        return 'admin' in self.role_names
 
     def has_role(self, role_name):
-        return any(ur.role and ur.role.name == role_name for ur in self.user_roles)
+        return role_name in self.role_names
     
 class TeamMembership(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -447,6 +417,12 @@ class TeamLocationAssignment(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint('team_id', 'location_id', name='_team_location_uc'),
+        # A team's route in order (findloc, map_page, bundles, game state).
+        db.Index('ix_tla_team_game_order', 'team_id', 'game_id', 'order_index'),
+        # A team's next unfound clue and found/total counts.
+        db.Index('ix_tla_team_game_found', 'team_id', 'game_id', 'found', 'order_index'),
+        # Game-wide resets and status pages.
+        db.Index('ix_tla_game_team', 'game_id', 'team_id'),
     )
 
     team = db.relationship('Team', back_populates='location_assignments')
@@ -475,3 +451,120 @@ class UserRole(db.Model):
     def __str__(self):
         return f"{self.user.display_name} - {self.role.name}"
 
+
+
+class Tombstone(db.Model):
+    """Short-lived marker shared by all workers (deleted assignments, processed sync events)."""
+    key = db.Column(db.String(200), primary_key=True)
+    kind = db.Column(db.String(40), nullable=False, default='assignment')
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class TeamProgress(db.Model):
+    """Per-team found/total counters, kept in step with the assignments by app/progress.py."""
+    team_id = db.Column(db.Integer, db.ForeignKey('team.id'), primary_key=True)
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), nullable=False, index=True)
+    found_count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    # order_index / location of the first unfound assignment; None once complete
+    next_order_index = db.Column(db.Integer, nullable=True)
+    next_location_id = db.Column(db.Integer, db.ForeignKey('location.id', ondelete='SET NULL'), nullable=True)
+    last_found_at = db.Column(db.DateTime, nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    team = db.relationship('Team', back_populates='progress')
+
+    @property
+    def is_complete(self):
+        return self.total > 0 and self.found_count >= self.total
+
+
+class TeamGeofenceState(db.Model):
+    """One fence's trigger history and runtime entry for a team (see app/team_geofences.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=False)
+    fence_id = db.Column(db.String(120), nullable=False)
+    location_id = db.Column(db.Integer, nullable=True)
+    # None once cleared; a row with both None is kept as a delta tombstone
+    state = db.Column(db.JSON(none_as_null=True), nullable=True)
+    runtime = db.Column(db.JSON(none_as_null=True), nullable=True)
+    # Team.geofence_version of the write that last touched this row
+    version = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('team_id', 'fence_id', name='_team_fence_uc'),
+        db.Index('ix_team_geofence_state_team_version', 'team_id', 'version'),
+    )
+
+    team = db.relationship('Team', back_populates='geofence_states')
+
+
+class TrackChunk(db.Model):
+    """A run of a team's GPS samples, delta-encoded (see app/tracks.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=False)
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), nullable=False)
+    # epoch ms of the first and last sample
+    start_ms = db.Column(db.BigInteger, nullable=False)
+    end_ms = db.Column(db.BigInteger, nullable=False)
+    point_count = db.Column(db.Integer, nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_track_chunk_team_start', 'team_id', 'start_ms'),
+    )
+
+    team = db.relationship('Team', back_populates='track_chunks')
+
+
+class VersionChange(db.Model):
+    """One item touched by a content (scope='game') or progress (scope='team') version bump."""
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(10), nullable=False)
+    scope_id = db.Column(db.Integer, nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # location, character, game, assignment, team
+    item_id = db.Column(db.Integer, nullable=True)
+    op = db.Column(db.String(10), nullable=False, default='upsert')  # upsert or delete
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        db.Index('ix_version_change_scope_version', 'scope', 'scope_id', 'version'),
+    )
+
+
+QR_PAYLOAD_PREFIX = 'geokr:qr:'
+
+
+class QRToken(db.Model):
+    """Indexed token -> (game, location) lookup, mirrored from Game.data['qr']['tokens']."""
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(64), nullable=False, unique=True, index=True)
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), nullable=False)
+    location_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('game_id', 'location_id', name='_qr_game_location_uc'),
+    )
+
+    game = db.relationship('Game', back_populates='qr_tokens')
+    location = db.relationship('Location', back_populates='qr_tokens')
+
+    @staticmethod
+    def normalize(token):
+        raw = (token or '').strip()
+        if raw.startswith(QR_PAYLOAD_PREFIX):
+            raw = raw[len(QR_PAYLOAD_PREFIX):].strip()
+        return raw
+
+    @classmethod
+    def resolve(cls, token):
+        """Return the QRToken for a raw token or 'geokr:qr:' payload, or None."""
+        raw = cls.normalize(token)
+        if not raw:
+            return None
+        return cls.query.filter_by(token=raw).first()
@@ -0,0 +1,160 @@
+from datetime import datetime
+
+from sqlalchemy import case, event, func, inspect, or_, select
+from sqlalchemy.orm import Session
+
+from app.models import Team, TeamLocationAssignment, TeamProgress
+
+# Denormalized team progress.
+#
+# TeamProgress holds one row per team with its found/total counters, the next
+# unfound assignment and completion time, so progress reads are a primary-key
+# lookup instead of loading or counting every assignment.
+#
+# Rows are recomputed from the team's assignments in the same flush that
+# changes them (see the listener below), so they commit or roll back with the
+# write itself. Bulk query.update()/query.delete() calls bypass the ORM and
+# must call refresh_team_progress() themselves, next to bump_versions().
+
+
+def _compute_progress(conn, teams, previous):
+    """Build TeamProgress rows for {team_id: game_id} from the assignments."""
+    tla = TeamLocationAssignment.__table__
+    team_ids = list(teams)
+
+    counts = {
+        row.team_id: row for row in conn.execute(
+            select(
+                tla.c.team_id,
+                func.count(tla.c.id).label('total'),
+                func.sum(case((tla.c.found.is_(True), 1), else_=0)).label('found_count'),
+                func.max(tla.c.timestamp_found).label('last_found_at'),
+            )
+            .where(tla.c.team_id.in_(team_ids))
+            .group_by(tla.c.team_id)
+        )
+    }
+
+    next_unfound = {}
+    for row in conn.execute(
+        select(tla.c.team_id, tla.c.order_index, tla.c.location_id)
+        .where(tla.c.team_id.in_(team_ids), or_(tla.c.found.is_(False), tla.c.found.is_(None)))
+        .order_by(tla.c.team_id, tla.c.order_index, tla.c.id)
+    ):
+        next_unfound.setdefault(row.team_id, row)
+
+    now = datetime.utcnow()
+    rows = []
+    for team_id, game_id in teams.items():
+        count = counts.get(team_id)
+        total = count.total if count else 0
+        found_count = int(count.found_count or 0) if count else 0
+        last_found_at = count.last_found_at if count else None
+        nxt = next_unfound.get(team_id)
+
+        completed_at = None
+        if total and found_count >= total:
+            completed_at = previous.get(team_id) or last_found_at or now
+
+        rows.append({
+            'team_id': team_id,
+            'game_id': game_id,
+            'found_count': found_count,
+            'total': total,
+            'next_order_index': nxt.order_index if nxt else None,
+            'next_location_id': nxt.location_id if nxt else None,
+            'last_found_at': last_found_at,
+            'completed_at': completed_at,
+            'updated_at': now,
+        })
+    return rows
+
+
+def refresh_team_progress(session, team_ids=(), game_ids=()):
+    """Recompute TeamProgress for the given teams and every team of game_ids."""
+    team_ids = set(team_ids)
+    game_ids = set(game_ids)
+    if not team_ids and not game_ids:
+        return
+
+    conn = session.connection()
+    team = Team.__table__
+    progress = TeamProgress.__table__
+
+    conditions = []
+    if team_ids:
+        conditions.append(team.c.id.in_(team_ids))
+    if game_ids:
+        conditions.append(team.c.game_id.in_(game_ids))
+    teams = {row.id: row.game_id for row in conn.execute(select(team.c.id, team.c.game_id).where(or_(*conditions)))}
+    if not teams:
+        return
+
+    previous = {
+        row.team_id: row.completed_at for row in conn.execute(
+            select(progress.c.team_id, progress.c.completed_at).where(progress.c.team_id.in_(list(teams)))
+        )
+    }
+    rows = _compute_progress(conn, teams, previous)
+
+    updates = [row for row in rows if row['team_id'] in previous]
+    inserts = [row for row in rows if row['team_id'] not in previous]
+    for row in updates:
+        conn.execute(progress.update().where(progress.c.team_id == row['team_id']).values(**row))
+    if inserts:
+        conn.execute(progress.insert(), inserts)
+
+    session.info.setdefault('expire_progress', set()).update(teams)
+
+
+def get_team_progress(session, team_id):
+    """Return the team's TeamProgress row, computing it on first use."""
+    row = session.get(TeamProgress, team_id)
+    if row is None:
+        refresh_team_progress(session, team_ids=[team_id])
+        row = session.get(TeamProgress, team_id)
+    return row
+
+
+# Assignment columns that TeamProgress is computed from.
+_PROGRESS_FIELDS = ('team_id', 'location_id', 'order_index', 'found', 'timestamp_found')
+
+
+def _progress_team_ids(session):
+    """Teams whose progress this flush changes; empty unless it writes assignments."""
+    team_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, TeamLocationAssignment):
+            continue
+        if obj in session.dirty:
+            attrs = inspect(obj).attrs
+            if not any(attrs[field].history.has_changes() for field in _PROGRESS_FIELDS):
+                continue
+            # An assignment moved to another team changes both teams.
+            team_ids.update(t for t in attrs.team_id.history.deleted if t is not None)
+        team_id = obj.team_id if obj.team_id is not None else getattr(obj.team, 'id', None)
+        if team_id is not None:
+            team_ids.add(team_id)
+    return team_ids
+
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_progress_after_flush(session, flush_context):
+    team_ids = _progress_team_ids(session)
+    if team_ids:
+        refresh_team_progress(session, team_ids=team_ids)
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _expire_refreshed_progress(session, flush_context):
+    expire_refreshed_progress(session)
+
+
+def expire_refreshed_progress(session):
+    """Expire in-memory TeamProgress rows after refresh_team_progress()."""
+    pending = session.info.pop('expire_progress', None)
+    if not pending:
+        return
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, TeamProgress) and obj.team_id in pending:
+            session.expire(obj)
@@ -0,0 +1,207 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from app.models import Location
+
+# Route generation for game.data['routes'].
+#
+# The game's locations get one haversine distance matrix, built with NumPy
+# and cached per (game id, content version); any location edit bumps the
+# content version, so a cached matrix is never stale. Each route is built
+# by nearest neighbour from its own seed location and then improved with
+# 2-opt until no segment reversal shortens it.
+#
+# Routes are open paths. The first stop is pinned: either the fixed start
+# location or the route's seed, so teams spread out instead of all heading
+# for the same first location. The last stop is pinned only with a fixed
+# finish location. A free end is handled by ending every path at a zero-cost
+# dummy node, so one 2-opt routine serves both cases.
+#
+# With balance=True, twice as many candidate routes are built and the
+# `count` with the closest lengths are kept.
+
+EARTH_RADIUS_M = 6371000
+MAX_CACHED_MATRICES = 64
+MAX_ROUTES = 500
+# 2-opt stops when no reversal saves more than this; it also absorbs float32 rounding.
+MIN_GAIN_M = 0.01
+
+
+def distance_matrix(lats, lons):
+    """Pairwise haversine distances in meters (app.main.utils.haversine, vectorized)."""
+    phi = np.radians(np.asarray(lats, dtype=np.float64))
+    lam = np.radians(np.asarray(lons, dtype=np.float64))
+    dphi = phi[:, None] - phi[None, :]
+    dlam = lam[:, None] - lam[None, :]
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi)[:, None] * np.cos(phi)[None, :] * np.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _nearest_neighbor(dist, first, available, stops):
+    """Greedy path of `stops` nodes from `first` over the `available` mask (first included)."""
+    available = available.copy()
+    available[first] = False
+    path = [first]
+    current = first
+    for _ in range(stops - 1):
+        candidates = np.where(available, dist[current], np.inf)
+        current = int(np.argmin(candidates))
+        available[current] = False
+        path.append(current)
+    return path
+
+
+def _two_opt(dist, path):
+    """
+    Improve a path with both ends pinned by segment reversals until none
+    shortens it. Each round scores every (i, j) reversal at once from the
+    path's submatrix, then applies the best reversal for each i, best first,
+    skipping any that shares an edge with one already taken this round.
+    """
+    path = np.asarray(path)
+    m = len(path)
+    if m < 4:
+        return path
+    lower = np.tril(np.ones((m - 2, m - 2), dtype=bool))
+    rows = np.arange(m - 2)
+    while True:
+        sub = dist[path[:, None], path]
+        edges = np.diagonal(sub, offset=1)
+        # Row r, column c is reversing path[r+1 .. c+1]: edges r and c+1 are
+        # replaced by (path[r], path[c+1]) and (path[r+1], path[c+2]).
+        delta = sub[:-2, 1:-1] + sub[1:-1, 2:]
+        delta -= edges[:-1][:, None]
+        delta -= edges[1:]
+        delta[lower] = 0.0
+        best_c = np.argmin(delta, axis=1)
+        gains = delta[rows, best_c]
+        improving = np.flatnonzero(gains < -MIN_GAIN_M)
+        if not len(improving):
+            return path
+
+        taken = []
+        for r in improving[np.argsort(gains[improving])]:
+            c = int(best_c[r])
+            # Moves touching disjoint edge ranges [r, c+1] do not interact.
+            if any(r <= c2 + 1 and r2 <= c + 1 for r2, c2 in taken):
+                continue
+            taken.append((r, c))
+            path[r + 1:c + 2] = path[r + 1:c + 2][::-1].copy()
+
+
+def _path_length(dist, path):
+    return float(dist[path[:-1], path[1:]].sum()) if len(path) > 1 else 0.0
+
+
+def plan_routes(dist, location_ids, count, route_length=None, start_id=None, finish_id=None,
+                balance=True, seed=None):
+    """
+    Build `count` routes over the locations of a distance matrix.
+
+    route_length is the number of locations per route, fixed start and
+    finish included (default: every location). Returns a list of
+    (location ids, length in meters) pairs. Raises ValueError for options
+    that cannot produce a route.
+    """
+    location_ids = [int(location_id) for location_id in location_ids]
+    index = {location_id: i for i, location_id in enumerate(location_ids)}
+    n = len(location_ids)
+    if not 1 <= count <= MAX_ROUTES:
+        raise ValueError(f"count must be between 1 and {MAX_ROUTES}")
+    for label, location_id in (('start', start_id), ('finish', finish_id)):
+        if location_id is not None and location_id not in index:
+            raise ValueError(f"{label} location {location_id} is not a location of this game")
+    if start_id is not None and start_id == finish_id:
+        raise ValueError("start and finish must be different locations")
+
+    fixed = [index[location_id] for location_id in (start_id, finish_id) if location_id is not None]
+    available = np.ones(n + 1, dtype=bool)
+    available[fixed] = False
+    available[n] = False
+    pool = np.flatnonzero(available)
+    if not len(pool):
+        raise ValueError("No locations to route between the start and finish")
+
+    stops = len(pool) if route_length is None else int(route_length) - len(fixed)
+    if stops < 1:
+        raise ValueError("route_length must leave room for at least one stop besides start and finish")
+    stops = min(stops, len(pool))
+
+    # Node n is a dummy at distance 0 from everything: the end of an open path.
+    # float32 halves the memory traffic of 2-opt; lengths are summed from dist.
+    extended = np.zeros((n + 1, n + 1), dtype=np.float32)
+    extended[:n, :n] = dist
+    last = index[finish_id] if finish_id is not None else n
+
+    rng = np.random.default_rng(seed)
+    seeds = pool[rng.permutation(len(pool))]
+    candidates = count * 2 if balance and count > 1 else count
+
+    routes = []
+    for k in range(candidates):
+        first = int(seeds[k % len(seeds)])
+        path = _nearest_neighbor(extended, first, available, stops)
+        if start_id is not None:
+            path = [index[start_id]] + path
+        path = _two_opt(extended, path + [last])
+        if finish_id is None:
+            path = path[:-1]
+        routes.append(([location_ids[i] for i in path], _path_length(dist, path)))
+
+    if candidates > count:
+        # The `count` candidates whose lengths span the narrowest range.
+        order = sorted(range(candidates), key=lambda k: routes[k][1])
+        lengths = [routes[k][1] for k in order]
+        best = min(range(candidates - count + 1), key=lambda s: lengths[s + count - 1] - lengths[s])
+        keep = sorted(order[best:best + count])
+        routes = [routes[k] for k in keep]
+    return routes
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _load_matrix(session, game_id):
+    rows = (
+        session.query(Location.id, Location.latitude, Location.longitude)
+        .filter(Location.game_id == game_id, Location.latitude.isnot(None), Location.longitude.isnot(None))
+        .order_by(Location.id)
+        .all()
+    )
+    location_ids = tuple(row.id for row in rows)
+    dist = distance_matrix([row.latitude for row in rows], [row.longitude for row in rows])
+    dist.setflags(write=False)
+    return location_ids, dist
+
+
+def get_distance_matrix(session, game):
+    """(location ids, distance matrix) for a game's located locations, memoized per content version."""
+    key = (game.id, game.content_version)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            return cached
+
+    cached = _load_matrix(session, game.id)
+    with _cache_lock:
+        _cache[key] = cached
+        while len(_cache) > MAX_CACHED_MATRICES:
+            _cache.popitem(last=False)
+    return cached
+
+
+def clear_distance_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def generate_game_routes(session, game, count, **options):
+    """plan_routes() over a game's locations; see plan_routes for the options."""
+    location_ids, dist = get_distance_matrix(session, game)
+    if not location_ids:
+        raise ValueError("The game has no locations with coordinates")
+    return plan_routes(dist, location_ids, count, **options)
@@ -194,8 +194,34 @@ function getBundleImageUrls(bundle) {
     return dedupeUrls([brandingIcon, ...locationImages].filter(Boolean));
 }
 
-function getBundleTileUrls(bundle) {
-    return dedupeUrls(bundle?.tiles?.urls || []);
+// Bundles describe tiles as per-zoom x/y ranges plus a URL template; expand
+// them one URL at a time instead of building the whole list in memory.
+function* iterBundleTileUrls(bundle) {
+    const tiles = bundle?.tiles;
+    if (!tiles) return;
+
+    if (Array.isArray(tiles.urls)) {
+        yield* dedupeUrls(tiles.urls);
+        return;
+    }
+
+    const template = tiles.template;
+    if (!template || !Array.isArray(tiles.ranges)) return;
+
+    for (const range of tiles.ranges) {
+        for (let x = range.x_min; x <= range.x_max; x += 1) {
+            for (let y = range.y_min; y <= range.y_max; y += 1) {
+                yield template.replace('{z}', range.z).replace('{x}', x).replace('{y}', y);
+            }
+        }
+    }
+}
+
+function getBundleTileCount(bundle) {
+    const tiles = bundle?.tiles;
+    if (!tiles) return 0;
+    if (Array.isArray(tiles.urls)) return tiles.urls.length;
+    return tiles.count ?? 0;
 }
 
 function updatePrefetchSummary(bundle) {
@@ -206,7 +232,7 @@ function updatePrefetchSummary(bundle) {
     }
 
     const imageCount = getBundleImageUrls(bundle).length;
-    const tileCount = getBundleTileUrls(bundle).length;
+    const tileCount = getBundleTileCount(bundle);
     const generatedAt = bundle.generated_at
         ? new Date(bundle.generated_at).toLocaleString()
         : 'unknown time';
@@ -350,14 +376,12 @@ async function downloadOfflinePackage() {
         bundle = await fetchOfflineBundle(gameId);
         const bundleUrl = `/api/game/${gameId}/offline_bundle`;
         const imageUrls = getBundleImageUrls(bundle);
-        const tileUrls = getBundleTileUrls(bundle);
         const workItems = [
             { cacheName: API_CACHE, url: bundleUrl, kind: 'bundle' },
             ...imageUrls.map((url) => ({ cacheName: IMAGE_CACHE, url, kind: 'image' })),
-            ...tileUrls.map((url) => ({ cacheName: TILE_CACHE, url, kind: 'tile' })),
         ];
 
-        total = workItems.length;
+        total = workItems.length + getBundleTileCount(bundle);
         setPrefetchProgress(completed, total);
 
         await saveOfflineBundle(bundle);
@@ -373,6 +397,13 @@ async function downloadOfflinePackage() {
             setPrefetchStatus(`Cached ${item.kind} ${completed}/${total}.`);
         }
 
+        for (const url of iterBundleTileUrls(bundle)) {
+            await cacheAssetUrl(TILE_CACHE, url);
+            completed += 1;
+            setPrefetchProgress(completed, total);
+            setPrefetchStatus(`Cached tile ${completed}/${total}.`);
+        }
+
         updatePrefetchSummary(bundle);
         setPrefetchStatus('Offline bundle, images, and map tiles are ready on this device.', { tone: 'success' });
         showToast('Offline bundle downloaded successfully.', { type: 'success' });
@@ -415,7 +446,7 @@ async function removeOfflinePackage() {
             for (const url of getBundleImageUrls(bundle)) {
                 await deleteCachedUrl(IMAGE_CACHE, url);
             }
-            for (const url of getBundleTileUrls(bundle)) {
+            for (const url of iterBundleTileUrls(bundle)) {
                 await deleteCachedUrl(TILE_CACHE, url);
             }
         }
@@ -22,6 +22,7 @@ async function loadRoutesForGame(gameId) {
     allLocations = [];
     routes = [];
     renderRoutes();
+    populateEndpointSelects();
     return;
   }
 
@@ -34,6 +35,7 @@ async function loadRoutesForGame(gameId) {
     routes = data.routes || [];
 
     renderRoutes();
+    populateEndpointSelects();
   } catch (err) {
     console.error(err);
     showToast('Failed to load locations or routes', { type: 'danger' });
@@ -231,6 +233,57 @@ saveRoutesBtn.addEventListener('click', async () => {
     }
 });
 
+// ------------------ Generate routes ------------------
+function populateEndpointSelects() {
+  document.querySelectorAll('.route-endpoint-select').forEach(select => {
+    select.querySelectorAll('option:not([value=""])').forEach(opt => opt.remove());
+    allLocations.forEach(loc => {
+      const opt = document.createElement('option');
+      opt.value = loc.id;
+      opt.textContent = loc.name;
+      select.appendChild(opt);
+    });
+  });
+}
+
+function optionalInt(id) {
+  const value = parseInt(document.getElementById(id)?.value, 10);
+  return Number.isNaN(value) ? null : value;
+}
+
+document.getElementById('generateRoutesBtn')?.addEventListener('click', async () => {
+  const gameId = getActiveGameId();
+  if (!gameId) {
+    showToast('Please select a game first', { type: 'danger' });
+    return;
+  }
+  if (routes.length && !confirm('Replace the existing routes with generated ones?')) return;
+
+  try {
+    const resp = await fetch(`/api/game/${gameId}/routes/generate`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        count: optionalInt('genCount'),
+        route_length: optionalInt('genLength'),
+        start_location_id: optionalInt('genStart'),
+        finish_location_id: optionalInt('genFinish'),
+        balance: document.getElementById('genBalance')?.checked ?? true,
+      })
+    });
+    const data = await resp.json();
+    if (!resp.ok || !data.success) throw new Error(data.error || 'Failed to generate routes');
+
+    routes = data.routes;
+    renderRoutes();
+    const km = data.lengths_m.map(m => (m / 1000).toFixed(1));
+    showToast(`Generated ${routes.length} routes (${Math.min(...km)}–${Math.max(...km)} km)`, { duration: 3000, type: 'success' });
+  } catch (err) {
+    console.error(err);
+    showToast('Failed to generate routes: ' + err.message, { type: 'danger' });
+  }
+});
+
 if (boundGameId) {
   loadRoutesForGame(boundGameId);
 }
\ No newline at end of file
@@ -14,6 +14,9 @@ let geofenceIntervalId = null;
 let persistTimeoutId = null;
 let activeCallbacks = null;
 let immediateCheckInFlight = false;
+// JSON of each fence entry as last stored on the server ("state:<id>" /
+// "runtime:<id>"), so persisting sends only the entries that changed.
+let persistedEntries = null;
 
 function isObject(value) {
   return Boolean(value) && typeof value === 'object' && !Array.isArray(value);
@@ -34,6 +37,36 @@ function isoNow(nowMs = Date.now()) {
   return new Date(nowMs).toISOString();
 }
 
+// Polygon / multipolygon coordinates are GeoJSON ([lon, lat] points, later
+// rings are holes); returns the rings as [lat, lon] arrays, or null if invalid.
+function normalizePolygonRings(shape, coordinates) {
+  if (!Array.isArray(coordinates) || !coordinates.length) return null;
+  let polygons = coordinates;
+  if (shape === 'polygon') {
+    polygons = Array.isArray(coordinates[0]?.[0]) ? [coordinates] : [[coordinates]];
+  }
+
+  const rings = [];
+  for (const polygon of polygons) {
+    if (!Array.isArray(polygon)) return null;
+    for (const ring of polygon) {
+      if (!Array.isArray(ring)) return null;
+      const points = ring
+        .map((point) => (Array.isArray(point) ? [Number(point[1]), Number(point[0])] : null))
+        .filter((point) => point && Number.isFinite(point[0]) && Number.isFinite(point[1]));
+      if (points.length < 3) return null;
+      rings.push(points);
+    }
+  }
+  return rings.length ? rings : null;
+}
+
+function ringsBoundingBox(rings) {
+  const lats = rings.flat().map((point) => point[0]);
+  const lons = rings.flat().map((point) => point[1]);
+  return { minLat: Math.min(...lats), maxLat: Math.max(...lats), minLon: Math.min(...lons), maxLon: Math.max(...lons) };
+}
+
 function getNormalizedSettings() {
   const raw = isObject(root.GAME_DATA?.geofence_settings) ? root.GAME_DATA.geofence_settings : {};
   return {
@@ -62,9 +95,15 @@ function getNormalizedGeofenceMap() {
         const message = String(fence.message || '').trim();
         const shape = String(fence.shape || '').trim().toLowerCase();
 
-        if (shape !== 'circle') return null;
-        if (!Number.isFinite(centerLat) || !Number.isFinite(centerLon)) return null;
-        if (!Number.isFinite(radiusMeters) || radiusMeters <= 0) return null;
+        const isPolygon = shape === 'polygon' || shape === 'multipolygon';
+        const rings = isPolygon ? normalizePolygonRings(shape, fence.coordinates) : null;
+        if (isPolygon) {
+          if (!rings) return null;
+        } else {
+          if (shape !== 'circle') return null;
+          if (!Number.isFinite(centerLat) || !Number.isFinite(centerLon)) return null;
+          if (!Number.isFinite(radiusMeters) || radiusMeters <= 0) return null;
+        }
         if (!['enter', 'exit'].includes(trigger)) return null;
         if (!message) return null;
 
@@ -75,6 +114,8 @@ function getNormalizedGeofenceMap() {
           shape,
           center: { lat: centerLat, lon: centerLon },
           radius_m: radiusMeters,
+          rings,
+          bbox: rings ? ringsBoundingBox(rings) : null,
           trigger,
           message,
           cooldown_s: toPositiveInt(fence.cooldown_s, DEFAULT_SETTINGS.default_cooldown_s),
@@ -150,7 +191,30 @@ function getLatestNotificationMs(runtimeEntry, historyEntry) {
   ].filter(Boolean).sort((a, b) => b - a)[0] || null;
 }
 
-function isInsideCircle(latitude, longitude, fence) {
+function isInsidePolygon(latitude, longitude, fence) {
+  const { bbox } = fence;
+  if (latitude < bbox.minLat || latitude > bbox.maxLat || longitude < bbox.minLon || longitude > bbox.maxLon) {
+    return false;
+  }
+  // Ray casting with the even-odd rule over every ring (holes included).
+  let inside = false;
+  fence.rings.forEach((ring) => {
+    for (let i = 0, j = ring.length - 1; i < ring.length; j = i++) {
+      const [latI, lonI] = ring[i];
+      const [latJ, lonJ] = ring[j];
+      if ((latI > latitude) !== (latJ > latitude)
+        && longitude < lonI + ((latitude - latI) * (lonJ - lonI)) / (latJ - latI)) {
+        inside = !inside;
+      }
+    }
+  });
+  return inside;
+}
+
+function isInsideFence(latitude, longitude, fence) {
+  if (fence.rings) {
+    return isInsidePolygon(latitude, longitude, fence);
+  }
   return haversine(latitude, longitude, fence.center.lat, fence.center.lon) <= fence.radius_m;
 }
 
@@ -261,22 +325,43 @@ function shouldNotifyReminder({ fence, currentState, historyEntry, runtimeEntry,
   return (nowMs - lastReminderMs) >= repeatIntervalMs;
 }
 
+function snapshotEntries(geofenceState, geofenceRuntime) {
+  const snapshot = new Map();
+  Object.entries(geofenceState || {}).forEach(([fenceId, entry]) => snapshot.set(`state:${fenceId}`, JSON.stringify(entry)));
+  Object.entries(geofenceRuntime || {}).forEach(([fenceId, entry]) => snapshot.set(`runtime:${fenceId}`, JSON.stringify(entry)));
+  return snapshot;
+}
+
 async function persistGeofenceState(gameState) {
   const teamId = root.GAME_DATA?.teamId;
   if (!teamId || !navigator.onLine) {
     return;
   }
 
+  if (!persistedEntries) {
+    persistedEntries = snapshotEntries(root.GAME_DATA?.team_geofence_state, root.GAME_DATA?.team_geofence_runtime);
+  }
+  const current = snapshotEntries(gameState.geofence_state, gameState.geofence_runtime);
+  const patch = { geofence_state: {}, geofence_runtime: {} };
+  current.forEach((json, key) => {
+    if (persistedEntries.get(key) === json) return;
+    const [kind, ...rest] = key.split(':');
+    patch[kind === 'state' ? 'geofence_state' : 'geofence_runtime'][rest.join(':')] = JSON.parse(json);
+  });
+  if (!Object.keys(patch.geofence_state).length && !Object.keys(patch.geofence_runtime).length) {
+    return;
+  }
+
   try {
-    await fetch(`/api/team/${teamId}/geofence_state`, {
-      method: 'POST',
+    const response = await fetch(`/api/team/${teamId}/geofence_state`, {
+      method: 'PATCH',
       headers: { 'Content-Type': 'application/json' },
       credentials: 'same-origin',
-      body: JSON.stringify({
-        geofence_state: gameState.geofence_state || {},
-        geofence_runtime: gameState.geofence_runtime || {},
-      }),
+      body: JSON.stringify(patch),
     });
+    if (response.ok) {
+      persistedEntries = current;
+    }
   } catch (err) {
     console.warn('[geofences] Failed to persist team geofence state:', err);
   }
@@ -337,7 +422,7 @@ async function evaluateGeofences() {
         return;
       }
 
-      const currentState = isInsideCircle(position.latitude, position.longitude, fence) ? 'inside' : 'outside';
+      const currentState = isInsideFence(position.latitude, position.longitude, fence) ? 'inside' : 'outside';
       const runtimeEntry = isObject(gameState.geofence_runtime[fence.id])
         ? { ...gameState.geofence_runtime[fence.id] }
         : { fence_id: fence.id, location_id: fence.location_id };
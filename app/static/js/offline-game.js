@@ -203,8 +203,57 @@ function initializeSyncControls() {
 }
 
 
-async function fetchOfflineBundle(gameId) {
-  const response = await fetch(`/api/game/${gameId}/offline_bundle`, {
+// Live progress from teammates: the server pushes found/reset/override events
+// over SSE (/api/game/<id>/events); each burst triggers one state sync.
+let gameEventSource = null;
+let eventSyncTimer = null;
+
+function subscribeToGameEvents() {
+  const gameId = root.GAME_DATA?.gameId;
+  if (!gameId || !root.EventSource || gameEventSource) return;
+
+  gameEventSource = new root.EventSource(`/api/game/${gameId}/events`);
+  const scheduleSync = () => {
+    clearTimeout(eventSyncTimer);
+    eventSyncTimer = setTimeout(() => runSync({ manual: false }).catch(console.error), 500);
+  };
+  ['found', 'reset', 'override', 'resync'].forEach(type => {
+    gameEventSource.addEventListener(type, scheduleSync);
+  });
+}
+
+
+function mergeById(items, updates, deletedIds, sortKey) {
+  const byId = new Map((items || []).map(item => [item.id, item]));
+  (deletedIds || []).forEach(id => byId.delete(id));
+  (updates || []).forEach(item => byId.set(item.id, item));
+  const merged = Array.from(byId.values());
+  if (sortKey) merged.sort((a, b) => (a[sortKey] ?? 0) - (b[sortKey] ?? 0));
+  return merged;
+}
+
+
+export function applyBundleDelta(base, delta) {
+  if (!base || delta?.mode !== 'delta') return delta;
+
+  return {
+    ...base,
+    ...delta,
+    mode: 'full',
+    // Unchanged games come back as a bare {id}.
+    game: delta.game && 'name' in delta.game ? delta.game : base.game,
+    tiles: delta.tiles || base.tiles,
+    locations: mergeById(base.locations, delta.locations, delta.deleted?.locations, 'order_index'),
+    characters: mergeById(base.characters, delta.characters, delta.deleted?.characters),
+    since: undefined,
+    deleted: undefined,
+  };
+}
+
+
+async function fetchOfflineBundle(gameId, since = null) {
+  const query = since ? `?since=${encodeURIComponent(since)}` : '';
+  const response = await fetch(`/api/game/${gameId}/offline_bundle${query}`, {
     headers: { 'Accept': 'application/json' },
     credentials: 'same-origin',
   });
@@ -232,7 +281,10 @@ export async function downloadOfflineBundle(gameId = root.GAME_DATA?.gameId) {
     throw new Error('gameId is required to download an offline bundle');
   }
 
-  const bundle = await fetchOfflineBundle(gameId);
+  // Send the version we already hold so the server can answer with a delta.
+  const existing = offlineDB.getOfflineBundle ? await offlineDB.getOfflineBundle(gameId) : null;
+  const since = existing?.version?.token || null;
+  const bundle = applyBundleDelta(existing, await fetchOfflineBundle(gameId, since));
   await offlineDB.saveOfflineBundle(bundle);
   showToast('Offline bundle saved to this device.', { type: 'success' });
   return bundle;
@@ -402,6 +454,7 @@ export async function submitLocationValidation(methodResult) {
 // Listen for online events
 document.addEventListener('DOMContentLoaded', async () => {
   initializeSyncControls();
+  subscribeToGameEvents();
   await updatePendingBadge();
   await refreshSyncStatus();
 });
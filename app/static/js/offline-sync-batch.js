@@ -0,0 +1,85 @@
+// /static/js/offline-sync-batch.js
+//
+// Batched sync of queued found events through /api/sync/batch. Shared by the
+// page (offline-sync-page.js) and the service worker (offline-sync-sw.js,
+// via importScripts), so it must not touch window or document.
+
+(function (root) {
+  const BATCH_SYNC_URL = '/api/sync/batch';
+  const MAX_BATCH_SIZE = 50;
+
+  function toBatchEvent(update, queueKey) {
+    const match = /^\/api\/location\/(\d+)\/found$/.exec(update.url || '');
+    return {
+      ...(update.body || {}),
+      location_id: update.body?.location_id ?? update.location_id ?? (match ? Number(match[1]) : null),
+      queue_key: queueKey,
+    };
+  }
+
+  async function readPayload(response) {
+    const contentType = response.headers.get('content-type') || '';
+    if (!contentType.includes('application/json')) return null;
+    try {
+      return await response.json();
+    } catch {
+      return null;
+    }
+  }
+
+  function statusError(status, message, payload) {
+    const err = new Error(message);
+    err.status = status;
+    err.payload = payload;
+    err.isRetryable = status >= 500 || status === 429 || status === 401;
+    err.isPermanent = !err.isRetryable;
+    return err;
+  }
+
+  // Send up to MAX_BATCH_SIZE queued updates in one request. Synced, duplicate
+  // and conflicting (409) events leave the queue; others are handed to
+  // markQueuedFailure(update, db, err). Resolves to the updates the server
+  // accepted; rejects when the request as a whole fails.
+  async function sendBatch(updates, { offlineDB, buildQueueKey, markQueuedFailure, onSuccess, onFailure } = {}) {
+    const db = offlineDB || root.offlineDB;
+    const now = Date.now();
+    for (const update of updates) {
+      update.attempts = (update.attempts || 0) + 1;
+      update.lastTried = now;
+    }
+
+    const response = await fetch(BATCH_SYNC_URL, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ events: updates.map((update) => toBatchEvent(update, buildQueueKey(update))) }),
+      credentials: 'same-origin',
+    });
+    const data = await readPayload(response);
+    if (!response.ok || !Array.isArray(data?.results)) {
+      throw statusError(response.status, data?.error || data?.message || `Server responded ${response.status}`, data);
+    }
+
+    const sent = [];
+    for (const [index, update] of updates.entries()) {
+      const result = data.results[index] || {};
+      if (result.status === 'synced' || result.status === 'duplicate' || result.http_status === 409) {
+        if (update.id != null) await db.deleteUpdate(update.id);
+        if (result.http_status !== 409) {
+          sent.push(update);
+          onSuccess && onSuccess(result, update);
+        }
+        continue;
+      }
+
+      const err = statusError(result.http_status, result.error || `Server responded ${result.http_status}`, result);
+      const queuedUpdate = update.id != null ? await markQueuedFailure(update, db, err) : null;
+      onFailure && onFailure(err, queuedUpdate || update);
+    }
+    return sent;
+  }
+
+  root.offlineSyncBatch = {
+    MAX_BATCH_SIZE,
+    sendBatch,
+  };
+})(typeof self !== 'undefined' ? self : window);
@@ -8,6 +8,7 @@
   const BACKOFF_BASE_MS = 2000; // initial backoff
   const MAX_BACKOFF_MS = 60 * 1000; // max 1 minute
   const IS_SERVICE_WORKER = (typeof self !== 'undefined' && self.registration && self.skipWaiting);
+  const { MAX_BATCH_SIZE } = root.offlineSyncBatch;
 
   function computeBackoff(attempts) {
     const exp = Math.min(MAX_BACKOFF_MS, BACKOFF_BASE_MS * 2 ** (attempts - 1));
@@ -288,6 +289,18 @@
   }
 
 
+  // Found events without a photo can be replayed together through /api/sync/batch.
+  function isBatchableUpdate(update) {
+    return isFoundUpdate(update)
+      && /^\/api\/location\/\d+\/found$/.test(update?.url || '')
+      && !update.body?.__multipart
+      && !(update.body instanceof FormData);
+  }
+
+  function sendBatch(updates, options = {}) {
+    return root.offlineSyncBatch.sendBatch(updates, { ...options, buildQueueKey, markQueuedFailure });
+  }
+
   async function syncAllQueuedUpdates({ offlineDB=defaultDB, 
                                       onSuccess, onQueued, onFailure, shouldStop, gameId, teamId }={}) {
     let successCount = 0;
@@ -301,12 +314,35 @@
     }
     if (updates.length === 0) return successCount;
 
-    for (const update of updates) {
-      if (update.attempts >0 && update.lastTried) {
+    updates = updates.filter((update) => {
+      if (update.attempts > 0 && update.lastTried) {
         const delay = computeBackoff(update.attempts);
-        if (Date.now() - update.lastTried < delay) continue;
+        if (Date.now() - update.lastTried < delay) return false;
       }
+      return true;
+    });
 
+    // One round trip for all plain found events; anything else goes one by one.
+    const batchable = updates.filter(isBatchableUpdate);
+    if (batchable.length > 1) {
+      for (let start = 0; start < batchable.length; start += MAX_BATCH_SIZE) {
+        const chunk = batchable.slice(start, start + MAX_BATCH_SIZE);
+        try {
+          successCount += (await sendBatch(chunk, { offlineDB, onSuccess, onFailure })).length;
+        } catch (err) {
+          for (const update of chunk) {
+            if (update.id != null && typeof offlineDB.putUpdate === 'function') {
+              await offlineDB.putUpdate(update);
+            }
+            onFailure && onFailure(err, update);
+          }
+        }
+        if (shouldStop && shouldStop()) return successCount;
+      }
+      updates = updates.filter(update => !isBatchableUpdate(update));
+    }
+
+    for (const update of updates) {
       try {
         const sent = await sendOrQueue(update, { offlineDB, onSuccess, onQueued, onFailure, teamId: update.body?.team_id });
         if (sent) successCount += 1;
@@ -447,6 +483,7 @@
   root.offlineSync = {
     computeBackoff,
     sendOrQueue,
+    sendBatch,
     syncAllQueuedUpdates,
     getNetworkState,
     getPendingUpdatesSummary,
@@ -5,6 +5,7 @@
 
     const BACKOFF_BASE_MS = 2000;
     const MAX_BACKOFF_MS = 60 * 1000;
+    const { MAX_BATCH_SIZE } = root.offlineSyncBatch;
 
     function computeBackoff(attempts) {
         const exp = Math.min(MAX_BACKOFF_MS, BACKOFF_BASE_MS * 2 ** (attempts - 1));
@@ -159,26 +160,65 @@
         }
     }
 
+    function isBatchableUpdate(update) {
+        return /^\/api\/location\/\d+\/found$/.test(update?.url || '')
+            && !update.body?.__multipart
+            && !(update.body instanceof FormData);
+    }
+
+    function sendBatch(updates, options = {}) {
+        return root.offlineSyncBatch.sendBatch(updates, { ...options, buildQueueKey, markQueuedFailure });
+    }
+
+    function notifyUpdateSent(update) {
+        // Inform the page that an update was sent so it can update its UI
+        self.clients.matchAll().then(clients => {
+            clients.forEach(client => {
+                client.postMessage({ type: 'UPDATE_SENT', id: update.id, teamId: update.body?.team_id });
+            });
+        });
+    }
+
     async function syncAllQueuedUpdates({ offlineDB = defaultDB, onSuccess, onFailure, shouldStop } = {}) {
         let successCount = 0;
-        const updates = await offlineDB.getAllUpdates({ ordered: true });
+        let updates = await offlineDB.getAllUpdates({ ordered: true });
         if (updates.length === 0) return successCount;
 
-        for (const update of updates) {
+        updates = updates.filter((update) => {
             if (update.attempts > 0 && update.lastTried) {
                 const delay = computeBackoff(update.attempts);
-                if (Date.now() - update.lastTried < delay) continue;
+                if (Date.now() - update.lastTried < delay) return false;
+            }
+            return true;
+        });
+
+        const batchable = updates.filter(isBatchableUpdate);
+        if (batchable.length > 1) {
+            for (let start = 0; start < batchable.length; start += MAX_BATCH_SIZE) {
+                const chunk = batchable.slice(start, start + MAX_BATCH_SIZE);
+                try {
+                    const sent = await sendBatch(chunk, { offlineDB, onSuccess, onFailure });
+                    successCount += sent.length;
+                    sent.forEach(notifyUpdateSent);
+                } catch (err) {
+                    for (const update of chunk) {
+                        if (update.id != null && typeof offlineDB.putUpdate === 'function') {
+                            await offlineDB.putUpdate(update);
+                        }
+                        onFailure && onFailure(err, update);
+                    }
+                }
+                if (shouldStop && shouldStop()) return successCount;
             }
+            updates = updates.filter(update => !isBatchableUpdate(update));
+        }
+
+        for (const update of updates) {
             try {
                 const sent = await sendOrQueue(update, { offlineDB, onSuccess, onFailure });
                 if (sent) {
                     successCount += 1;
-                    // Inform the page that an update was sent so it can update its UI
-                    self.clients.matchAll().then(clients => {
-                        clients.forEach(client => {
-                            client.postMessage({ type: 'UPDATE_SENT', id: update.id, teamId: update.body?.team_id });
-                        });
-                    });
+                    notifyUpdateSent(update);
                 }
                 if (shouldStop && shouldStop()) break;
             } catch (err) {
@@ -192,6 +232,7 @@
     root.offlineSyncSW = {
         syncAllQueuedUpdates,
         sendOrQueue,
+        sendBatch,
         computeBackoff,
     };
 
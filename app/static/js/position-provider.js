@@ -3,6 +3,95 @@ const GEO_ENABLED = true;  // toggle this to false for dev or forced fallback
 let watchId = null;
 let callbackFn = null;
 
+// Track upload: real fixes are queued and POSTed to /api/team/<id>/track in
+// batches of [t_ms, lat, lon, accuracy]. The queue is kept while offline and
+// capped so a long outage drops the oldest samples first. A backlog drains
+// one batch per request. The pagehide flush uses keepalive, which browsers
+// only allow for bodies under 64 KiB, so it sends a size-capped slice.
+const TRACK_UPLOAD_INTERVAL_MS = 15000;
+const TRACK_UPLOAD_BATCH = 100;
+const TRACK_QUEUE_MAX = 5000;
+const TRACK_KEEPALIVE_MAX_BYTES = 48 * 1024;
+let trackQueue = [];
+let trackTimer = null;
+let trackUploading = false;
+let trackInFlight = 0;  // head of trackQueue currently being uploaded
+
+function recordTrackSample(pos) {
+  if (!window.GAME_DATA?.teamId || !pos?.coords) return;
+  const { latitude, longitude, accuracy } = pos.coords;
+  trackQueue.push([
+    pos.timestamp || Date.now(),
+    latitude,
+    longitude,
+    Number.isFinite(accuracy) ? Math.round(accuracy) : null,
+  ]);
+  if (trackQueue.length > TRACK_QUEUE_MAX) {
+    // Drop the oldest samples that are not part of an in-flight upload.
+    trackQueue.splice(trackInFlight, trackQueue.length - TRACK_QUEUE_MAX);
+  }
+  if (trackQueue.length >= TRACK_UPLOAD_BATCH) uploadTrack();
+  if (trackTimer === null) {
+    trackTimer = setInterval(uploadTrack, TRACK_UPLOAD_INTERVAL_MS);
+  }
+}
+
+function postTrackSamples(samples, keepalive = false) {
+  return fetch(`/api/team/${window.GAME_DATA.teamId}/track`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ samples }),
+    keepalive,
+  });
+}
+
+async function uploadTrack() {
+  if (trackUploading || !window.GAME_DATA?.teamId) return;
+  trackUploading = true;
+  try {
+    while (trackQueue.length && navigator.onLine) {
+      const batch = trackQueue.slice(0, TRACK_UPLOAD_BATCH);
+      trackInFlight = batch.length;
+      const res = await postTrackSamples(batch);
+      // 4xx other than rate limiting will not get better on retry.
+      if (!res.ok && !(res.status >= 400 && res.status < 500 && res.status !== 429)) break;
+      // Samples recorded meanwhile were appended, so the batch is still the head.
+      trackQueue.splice(0, batch.length);
+    }
+  } catch (err) {
+    console.warn("Track upload failed, will retry:", err.message);
+  } finally {
+    trackInFlight = 0;
+    trackUploading = false;
+  }
+}
+
+function flushTrackOnPageHide() {
+  // Skip the batch uploadTrack() already has in flight.
+  const start = trackInFlight;
+  if (trackQueue.length <= start || !window.GAME_DATA?.teamId || !navigator.onLine) return;
+  let count = Math.min(trackQueue.length - start, TRACK_UPLOAD_BATCH * 5);
+  while (count > 1 && JSON.stringify({ samples: trackQueue.slice(start, start + count) }).length > TRACK_KEEPALIVE_MAX_BYTES) {
+    count = Math.floor(count / 2);
+  }
+  const batch = trackQueue.splice(start, count);
+  const requeue = () => trackQueue.splice(trackInFlight, 0, ...batch);
+  try {
+    // Still here on failure (e.g. restored from the back/forward cache): retry later.
+    postTrackSamples(batch, true).catch(requeue);
+  } catch (err) {
+    requeue();
+  }
+}
+
+window.addEventListener("online", uploadTrack);
+window.addEventListener("pagehide", flushTrackOnPageHide);
+
+function handlePosition(pos) {
+  recordTrackSample(pos);
+  callbackFn(pos);
+}
+
 function getFallbackPosition() {
   if (window.GAME_DATA?.locations?.[0]) {
     const loc = window.GAME_DATA.locations[0];
@@ -28,7 +117,7 @@ export function initPositionTracking(callback) {
 
   navigator.geolocation.getCurrentPosition(
     (pos) => {
-      callbackFn(pos);
+      handlePosition(pos);
       startWatch();
     },
     (err) => {
@@ -48,7 +137,7 @@ function startWatch() {
 
   watchId = navigator.geolocation.watchPosition(
     (pos) => {
-      callbackFn(pos);
+      handlePosition(pos);
     },
     (err) => {
       if (err.code === err.PERMISSION_DENIED) {
@@ -68,4 +157,9 @@ export function stopPositionTracking() {
     navigator.geolocation.clearWatch(watchId);
     watchId = null;
   }
+  if (trackTimer !== null) {
+    clearInterval(trackTimer);
+    trackTimer = null;
+  }
+  uploadTrack();
 }
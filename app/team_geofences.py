@@ -0,0 +1,192 @@
+from datetime import datetime
+
+from sqlalchemy import bindparam, select
+
+from app.models import Team, TeamGeofenceState
+
+# Per-fence team geofence state.
+#
+# Both geofence engines (static/js/geofences.js, app/geofences.py) keep two
+# dicts per team keyed by fence id: the trigger history ("geofence_state")
+# and the latest observation ("geofence_runtime"). Each fence's pair is one
+# TeamGeofenceState row, so a poll that changes one fence writes one small
+# row instead of rewriting Team.data (selfies, audit entries and all).
+#
+# Every write takes the next Team.geofence_version with an UPDATE ... SET
+# v = v + 1 on the team row (outside the ORM, so it does not bump
+# progress_version) and stamps it on the rows it touched. Devices pass the
+# version they hold as ?since= and receive only later rows. Clearing a fence
+# keeps its row with both halves NULL so a delta can report the deletion.
+#
+# Teams written before the table existed still have the dicts in Team.data;
+# Team.get_geofence_tracking() reads them as a fallback and the first write
+# moves them into rows.
+
+LEGACY_KEYS = ('geofence_state', 'geofence_runtime')
+
+
+def _entry(value):
+    return dict(value) if isinstance(value, dict) else None
+
+
+def _location_id(*entries):
+    for entry in entries:
+        if entry and entry.get('location_id') is not None:
+            try:
+                return int(entry['location_id'])
+            except (TypeError, ValueError):
+                continue
+    return None
+
+
+def _stored_rows(session, team_id, fence_ids=None):
+    """The team's rows by fence id; only those in fence_ids when given."""
+    table = TeamGeofenceState.__table__
+    query = select(table.c.id, table.c.fence_id, table.c.state, table.c.runtime).where(table.c.team_id == team_id)
+    if fence_ids is not None:
+        if not fence_ids:
+            return {}
+        query = query.where(table.c.fence_id.in_(fence_ids))
+    return {row.fence_id: row for row in session.connection().execute(query)}
+
+
+def _take_legacy_entries(team):
+    """Remove and return the pre-table dicts from Team.data, if any."""
+    data = team.data if isinstance(team.data, dict) else {}
+    if not any(key in data for key in LEGACY_KEYS):
+        return {}, {}
+    state = {k: dict(v) for k, v in (data.get('geofence_state') or {}).items() if isinstance(v, dict)}
+    runtime = {k: dict(v) for k, v in (data.get('geofence_runtime') or {}).items() if isinstance(v, dict)}
+    team.data = {key: value for key, value in data.items() if key not in LEGACY_KEYS}
+    return state, runtime
+
+
+def next_geofence_version(session, team_id):
+    table = Team.__table__
+    conn = session.connection()
+    conn.execute(
+        table.update().where(table.c.id == team_id).values(geofence_version=table.c.geofence_version + 1)
+    )
+    return conn.execute(select(table.c.geofence_version).where(table.c.id == team_id)).scalar_one()
+
+
+def current_geofence_version(session, team_id):
+    table = Team.__table__
+    return session.connection().execute(
+        select(table.c.geofence_version).where(table.c.id == team_id)
+    ).scalar_one()
+
+
+def apply_geofence_patch(session, team, state=None, runtime=None, deleted=(), replace=False):
+    """
+    Write the fence entries that changed.
+
+    state / runtime map fence id to its new entry (None clears that half);
+    deleted lists fence ids to clear entirely. With replace=True, fences
+    missing from a given state / runtime dict are cleared as well (the
+    whole-dict POST). Entries equal to what is stored are not written.
+    Returns (version, sorted ids of the fences written).
+    """
+    legacy_state, legacy_runtime = _take_legacy_entries(team)
+    fence_ids = None
+    if not replace:
+        # A patch only needs the rows of the fences it names.
+        fence_ids = {
+            str(fence_id)
+            for fence_id in [*(state or ()), *(runtime or ()), *(deleted or ()), *legacy_state, *legacy_runtime]
+        }
+    stored = _stored_rows(session, team.id, fence_ids)
+    current = {fence_id: (row.state, row.runtime) for fence_id, row in stored.items()}
+    desired = dict(current)
+
+    for fence_id in set(legacy_state) | set(legacy_runtime):
+        if fence_id not in stored:
+            desired[fence_id] = (legacy_state.get(fence_id), legacy_runtime.get(fence_id))
+
+    if replace:
+        for fence_id, (old_state, old_runtime) in list(desired.items()):
+            desired[fence_id] = (
+                None if state is not None and fence_id not in state else old_state,
+                None if runtime is not None and fence_id not in runtime else old_runtime,
+            )
+    for fence_id, entry in (state or {}).items():
+        desired[str(fence_id)] = (_entry(entry), desired.get(str(fence_id), (None, None))[1])
+    for fence_id, entry in (runtime or {}).items():
+        desired[str(fence_id)] = (desired.get(str(fence_id), (None, None))[0], _entry(entry))
+    for fence_id in deleted or ():
+        desired[str(fence_id)] = (None, None)
+
+    changed = sorted(
+        fence_id for fence_id, pair in desired.items()
+        if pair != current.get(fence_id, (None, None))
+    )
+    if not changed:
+        return current_geofence_version(session, team.id), []
+
+    version = next_geofence_version(session, team.id)
+    now = datetime.utcnow()
+    table = TeamGeofenceState.__table__
+    conn = session.connection()
+
+    updates, inserts = [], []
+    for fence_id in changed:
+        new_state, new_runtime = desired[fence_id]
+        values = {
+            'location_id': _location_id(new_runtime, new_state),
+            'state': new_state,
+            'runtime': new_runtime,
+            'version': version,
+            'updated_at': now,
+        }
+        if fence_id in stored:
+            updates.append({'row_id': stored[fence_id].id, **values})
+        else:
+            inserts.append({'team_id': team.id, 'fence_id': fence_id, **values})
+
+    if updates:
+        conn.execute(
+            table.update().where(table.c.id == bindparam('row_id')).values(
+                location_id=bindparam('location_id'), state=bindparam('state'), runtime=bindparam('runtime'),
+                version=bindparam('version'), updated_at=bindparam('updated_at'),
+            ),
+            updates,
+        )
+    if inserts:
+        conn.execute(table.insert(), inserts)
+
+    session.expire(team, ['geofence_states', 'geofence_version'])
+    return version, changed
+
+
+def geofence_changes_since(session, team, since):
+    """
+    Fence entries written after version `since`, as
+    {'version', 'since', 'full', 'geofence_state', 'geofence_runtime', 'deleted'}.
+    A missing or unusable `since` gets the full state (full=True); otherwise
+    a None entry means that half was cleared and 'deleted' lists fences with
+    nothing left.
+    """
+    version = current_geofence_version(session, team.id)
+    if since is None or since < 0 or since > version:
+        state, runtime = team.get_geofence_tracking()
+        return {
+            'version': version, 'since': None, 'full': True,
+            'geofence_state': state, 'geofence_runtime': runtime, 'deleted': [],
+        }
+
+    table = TeamGeofenceState.__table__
+    state, runtime, deleted = {}, {}, []
+    for row in session.connection().execute(
+        select(table.c.fence_id, table.c.state, table.c.runtime)
+        .where(table.c.team_id == team.id, table.c.version > since)
+        .order_by(table.c.version, table.c.id)
+    ):
+        if row.state is None and row.runtime is None:
+            deleted.append(row.fence_id)
+            continue
+        state[row.fence_id] = row.state
+        runtime[row.fence_id] = row.runtime
+    return {
+        'version': version, 'since': since, 'full': False,
+        'geofence_state': state, 'geofence_runtime': runtime, 'deleted': deleted,
+    }
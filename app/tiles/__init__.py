@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+tiles_bp = Blueprint('tiles', __name__)
+
+from app.tiles import routes
@@ -0,0 +1,54 @@
+from flask import Response, abort, current_app, jsonify
+
+from app.admin.routes import admin_required
+from app.main import utils
+from app.models import Game, db
+from app.tiles import tiles_bp
+from app.tiles.store import (fetch_upstream_tile, get_tile_store, proxy_enabled,
+                             start_game_prefetch, tile_in_game_area)
+
+# A tile at a given z/x/y never changes within the store's lifetime.
+TILE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+@tiles_bp.route('/tiles/<int:z>/<int:x>/<int:y>.png')
+def tile(z, x, y):
+    if not proxy_enabled():
+        abort(404)
+    if z > utils.MAX_TILE_ZOOM or x >= 2 ** z or y >= 2 ** z:
+        abort(404)
+
+    store = get_tile_store()
+    data = store.get(z, x, y)
+    cache_status = 'HIT'
+    if data is None:
+        # Only fetch what some game's players could need; the admin prefetch
+        # job is the bulk filler. Anything else would make this an open proxy.
+        if not tile_in_game_area(z, x, y, store):
+            abort(404)
+        cache_status = 'MISS'
+        try:
+            data = fetch_upstream_tile(z, x, y)
+        except Exception:
+            current_app.logger.warning("Upstream tile fetch failed for %s/%s/%s", z, x, y)
+            return Response(status=502)
+        store.put(z, x, y, data)
+
+    response = Response(data, mimetype='image/png')
+    response.headers['Cache-Control'] = TILE_CACHE_CONTROL
+    response.headers['X-Tile-Cache'] = cache_status
+    return response
+
+
+@tiles_bp.route('/tiles/prefetch/<int:game_id>', methods=['POST'])
+@admin_required
+def prefetch_game(game_id):
+    if not proxy_enabled():
+        return jsonify({"success": False, "message": "Tile proxy is disabled"}), 404
+
+    game = db.session.get(Game, game_id)
+    if not game:
+        return jsonify({"success": False, "message": "Game not found"}), 404
+
+    start_game_prefetch(current_app._get_current_object(), game_id)
+    return jsonify({"success": True, "game_id": game_id, "message": "Tile prefetch started"}), 202
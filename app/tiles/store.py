@@ -0,0 +1,327 @@
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app
+
+# Server-side tile store.
+#
+# Tiles live in an MBTiles file (SQLite; TMS row numbering) so the store can
+# be inspected or reused by standard tooling. A side table, tile_lru, tracks
+# each tile's size and last access; when the store grows past max_bytes the
+# least recently used tiles are evicted down to LOW_WATERMARK of the budget.
+#
+# Another side table, tile_area, lists the tile ranges (XYZ numbering) that
+# the proxy may fetch upstream on a miss: every team's bundle selection and
+# each game's padded bounds, per game content version. Being in the MBTiles
+# file, it is shared by every worker using the store.
+
+PROXY_TILE_TEMPLATE = '/tiles/{z}/{x}/{y}.png'
+LOW_WATERMARK = 0.9
+# Recorded for a game without bounds, so its version counts as done; matches no tile.
+_NO_AREA = {'z': -1, 'x_min': 0, 'x_max': -1, 'y_min': 0, 'y_max': -1}
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT)",
+    """
+    CREATE TABLE IF NOT EXISTS tiles (
+        zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB,
+        PRIMARY KEY (zoom_level, tile_column, tile_row)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tile_lru (
+        zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER,
+        size INTEGER NOT NULL, last_access REAL NOT NULL,
+        PRIMARY KEY (zoom_level, tile_column, tile_row)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_tile_lru_last_access ON tile_lru (last_access)",
+    """
+    CREATE TABLE IF NOT EXISTS tile_area (
+        game_id INTEGER, content_version INTEGER, kind TEXT,
+        zoom_level INTEGER, x_min INTEGER, x_max INTEGER, y_min INTEGER, y_max INTEGER,
+        PRIMARY KEY (game_id, content_version, kind, zoom_level, x_min, x_max, y_min, y_max)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_tile_area_zoom ON tile_area (zoom_level, x_min, x_max)",
+    "INSERT OR IGNORE INTO metadata VALUES ('name', 'geokr tile cache')",
+    "INSERT OR IGNORE INTO metadata VALUES ('format', 'png')",
+]
+
+
+class MBTilesStore:
+    """Thread-safe MBTiles tile cache with byte-budget LRU eviction."""
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+        self._total_bytes = self._conn.execute("SELECT total(size) FROM tile_lru").fetchone()[0]
+
+    @staticmethod
+    def _key(z, x, y):
+        # MBTiles stores rows bottom-up (TMS); URLs are top-down (XYZ).
+        return z, x, (2 ** z - 1) - y
+
+    @property
+    def total_bytes(self):
+        return int(self._total_bytes)
+
+    def get(self, z, x, y):
+        key = self._key(z, x, y)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                key,
+            ).fetchone()
+            if row is None:
+                return None
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE tile_lru SET last_access = ? WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                    (time.time(), *key),
+                )
+        return bytes(row[0])
+
+    def contains(self, z, x, y):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM tile_lru WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                self._key(z, x, y),
+            ).fetchone() is not None
+
+    def put(self, z, x, y, data):
+        key = self._key(z, x, y)
+        with self._lock:
+            with self._conn:
+                old = self._conn.execute(
+                    "SELECT size FROM tile_lru WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                    key,
+                ).fetchone()
+                self._conn.execute("INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)", (*key, sqlite3.Binary(data)))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO tile_lru VALUES (?, ?, ?, ?, ?)",
+                    (*key, len(data), time.time()),
+                )
+            self._total_bytes += len(data) - (old[0] if old else 0)
+            if self.max_bytes and self._total_bytes > self.max_bytes:
+                self._evict(int(self.max_bytes * LOW_WATERMARK))
+
+    def _evict(self, target_bytes):
+        """Drop least recently used tiles until the store fits target_bytes."""
+        excess = self._total_bytes - target_bytes
+        victims = []
+        for z, col, row, size in self._conn.execute(
+            "SELECT zoom_level, tile_column, tile_row, size FROM tile_lru ORDER BY last_access"
+        ):
+            if excess <= 0:
+                break
+            victims.append((z, col, row))
+            excess -= size
+
+        with self._conn:
+            self._conn.executemany(
+                "DELETE FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?", victims
+            )
+            self._conn.executemany(
+                "DELETE FROM tile_lru WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?", victims
+            )
+        self._total_bytes = self._conn.execute("SELECT total(size) FROM tile_lru").fetchone()[0]
+        return len(victims)
+
+    def add_area(self, game_id, content_version, ranges, kind='route'):
+        """Allow upstream fetches of ``ranges``, dropping the game's older versions."""
+        rows = [
+            (game_id, content_version, kind, r['z'], r['x_min'], r['x_max'], r['y_min'], r['y_max'])
+            for r in ranges
+        ]
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM tile_area WHERE game_id = ? AND content_version < ?", (game_id, content_version)
+                )
+                self._conn.executemany("INSERT OR IGNORE INTO tile_area VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def in_area(self, z, x, y):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM tile_area WHERE zoom_level = ? AND x_min <= ? AND x_max >= ?"
+                " AND y_min <= ? AND y_max >= ? LIMIT 1",
+                (z, x, x, y, y),
+            ).fetchone() is not None
+
+    def area_versions(self, kind):
+        """{game_id: latest content version} of the recorded areas of one kind."""
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT game_id, max(content_version) FROM tile_area WHERE kind = ? GROUP BY game_id", (kind,)
+            ))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def proxy_enabled(app=None):
+    app = app or current_app
+    return bool(app.config.get('TILE_PROXY_ENABLED'))
+
+
+def public_tile_template(upstream_template):
+    """URL template clients should download tiles from."""
+    if proxy_enabled():
+        return PROXY_TILE_TEMPLATE
+    return upstream_template
+
+
+def get_tile_store(app=None):
+    """Return the app's MBTilesStore, (re)opening it if the configured path changed."""
+    app = app or current_app
+    path = app.config.get('TILE_STORE_PATH') or os.path.join(app.instance_path, 'tiles.mbtiles')
+    max_bytes = app.config.get('TILE_STORE_MAX_BYTES') or 0
+
+    store = app.extensions.get('tile_store')
+    if store is None or store.path != path:
+        if store is not None:
+            store.close()
+        store = MBTilesStore(path, max_bytes)
+        app.extensions['tile_store'] = store
+    store.max_bytes = max_bytes
+    return store
+
+
+def fetch_upstream_tile(z, x, y, app=None):
+    """Download one tile from TILE_UPSTREAM_URL; raises on HTTP or network errors."""
+    app = app or current_app
+    url = app.config['TILE_UPSTREAM_URL'].format(z=z, x=x, y=y)
+    req = urllib.request.Request(url, headers={'User-Agent': app.config.get('TILE_USER_AGENT', 'geokr')})
+    with urllib.request.urlopen(req, timeout=app.config.get('TILE_FETCH_TIMEOUT_SECONDS', 10)) as resp:
+        return resp.read()
+
+
+def _add_bounds_areas(store):
+    """
+    Record the padded bounds of games whose current content version is not in
+    tile_area yet. Only (id, content_version) is read for the others.
+    """
+    from app.models import Game, db
+    from app.main.tile_selector import padded_bounds_ranges
+
+    recorded = store.area_versions('bounds')
+    stale = [
+        game_id for game_id, content_version in db.session.query(Game.id, Game.content_version)
+        if recorded.get(game_id, 0) < content_version
+    ]
+    for game_id in stale:
+        game = db.session.get(Game, game_id)
+        store.add_area(game.id, game.content_version, padded_bounds_ranges(game) or [_NO_AREA], kind='bounds')
+    return bool(stale)
+
+
+def tile_in_game_area(z, x, y, store=None):
+    """
+    True when a tile is in some team's bundle selection or in a game's padded
+    bounds at its offline zooms. Store misses outside every game are not
+    fetched upstream.
+    """
+    store = store or get_tile_store()
+    if store.in_area(z, x, y):
+        return True
+    return _add_bounds_areas(store) and store.in_area(z, x, y)
+
+
+def prefetch_tiles(app, tiles, concurrency=None):
+    """
+    Fill the store with (z, x, y) tiles, at most ``concurrency`` upstream
+    requests in flight. ``tiles`` may be a lazy iterator; it is consumed as
+    workers free up. Returns {'fetched', 'skipped', 'failed'} counts.
+    """
+    store = get_tile_store(app)
+    concurrency = max(1, concurrency or app.config.get('TILE_PREFETCH_CONCURRENCY', 4))
+    slots = threading.BoundedSemaphore(concurrency * 2)
+    stats = {'fetched': 0, 'skipped': 0, 'failed': 0}
+    stats_lock = threading.Lock()
+
+    def _work(z, x, y):
+        try:
+            store.put(z, x, y, fetch_upstream_tile(z, x, y, app))
+            outcome = 'fetched'
+        except Exception:
+            app.logger.warning("Tile prefetch failed for %s/%s/%s", z, x, y)
+            outcome = 'failed'
+        finally:
+            slots.release()
+        with stats_lock:
+            stats[outcome] += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='tile-prefetch') as pool:
+        for z, x, y in tiles:
+            if store.contains(z, x, y):
+                stats['skipped'] += 1
+                continue
+            slots.acquire()
+            pool.submit(_work, z, x, y)
+    return stats
+
+
+def prefetch_game_tiles(app, game_id):
+    """Prefetch every tile of a game's bounds at its offline zooms."""
+    from app.models import Game, db
+    from app.main import utils
+    from app.main.tile_selector import offline_zoom_levels
+
+    with app.app_context():
+        game = db.session.get(Game, game_id)
+        if not game or None in (game.min_lat, game.max_lat, game.min_lon, game.max_lon):
+            return {'fetched': 0, 'skipped': 0, 'failed': 0}
+        ranges = utils.tile_ranges(game.min_lat, game.min_lon, game.max_lat, game.max_lon,
+                                   offline_zoom_levels(game))
+        ranges, _ = utils.cap_tile_ranges(ranges)
+        db.session.remove()
+
+    return prefetch_tiles(app, utils.iter_tiles(ranges))
+
+
+def start_game_prefetch(app, game_id, tiles=None, job_key=None):
+    """
+    Run prefetch_game_tiles in a background thread, or prefetch_tiles over
+    ``tiles`` when given. One job runs per ``job_key`` (default: the game id).
+    """
+    job_key = game_id if job_key is None else job_key
+    jobs = app.extensions.setdefault('tile_prefetch_jobs', {})
+    running = jobs.get(job_key)
+    if running is not None and running.is_alive():
+        return running
+
+    def _run():
+        try:
+            stats = prefetch_tiles(app, tiles) if tiles is not None else prefetch_game_tiles(app, game_id)
+            app.logger.info("Tile prefetch for game %s finished: %s", game_id, stats)
+        except Exception:
+            app.logger.exception("Tile prefetch for game %s failed", game_id)
+
+    thread = threading.Thread(target=_run, name=f'tile-prefetch-{game_id}', daemon=True)
+    jobs[job_key] = thread
+    thread.start()
+    return thread
+
+
+def init_tile_proxy(app):
+    @app.cli.command('prefetch-tiles')
+    @click.argument('game_id', type=int)
+    def prefetch_tiles_command(game_id):
+        """Fill the tile store for one game's bounds."""
+        print(f"Tile prefetch for game {game_id}: {prefetch_game_tiles(app, game_id)}")
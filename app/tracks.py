@@ -0,0 +1,316 @@
+import atexit
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+from flask import current_app
+
+from app.models import TrackChunk
+
+# Team GPS tracks, kept for post-event review.
+#
+# Devices POST batches of samples to /api/team/<id>/track. They land in a
+# per-process TrackBuffer and are written as one TrackChunk per team when
+# that team has TRACK_CHUNK_MAX_POINTS buffered or its oldest buffered sample
+# is TRACK_FLUSH_SECONDS old. The check runs on every ingest request and in
+# a background thread every TRACK_FLUSH_SECONDS, so a quiet worker's samples
+# reach the database too; a read also flushes that team first, and whatever
+# is left is flushed at interpreter exit. Samples whose write or commit fails
+# go back into the buffer for the next flush.
+#
+# A chunk stores fixed-point integer arrays: time in epoch ms, lat/lon in
+# microdegrees (~11 cm) and accuracy in whole meters. The first sample is
+# kept in the header and the rest as deltas from the previous sample, which
+# are small and compress well with zlib. With TRACK_SIMPLIFY_M set, chunks
+# are thinned with Douglas-Peucker before they are written. Reading a team's
+# whole track is one (team_id, start_ms) index range over its chunks.
+
+COORD_SCALE = 1_000_000
+MAX_ACCURACY_M = 65535
+NO_ACCURACY = MAX_ACCURACY_M
+METERS_PER_DEGREE = 111320.0
+
+FORMAT_VERSION = 1
+# version, sample count, first time (ms), first lat, first lon (microdegrees)
+_HEADER = struct.Struct('<BIqii')
+
+
+def encode_chunk(t_ms, lat, lon, accuracy):
+    """Pack time-ordered sample arrays into a chunk blob."""
+    t_ms = np.asarray(t_ms, dtype=np.int64)
+    lat_fixed = np.rint(np.asarray(lat, dtype=np.float64) * COORD_SCALE).astype(np.int32)
+    lon_fixed = np.rint(np.asarray(lon, dtype=np.float64) * COORD_SCALE).astype(np.int32)
+    acc = np.asarray(accuracy, dtype=np.float64)
+    acc = np.where(np.isfinite(acc), np.clip(np.rint(acc), 0, MAX_ACCURACY_M - 1), NO_ACCURACY).astype('<u2')
+
+    header = _HEADER.pack(FORMAT_VERSION, len(t_ms), int(t_ms[0]), int(lat_fixed[0]), int(lon_fixed[0]))
+    body = b''.join((
+        np.diff(t_ms).astype('<i8').tobytes(),
+        np.diff(lat_fixed).astype('<i4').tobytes(),
+        np.diff(lon_fixed).astype('<i4').tobytes(),
+        acc.tobytes(),
+    ))
+    return header + zlib.compress(body)
+
+
+def decode_chunk(blob):
+    """Inverse of encode_chunk: (t_ms int64, lat float64, lon float64, accuracy float64 with NaN for unknown)."""
+    version, count, t0, lat0, lon0 = _HEADER.unpack_from(blob)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported track chunk format {version}")
+    body = zlib.decompress(blob[_HEADER.size:])
+    deltas = count - 1
+    offset = 0
+
+    def _take(dtype, n):
+        nonlocal offset
+        array = np.frombuffer(body, dtype=dtype, count=n, offset=offset)
+        offset += array.nbytes
+        return array
+
+    t_ms = np.concatenate(([t0], t0 + np.cumsum(_take('<i8', deltas))))
+    lat = np.concatenate(([lat0], lat0 + np.cumsum(_take('<i4', deltas), dtype=np.int64))) / COORD_SCALE
+    lon = np.concatenate(([lon0], lon0 + np.cumsum(_take('<i4', deltas), dtype=np.int64))) / COORD_SCALE
+    acc = _take('<u2', count).astype(np.float64)
+    acc[acc == NO_ACCURACY] = np.nan
+    return t_ms.astype(np.int64), lat, lon, acc
+
+
+def simplify_mask(lat, lon, tolerance_m):
+    """Douglas-Peucker: boolean mask of the samples to keep (endpoints always kept)."""
+    n = len(lat)
+    keep = np.zeros(n, dtype=bool)
+    if n <= 2 or tolerance_m <= 0:
+        keep[:] = True
+        return keep
+
+    # Local equirectangular projection; fine at track scale.
+    y = np.asarray(lat, dtype=np.float64) * METERS_PER_DEGREE
+    x = np.asarray(lon, dtype=np.float64) * METERS_PER_DEGREE * np.cos(np.radians(np.mean(lat)))
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        length = np.hypot(dx, dy)
+        if length == 0:
+            distances = np.hypot(px, py)
+        else:
+            distances = np.abs(px * dy - py * dx) / length
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance_m:
+            split = start + 1 + index
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+def parse_samples(raw_samples, now_ms=None):
+    """
+    Validate samples into (t_ms, lat, lon, accuracy) arrays. Accepts
+    [t_ms, lat, lon, accuracy?] rows (the compact form position-provider.js
+    sends) or {'t', 'lat', 'lon', 'accuracy'} dicts; a missing time means now.
+    Returns (arrays, rejected_count).
+    """
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    rows = []
+    for raw in raw_samples:
+        if isinstance(raw, dict):
+            raw = (raw.get('t'), raw.get('lat'), raw.get('lon'), raw.get('accuracy'))
+        elif not isinstance(raw, (list, tuple)) or len(raw) < 3:
+            rows.append((np.nan,) * 4)
+            continue
+        row = []
+        for value in (list(raw) + [None])[:4]:
+            try:
+                row.append(float(value) if value is not None else np.nan)
+            except (TypeError, ValueError):
+                row.append(np.nan)
+        rows.append(row)
+
+    table = np.array(rows, dtype=np.float64).reshape(-1, 4)
+    t_ms, lat, lon, acc = table.T
+    t_ms = np.where(np.isnan(t_ms), now_ms, t_ms)
+    valid = (
+        np.isfinite(lat) & np.isfinite(lon) & np.isfinite(t_ms)
+        & (np.abs(lat) <= 90) & (np.abs(lon) <= 180) & (t_ms > 0) & (t_ms <= now_ms + 300_000)
+    )
+    arrays = (t_ms[valid].astype(np.int64), lat[valid], lon[valid], acc[valid])
+    return arrays, int(len(valid) - valid.sum())
+
+
+class TrackBuffer:
+    """Thread-safe per-team sample buffer."""
+
+    def __init__(self, chunk_max_points=2000, flush_seconds=10.0, clock=time.monotonic):
+        self.chunk_max_points = chunk_max_points
+        self.flush_seconds = flush_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._teams = {}  # team_id -> [game_id, first buffered at, [arrays, ...], count]
+
+    def add(self, team_id, game_id, arrays):
+        count = len(arrays[0])
+        if not count:
+            return 0
+        with self._lock:
+            entry = self._teams.get(team_id)
+            if entry is None:
+                entry = self._teams[team_id] = [game_id, self.clock(), [], 0]
+            entry[2].append(arrays)
+            entry[3] += count
+            return entry[3]
+
+    def buffered(self, team_id):
+        with self._lock:
+            entry = self._teams.get(team_id)
+            return entry[3] if entry else 0
+
+    def take(self, team_ids=None, due_only=False):
+        """Remove and return {team_id: (game_id, t_ms, lat, lon, acc)} for the selected teams."""
+        now = self.clock()
+        taken = {}
+        with self._lock:
+            for team_id in list(self._teams if team_ids is None else team_ids):
+                entry = self._teams.get(team_id)
+                if entry is None:
+                    continue
+                if due_only and entry[3] < self.chunk_max_points and now - entry[1] < self.flush_seconds:
+                    continue
+                del self._teams[team_id]
+                taken[team_id] = (entry[0], *(np.concatenate(part) for part in zip(*entry[2])))
+        return taken
+
+    def restore(self, taken):
+        """Put take()'s output back, ahead of anything buffered since."""
+        now = self.clock()
+        with self._lock:
+            for team_id, (game_id, *arrays) in taken.items():
+                entry = self._teams.get(team_id)
+                if entry is None:
+                    self._teams[team_id] = [game_id, now, [tuple(arrays)], len(arrays[0])]
+                else:
+                    entry[2].insert(0, tuple(arrays))
+                    entry[3] += len(arrays[0])
+
+
+def write_chunks(session, taken, chunk_max_points=2000, simplify_m=0):
+    """Insert TrackChunk rows for take()'s output; returns the number of samples stored."""
+    rows = []
+    stored = 0
+    for team_id, (game_id, t_ms, lat, lon, acc) in taken.items():
+        order = np.argsort(t_ms, kind='stable')
+        t_ms, lat, lon, acc = t_ms[order], lat[order], lon[order], acc[order]
+        for start in range(0, len(t_ms), chunk_max_points):
+            part = slice(start, start + chunk_max_points)
+            keep = simplify_mask(lat[part], lon[part], simplify_m)
+            chunk = [array[part][keep] for array in (t_ms, lat, lon, acc)]
+            rows.append({
+                'team_id': team_id,
+                'game_id': game_id,
+                'start_ms': int(chunk[0][0]),
+                'end_ms': int(chunk[0][-1]),
+                'point_count': len(chunk[0]),
+                'data': encode_chunk(*chunk),
+            })
+            stored += len(chunk[0])
+    if rows:
+        session.connection().execute(TrackChunk.__table__.insert(), rows)
+    return stored
+
+
+def flush_tracks(session, team_ids=None, due_only=False, app=None):
+    """
+    Write and commit the selected teams' buffered samples; returns the number
+    of samples stored. On failure the samples are put back and the error
+    re-raised.
+    """
+    app = app or current_app
+    buffer = get_track_buffer(app)
+    taken = buffer.take(team_ids, due_only=due_only)
+    if not taken:
+        return 0
+    try:
+        stored = write_chunks(
+            session,
+            taken,
+            chunk_max_points=buffer.chunk_max_points,
+            simplify_m=app.config.get('TRACK_SIMPLIFY_M', 0),
+        )
+        session.commit()
+    except Exception:
+        session.rollback()
+        buffer.restore(taken)
+        raise
+    return stored
+
+
+def read_track(session, team_id):
+    """A team's stored samples in time order, as (t_ms, lat, lon, acc) arrays."""
+    table = TrackChunk.__table__
+    parts = [
+        decode_chunk(row.data)
+        for row in session.connection().execute(
+            table.select().with_only_columns(table.c.data)
+            .where(table.c.team_id == team_id)
+            .order_by(table.c.start_ms, table.c.id)
+        )
+    ]
+    if not parts:
+        empty = np.array([], dtype=np.float64)
+        return np.array([], dtype=np.int64), empty, empty, empty
+    t_ms, lat, lon, acc = (np.concatenate(columns) for columns in zip(*parts))
+    # Chunks from different workers may overlap in time.
+    order = np.argsort(t_ms, kind='stable')
+    return t_ms[order], lat[order], lon[order], acc[order]
+
+
+def get_track_buffer(app=None):
+    app = app or current_app
+    return app.extensions['track_buffer']
+
+
+def _flush_in_background(app, due_only):
+    from app.models import db
+
+    with app.app_context():
+        try:
+            flush_tracks(db.session, due_only=due_only, app=app)
+        except Exception:
+            app.logger.exception("Track flush failed; samples stay buffered")
+        finally:
+            db.session.remove()
+
+
+def start_track_flusher(app):
+    """Flush due track samples every TRACK_FLUSH_SECONDS in a daemon thread,
+    and everything still buffered at interpreter exit."""
+    interval = app.config.get('TRACK_FLUSH_SECONDS')
+    if not interval or app.testing:
+        return None
+
+    def _run():
+        while True:
+            time.sleep(interval)
+            _flush_in_background(app, due_only=True)
+
+    atexit.register(_flush_in_background, app, False)
+    thread = threading.Thread(target=_run, name='track-flush', daemon=True)
+    thread.start()
+    return thread
+
+
+def init_tracks(app):
+    buffer = TrackBuffer(
+        chunk_max_points=app.config.get('TRACK_CHUNK_MAX_POINTS', 2000),
+        flush_seconds=app.config.get('TRACK_FLUSH_SECONDS', 10),
+    )
+    app.extensions['track_buffer'] = buffer
+    start_track_flusher(app)
+    return buffer
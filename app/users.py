@@ -0,0 +1,103 @@
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload, make_transient_to_detached
+
+from app.models import Role, User, UserRole, db
+
+# Flask-Login user loading.
+#
+# load_user() fetches the user with its roles in one joined query and primes
+# User.role_names, so is_admin / has_role are set lookups with no lazy loads.
+# With USER_CACHE_TTL_SECONDS > 0 the user's columns and role names are also
+# kept in a per-process cache; a hit rebuilds the instance with
+# session.merge(load=False), which issues no query at all. Role and user
+# writes in this process drop the affected entries on flush; other workers
+# see them once their entry expires.
+
+_cache = {}
+_cache_lock = threading.Lock()
+_USER_COLUMNS = tuple(column.key for column in User.__mapper__.column_attrs)
+
+
+def invalidate_user(user_id):
+    with _cache_lock:
+        _cache.pop(user_id, None)
+
+
+def clear_user_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def _from_cache(user_id, now):
+    with _cache_lock:
+        entry = _cache.get(user_id)
+    if entry is None or entry[0] <= now:
+        return None
+
+    _expires_at, columns, role_names = entry
+    user = db.session.identity_map.get(db.session.identity_key(User, user_id))
+    if user is None:
+        user = User(**columns)
+        make_transient_to_detached(user)
+        user = db.session.merge(user, load=False)
+    user.__dict__.setdefault('_role_names', role_names)
+    return user
+
+
+def load_user(user_id):
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    ttl = current_app.config.get('USER_CACHE_TTL_SECONDS', 0)
+    now = time.monotonic()
+    if ttl > 0:
+        user = _from_cache(user_id, now)
+        if user is not None:
+            return user
+
+    user = (
+        db.session.query(User)
+        .options(joinedload(User.user_roles).joinedload(UserRole.role))
+        .filter(User.id == user_id)
+        .first()
+    )
+    if user is None:
+        return None
+
+    user.__dict__.pop('_role_names', None)
+    role_names = user.role_names
+    if ttl > 0:
+        columns = {key: getattr(user, key) for key in _USER_COLUMNS}
+        with _cache_lock:
+            _cache[user_id] = (now + ttl, columns, role_names)
+    return user
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_users_after_flush(session, flush_context):
+    user_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Role):
+            # A renamed role affects every holder.
+            clear_user_cache()
+            user_ids.update(
+                key[1][0] for key, instance in session.identity_map.items() if isinstance(instance, User)
+            )
+        elif isinstance(obj, UserRole):
+            user_id = obj.user_id if obj.user_id is not None else getattr(obj.user, 'id', None)
+            if user_id is not None:
+                user_ids.add(user_id)
+        elif isinstance(obj, User) and obj.id is not None:
+            user_ids.add(obj.id)
+
+    for user_id in user_ids:
+        invalidate_user(user_id)
+        user = session.identity_map.get(session.identity_key(User, user_id))
+        if user is not None:
+            user.__dict__.pop('_role_names', None)
@@ -0,0 +1,241 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.models import (Game, Location, Character, Team, TeamLocationAssignment,
+                        VersionChange)
+
+# Content / progress versions.
+#
+# Game.content_version changes whenever anything a player downloads about the
+# game changes (locations, characters, branding, geofences, routes, ...).
+# Team.progress_version changes whenever the team's assignments or per-team
+# state change. Both are bumped with a single UPDATE ... SET v = v + 1 so that
+# concurrent workers never lose an increment, and they drive the ETags of the
+# polling endpoints.
+#
+# ORM writes are picked up automatically by the flush listener below, which
+# also records one VersionChange row per touched item so that clients holding
+# an older version can be sent a delta. Bulk query.update()/query.delete()
+# calls bypass the ORM and must call bump_versions() themselves; they leave a
+# gap in the change log, which makes changes_since() fall back to a full
+# bundle for that range.
+
+_GAME_IGNORED_ATTRS = {'content_version'}
+_TEAM_IGNORED_ATTRS = {'progress_version'}
+
+
+def _modified_attrs(obj):
+    state = inspect(obj)
+    return {
+        attr.key for attr in state.attrs
+        if attr.history.has_changes()
+    }
+
+
+def collect_version_changes(session):
+    """Return (game_ids, team_ids, changes) touched by the pending flush.
+
+    changes is a list of (scope, scope_id, kind, item_id, op) tuples.
+    """
+    game_ids = set()
+    team_ids = set()
+    changes = []
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        is_dirty = obj in session.dirty
+        op = 'delete' if obj in session.deleted else 'upsert'
+
+        if isinstance(obj, (Location, Character)):
+            if is_dirty and not session.is_modified(obj):
+                continue
+            game_id = obj.game_id if obj.game_id is not None else getattr(obj.game, 'id', None)
+            if game_id is not None:
+                game_ids.add(game_id)
+                kind = 'location' if isinstance(obj, Location) else 'character'
+                changes.append(('game', game_id, kind, obj.id, op))
+
+        elif isinstance(obj, Game):
+            if obj in session.new:
+                continue
+            if is_dirty and not (_modified_attrs(obj) - _GAME_IGNORED_ATTRS):
+                continue
+            if obj.id is not None:
+                game_ids.add(obj.id)
+                changes.append(('game', obj.id, 'game', obj.id, op))
+
+        elif isinstance(obj, TeamLocationAssignment):
+            if is_dirty and not session.is_modified(obj):
+                continue
+            team_id = obj.team_id if obj.team_id is not None else getattr(obj.team, 'id', None)
+            if team_id is not None:
+                team_ids.add(team_id)
+                # Bundles key assignments by location, so that is the item id.
+                changes.append(('team', team_id, 'assignment', obj.location_id, op))
+
+        elif isinstance(obj, Team):
+            if obj in session.new:
+                continue
+            if is_dirty and not (_modified_attrs(obj) - _TEAM_IGNORED_ATTRS):
+                continue
+            if obj.id is not None:
+                team_ids.add(obj.id)
+                changes.append(('team', obj.id, 'team', obj.id, op))
+
+    return game_ids, team_ids, changes
+
+
+def _record_changes(session, changes):
+    conn = session.connection()
+    game_ids = {scope_id for scope, scope_id, *_ in changes if scope == 'game'}
+    team_ids = {scope_id for scope, scope_id, *_ in changes if scope == 'team'}
+
+    current = {}
+    if game_ids:
+        table = Game.__table__
+        for row in conn.execute(table.select().with_only_columns(table.c.id, table.c.content_version)
+                                .where(table.c.id.in_(game_ids))):
+            current[('game', row.id)] = row.content_version
+    if team_ids:
+        table = Team.__table__
+        for row in conn.execute(table.select().with_only_columns(table.c.id, table.c.progress_version)
+                                .where(table.c.id.in_(team_ids))):
+            current[('team', row.id)] = row.progress_version
+
+    now = datetime.utcnow()
+    rows = []
+    seen = set()
+    for scope, scope_id, kind, item_id, op in changes:
+        version = current.get((scope, scope_id))
+        if version is None or (scope, scope_id, kind, item_id) in seen:
+            continue
+        seen.add((scope, scope_id, kind, item_id))
+        rows.append({
+            'scope': scope,
+            'scope_id': scope_id,
+            'version': version,
+            'kind': kind,
+            'item_id': item_id,
+            'op': op,
+            'created_at': now,
+        })
+
+    if rows:
+        conn.execute(VersionChange.__table__.insert(), rows)
+
+
+def changes_since(session, scope, scope_id, since, current):
+    """Return {(kind, item_id): op} for versions in (since, current].
+
+    Returns None when the log cannot describe the whole range (a bulk write
+    skipped it, or it was pruned); callers must then send a full bundle.
+    """
+    if since == current:
+        return {}
+    if since is None or since < 1 or since > current:
+        return None
+
+    rows = (
+        session.query(VersionChange.version, VersionChange.kind, VersionChange.item_id, VersionChange.op)
+        .filter(
+            VersionChange.scope == scope,
+            VersionChange.scope_id == scope_id,
+            VersionChange.version > since,
+            VersionChange.version <= current,
+        )
+        .order_by(VersionChange.version, VersionChange.id)
+        .all()
+    )
+
+    if {row.version for row in rows} != set(range(since + 1, current + 1)):
+        return None
+
+    latest = {}
+    for row in rows:
+        latest[(row.kind, row.item_id)] = row.op
+    return latest
+
+
+def purge_version_changes(max_age_seconds, session=None):
+    """Delete change-log rows older than max_age_seconds; returns the count."""
+    from app import db
+
+    session = session or db.session
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age_seconds)
+    deleted = (
+        session.query(VersionChange)
+        .filter(VersionChange.created_at < cutoff)
+        .delete(synchronize_session=False)
+    )
+    session.commit()
+    return deleted
+
+
+def bump_versions(session, game_ids=(), team_ids=(), game_teams=()):
+    """
+    Atomically increment versions.
+    game_ids:   games whose content changed
+    team_ids:   teams whose progress changed
+    game_teams: games for which *every* team's progress changed (bulk resets)
+    """
+    conn = session.connection()
+    game_ids = sorted(set(game_ids))
+    team_ids = sorted(set(team_ids))
+    game_teams = sorted(set(game_teams))
+
+    if game_ids:
+        conn.execute(
+            Game.__table__.update()
+            .where(Game.__table__.c.id.in_(game_ids))
+            .values(content_version=Game.__table__.c.content_version + 1)
+        )
+    if team_ids:
+        conn.execute(
+            Team.__table__.update()
+            .where(Team.__table__.c.id.in_(team_ids))
+            .values(progress_version=Team.__table__.c.progress_version + 1)
+        )
+    if game_teams:
+        conn.execute(
+            Team.__table__.update()
+            .where(Team.__table__.c.game_id.in_(game_teams))
+            .values(progress_version=Team.__table__.c.progress_version + 1)
+        )
+
+    pending = session.info.setdefault('expire_versions', set())
+    pending.update(('game', game_id) for game_id in game_ids)
+    pending.update(('team', team_id) for team_id in team_ids)
+    pending.update(('game_teams', game_id) for game_id in game_teams)
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_versions_after_flush(session, flush_context):
+    game_ids, team_ids, changes = collect_version_changes(session)
+    if game_ids or team_ids:
+        bump_versions(session, game_ids=game_ids, team_ids=team_ids)
+        _record_changes(session, changes)
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _expire_bumped_versions(session, flush_context):
+    _expire_pending_versions(session)
+
+
+def _expire_pending_versions(session):
+    pending = session.info.pop('expire_versions', None)
+    if not pending:
+        return
+
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Game) and ('game', obj.id) in pending:
+            session.expire(obj, ['content_version'])
+        elif isinstance(obj, Team) and (
+            ('team', obj.id) in pending or ('game_teams', obj.game_id) in pending
+        ):
+            session.expire(obj, ['progress_version'])
+
+
+def expire_bumped_versions(session):
+    """Expire in-memory version attributes after a manual bump_versions() call."""
+    _expire_pending_versions(session)
@@ -0,0 +1,72 @@
+"""Add location spatial index
+
+Revision ID: 3f9c2a7d41b0
+Revises: 68048eaa09eb
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2a7d41b0'
+down_revision = '68048eaa09eb'
+branch_labels = None
+depends_on = None
+
+# Literal copy of the DDL at the time of this revision (app.main.spatial
+# keeps its own for create_all databases); do not import app code here.
+RTREE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS location_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)",
+    """
+    CREATE TRIGGER IF NOT EXISTS location_rtree_ai AFTER INSERT ON location
+    WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+    BEGIN
+        INSERT OR REPLACE INTO location_rtree VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS location_rtree_au AFTER UPDATE OF id, latitude, longitude ON location
+    BEGIN
+        DELETE FROM location_rtree WHERE id = OLD.id;
+        INSERT INTO location_rtree
+            SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+            WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS location_rtree_ad AFTER DELETE ON location
+    BEGIN
+        DELETE FROM location_rtree WHERE id = OLD.id;
+    END
+    """,
+    """
+    INSERT INTO location_rtree
+        SELECT id, latitude, latitude, longitude, longitude FROM location
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+          AND id NOT IN (SELECT id FROM location_rtree)
+    """,
+]
+
+
+def upgrade():
+    with op.batch_alter_table('location', schema=None) as batch_op:
+        batch_op.create_index('ix_location_game_lat_lon', ['game_id', 'latitude', 'longitude'], unique=False)
+
+    # SQLite only: R*Tree mirror of location coordinates, kept in sync by triggers.
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        for statement in RTREE_DDL:
+            op.execute(statement)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        for suffix in ('ai', 'au', 'ad'):
+            op.execute(f'DROP TRIGGER IF EXISTS location_rtree_{suffix}')
+        op.execute('DROP TABLE IF EXISTS location_rtree')
+
+    with op.batch_alter_table('location', schema=None) as batch_op:
+        batch_op.drop_index('ix_location_game_lat_lon')
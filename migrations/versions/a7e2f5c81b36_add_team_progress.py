@@ -0,0 +1,77 @@
+"""Add denormalized team progress table
+
+Revision ID: a7e2f5c81b36
+Revises: f1c6b8a2d940
+Create Date: 2026-10-18 15:21:09.774520
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7e2f5c81b36'
+down_revision = 'f1c6b8a2d940'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    team_progress = op.create_table('team_progress',
+    sa.Column('team_id', sa.Integer(), nullable=False),
+    sa.Column('game_id', sa.Integer(), nullable=False),
+    sa.Column('found_count', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('next_order_index', sa.Integer(), nullable=True),
+    sa.Column('next_location_id', sa.Integer(), nullable=True),
+    sa.Column('last_found_at', sa.DateTime(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['game_id'], ['game.id'], ),
+    sa.ForeignKeyConstraint(['next_location_id'], ['location.id'], ),
+    sa.ForeignKeyConstraint(['team_id'], ['team.id'], ),
+    sa.PrimaryKeyConstraint('team_id')
+    )
+    with op.batch_alter_table('team_progress', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_team_progress_game_id'), ['game_id'], unique=False)
+
+    # Backfill one row per existing team from its assignments.
+    conn = op.get_bind()
+    now = datetime.utcnow()
+    rows = {
+        team_id: {
+            'team_id': team_id, 'game_id': game_id, 'found_count': 0, 'total': 0,
+            'next_order_index': None, 'next_location_id': None,
+            'last_found_at': None, 'completed_at': None, 'updated_at': now,
+        }
+        for team_id, game_id in conn.execute(sa.text("SELECT id, game_id FROM team"))
+    }
+    for team_id, location_id, order_index, found, timestamp_found in conn.execute(sa.text(
+        "SELECT team_id, location_id, order_index, found, timestamp_found "
+        "FROM team_location_assignment ORDER BY team_id, order_index, id"
+    )):
+        row = rows.get(team_id)
+        if row is None:
+            continue
+        row['total'] += 1
+        if found:
+            row['found_count'] += 1
+            if timestamp_found and (row['last_found_at'] is None or timestamp_found > row['last_found_at']):
+                row['last_found_at'] = timestamp_found
+        elif row['next_location_id'] is None:
+            row['next_order_index'] = order_index
+            row['next_location_id'] = location_id
+    for row in rows.values():
+        if row['total'] and row['found_count'] >= row['total']:
+            row['completed_at'] = row['last_found_at'] or now
+    if rows:
+        op.bulk_insert(team_progress, list(rows.values()))
+
+
+def downgrade():
+    with op.batch_alter_table('team_progress', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_team_progress_game_id'))
+
+    op.drop_table('team_progress')
@@ -0,0 +1,35 @@
+"""Add tombstone table
+
+Revision ID: a81d5e0c9f32
+Revises: 3f9c2a7d41b0
+Create Date: 2026-10-18 10:03:11.402775
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a81d5e0c9f32'
+down_revision = '3f9c2a7d41b0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('tombstone',
+    sa.Column('key', sa.String(length=200), nullable=False),
+    sa.Column('kind', sa.String(length=40), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    with op.batch_alter_table('tombstone', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_tombstone_expires_at'), ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('tombstone', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_tombstone_expires_at'))
+
+    op.drop_table('tombstone')
@@ -0,0 +1,102 @@
+"""Move team geofence state into per-fence rows
+
+Revision ID: b3d8e1f0a4c7
+Revises: a7e2f5c81b36
+Create Date: 2026-10-18 19:02:44.118305
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3d8e1f0a4c7'
+down_revision = 'a7e2f5c81b36'
+branch_labels = None
+depends_on = None
+
+
+def _location_id(*entries):
+    for entry in entries:
+        if entry and entry.get('location_id') is not None:
+            try:
+                return int(entry['location_id'])
+            except (TypeError, ValueError):
+                continue
+    return None
+
+
+def upgrade():
+    with op.batch_alter_table('team', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('geofence_version', sa.Integer(), server_default='0', nullable=False))
+
+    team_geofence_state = op.create_table('team_geofence_state',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('team_id', sa.Integer(), nullable=False),
+    sa.Column('fence_id', sa.String(length=120), nullable=False),
+    sa.Column('location_id', sa.Integer(), nullable=True),
+    sa.Column('state', sa.JSON(none_as_null=True), nullable=True),
+    sa.Column('runtime', sa.JSON(none_as_null=True), nullable=True),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['team_id'], ['team.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('team_id', 'fence_id', name='_team_fence_uc')
+    )
+    with op.batch_alter_table('team_geofence_state', schema=None) as batch_op:
+        batch_op.create_index('ix_team_geofence_state_team_version', ['team_id', 'version'], unique=False)
+
+    # Move Team.data['geofence_state'] / ['geofence_runtime'] into rows at version 1.
+    team = sa.table('team', sa.column('id', sa.Integer), sa.column('data', sa.JSON),
+                    sa.column('geofence_version', sa.Integer))
+    conn = op.get_bind()
+    now = datetime.utcnow()
+    rows = []
+    for team_id, data in conn.execute(sa.select(team.c.id, team.c.data)).all():
+        if not isinstance(data, dict) or not ('geofence_state' in data or 'geofence_runtime' in data):
+            continue
+        state = {k: v for k, v in (data.get('geofence_state') or {}).items() if isinstance(v, dict)}
+        runtime = {k: v for k, v in (data.get('geofence_runtime') or {}).items() if isinstance(v, dict)}
+        for fence_id in sorted(set(state) | set(runtime)):
+            rows.append({
+                'team_id': team_id, 'fence_id': str(fence_id)[:120],
+                'location_id': _location_id(runtime.get(fence_id), state.get(fence_id)),
+                'state': state.get(fence_id), 'runtime': runtime.get(fence_id),
+                'version': 1, 'updated_at': now,
+            })
+        remaining = {k: v for k, v in data.items() if k not in ('geofence_state', 'geofence_runtime')}
+        conn.execute(team.update().where(team.c.id == team_id).values(
+            data=remaining, geofence_version=1 if (state or runtime) else 0,
+        ))
+    if rows:
+        op.bulk_insert(team_geofence_state, rows)
+
+
+def downgrade():
+    # Fold the rows back into Team.data.
+    team = sa.table('team', sa.column('id', sa.Integer), sa.column('data', sa.JSON))
+    states = sa.table('team_geofence_state', sa.column('team_id', sa.Integer), sa.column('fence_id', sa.String),
+                      sa.column('state', sa.JSON), sa.column('runtime', sa.JSON))
+    conn = op.get_bind()
+    tracking = {}
+    for team_id, fence_id, state, runtime in conn.execute(
+        sa.select(states.c.team_id, states.c.fence_id, states.c.state, states.c.runtime)
+    ).all():
+        entry = tracking.setdefault(team_id, {'geofence_state': {}, 'geofence_runtime': {}})
+        if state is not None:
+            entry['geofence_state'][fence_id] = state
+        if runtime is not None:
+            entry['geofence_runtime'][fence_id] = runtime
+    for team_id, data in conn.execute(sa.select(team.c.id, team.c.data).where(team.c.id.in_(list(tracking)))).all():
+        conn.execute(team.update().where(team.c.id == team_id).values(
+            data={**(data if isinstance(data, dict) else {}), **tracking[team_id]},
+        ))
+
+    with op.batch_alter_table('team_geofence_state', schema=None) as batch_op:
+        batch_op.drop_index('ix_team_geofence_state_team_version')
+
+    op.drop_table('team_geofence_state')
+    with op.batch_alter_table('team', schema=None) as batch_op:
+        batch_op.drop_column('geofence_version')
@@ -0,0 +1,32 @@
+"""Add game content_version and team progress_version
+
+Revision ID: c5d7e2b94a16
+Revises: a81d5e0c9f32
+Create Date: 2026-10-18 11:20:47.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d7e2b94a16'
+down_revision = 'a81d5e0c9f32'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_version', sa.Integer(), server_default='1', nullable=False))
+
+    with op.batch_alter_table('team', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('progress_version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('team', schema=None) as batch_op:
+        batch_op.drop_column('progress_version')
+
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.drop_column('content_version')
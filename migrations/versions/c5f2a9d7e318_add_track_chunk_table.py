@@ -0,0 +1,42 @@
+"""Add track_chunk table for team GPS tracks
+
+Revision ID: c5f2a9d7e318
+Revises: b3d8e1f0a4c7
+Create Date: 2026-10-18 20:41:07.530912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5f2a9d7e318'
+down_revision = 'b3d8e1f0a4c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'track_chunk',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('team_id', sa.Integer(), nullable=False),
+        sa.Column('game_id', sa.Integer(), nullable=False),
+        sa.Column('start_ms', sa.BigInteger(), nullable=False),
+        sa.Column('end_ms', sa.BigInteger(), nullable=False),
+        sa.Column('point_count', sa.Integer(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['game_id'], ['game.id'], ),
+        sa.ForeignKeyConstraint(['team_id'], ['team.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('track_chunk', schema=None) as batch_op:
+        batch_op.create_index('ix_track_chunk_team_start', ['team_id', 'start_ms'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('track_chunk', schema=None) as batch_op:
+        batch_op.drop_index('ix_track_chunk_team_start')
+
+    op.drop_table('track_chunk')
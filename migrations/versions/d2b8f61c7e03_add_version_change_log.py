@@ -0,0 +1,41 @@
+"""Add version change log for delta bundles
+
+Revision ID: d2b8f61c7e03
+Revises: c5d7e2b94a16
+Create Date: 2026-10-18 12:41:05.630912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2b8f61c7e03'
+down_revision = 'c5d7e2b94a16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('version_change',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('scope', sa.String(length=10), nullable=False),
+    sa.Column('scope_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=True),
+    sa.Column('op', sa.String(length=10), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('version_change', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_version_change_created_at'), ['created_at'], unique=False)
+        batch_op.create_index('ix_version_change_scope_version', ['scope', 'scope_id', 'version'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('version_change', schema=None) as batch_op:
+        batch_op.drop_index('ix_version_change_scope_version')
+        batch_op.drop_index(batch_op.f('ix_version_change_created_at'))
+
+    op.drop_table('version_change')
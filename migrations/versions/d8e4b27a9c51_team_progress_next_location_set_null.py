@@ -0,0 +1,44 @@
+"""Null team_progress.next_location_id when its location is deleted
+
+Revision ID: d8e4b27a9c51
+Revises: c5f2a9d7e318
+Create Date: 2026-10-18 22:14:36.208417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8e4b27a9c51'
+down_revision = 'c5f2a9d7e318'
+branch_labels = None
+depends_on = None
+
+FK_NAME = 'fk_team_progress_next_location_id_location'
+# SQLite reports unnamed constraints without a name; batch mode then finds
+# them by this convention when it recreates the table.
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def _current_fk_name():
+    for fk in sa.inspect(op.get_bind()).get_foreign_keys('team_progress'):
+        if fk['constrained_columns'] == ['next_location_id']:
+            return fk['name'] or FK_NAME
+    return None
+
+
+def _replace_fk(ondelete):
+    name = _current_fk_name()
+    with op.batch_alter_table('team_progress', schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+        if name:
+            batch_op.drop_constraint(name, type_='foreignkey')
+        batch_op.create_foreign_key(FK_NAME, 'location', ['next_location_id'], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    _replace_fk('SET NULL')
+
+
+def downgrade():
+    _replace_fk(None)
@@ -0,0 +1,63 @@
+"""Add indexed QR token table
+
+Revision ID: e4a9c3d7b215
+Revises: d2b8f61c7e03
+Create Date: 2026-10-18 14:02:37.418261
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a9c3d7b215'
+down_revision = 'd2b8f61c7e03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    qr_token = op.create_table('qr_token',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('token', sa.String(length=64), nullable=False),
+    sa.Column('game_id', sa.Integer(), nullable=False),
+    sa.Column('location_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['game_id'], ['game.id'], ),
+    sa.ForeignKeyConstraint(['location_id'], ['location.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('game_id', 'location_id', name='_qr_game_location_uc')
+    )
+    with op.batch_alter_table('qr_token', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_qr_token_token'), ['token'], unique=True)
+
+    # Backfill from the tokens already stored in game.data['qr']['tokens'].
+    conn = op.get_bind()
+    location_ids = {row[0] for row in conn.execute(sa.text("SELECT id FROM location"))}
+    rows, seen = [], set()
+    for game_id, data in conn.execute(sa.text("SELECT id, data FROM game")):
+        if isinstance(data, str):
+            try:
+                data = json.loads(data)
+            except ValueError:
+                continue
+        tokens = ((data or {}).get('qr') or {}).get('tokens') or {}
+        for location_id, token in tokens.items():
+            try:
+                location_id = int(location_id)
+            except (TypeError, ValueError):
+                continue
+            if not token or token in seen or location_id not in location_ids:
+                continue
+            seen.add(token)
+            rows.append({'token': token, 'game_id': game_id, 'location_id': location_id})
+    if rows:
+        op.bulk_insert(qr_token, rows)
+
+
+def downgrade():
+    with op.batch_alter_table('qr_token', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_qr_token_token'))
+
+    op.drop_table('qr_token')
@@ -0,0 +1,30 @@
+"""Add composite indexes on team_location_assignment
+
+Revision ID: f1c6b8a2d940
+Revises: e4a9c3d7b215
+Create Date: 2026-10-18 14:37:52.106384
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c6b8a2d940'
+down_revision = 'e4a9c3d7b215'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('team_location_assignment', schema=None) as batch_op:
+        batch_op.create_index('ix_tla_team_game_order', ['team_id', 'game_id', 'order_index'], unique=False)
+        batch_op.create_index('ix_tla_team_game_found', ['team_id', 'game_id', 'found', 'order_index'], unique=False)
+        batch_op.create_index('ix_tla_game_team', ['game_id', 'team_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('team_location_assignment', schema=None) as batch_op:
+        batch_op.drop_index('ix_tla_game_team')
+        batch_op.drop_index('ix_tla_team_game_found')
+        batch_op.drop_index('ix_tla_team_game_order')
@@ -21,6 +21,7 @@ const APP_SHELL_FILES = [
   '/static/js/offline-game.js',
   '/static/js/offline-db.js',
   '/static/js/offline-play.js',
+  '/static/js/offline-sync-batch.js',
   '/static/js/offline-sync-page.js',
   '/static/js/offline-sync-sw.js',
   '/static/js/map-play.js',
@@ -56,7 +57,8 @@ const APP_SHELL_FILES = [
 
 const TILE_URL_REGEX = /^https:\/\/tile\.openstreetmap\.org\/(\d+)\/(\d+)\/(\d+)\.png$/;
 importScripts('/static/js/offline-db.js');
-importScripts('/static/js/offline-sync-sw.js'); // must be self-contained
+importScripts('/static/js/offline-sync-batch.js');
+importScripts('/static/js/offline-sync-sw.js'); // needs only the two scripts above
 
 const offlineDB = self.offlineDB;
 
@@ -0,0 +1,211 @@
+import hashlib
+import io
+import json
+import os
+import uuid
+import zipfile
+
+import pytest
+
+from app import db as _db
+from app.models import Game, Location, Team, TeamLocationAssignment, TeamMembership, User
+
+
+def _login_existing_user(client, email, display_name):
+    return client.post(
+        '/register_or_login',
+        data={'email': email, 'display_name': display_name},
+        follow_redirects=False,
+    )
+
+
+@pytest.fixture
+def pack_dir(app, client, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'ASSET_PACK_DIR', str(tmp_path))
+    yield tmp_path
+    # The session-wide app context shares flask.g between clients; do not leak the login.
+    client.get('/logout')
+
+
+def _create_pack_game(user_id):
+    game = Game(
+        name=f"asset-pack-{uuid.uuid4().hex[:8]}",
+        min_lat=44.0, max_lat=44.01, min_lon=-88.0, max_lon=-87.99,
+        data={'branding': {'icon_url': 'icons/grd_128a.png'}, 'offline_zooms': [14]},
+    )
+    _db.session.add(game)
+    _db.session.flush()
+
+    with_image = Location(game_id=game.id, name='Llama', latitude=44.001, longitude=-87.999,
+                          clue_text='Find the llama', image_url='kconline/llama1.jpg')
+    missing_image = Location(game_id=game.id, name='Ghost', latitude=44.002, longitude=-87.998,
+                             clue_text='Nothing here', image_url='kconline/does-not-exist.jpg')
+    team = Team(name='Pack Team', game_id=game.id)
+    _db.session.add_all([with_image, missing_image, team])
+    _db.session.flush()
+
+    _db.session.add(TeamMembership(user_id=user_id, team_id=team.id, role='captain'))
+    _db.session.add_all([
+        TeamLocationAssignment(team_id=team.id, location_id=with_image.id, game_id=game.id, order_index=0),
+        TeamLocationAssignment(team_id=team.id, location_id=missing_image.id, game_id=game.id, order_index=1),
+    ])
+    _db.session.commit()
+    return game.id, with_image.id
+
+
+def test_asset_pack_contains_bundle_images_and_manifest(app, client, regular_user_id, pack_dir):
+    with app.app_context():
+        game_id, _ = _create_pack_game(regular_user_id)
+
+    _login_existing_user(client, 'user@test.com', 'Test User')
+    rv = client.get(f'/api/game/{game_id}/asset_pack')
+    assert rv.status_code == 200
+    assert rv.mimetype == 'application/zip'
+
+    with zipfile.ZipFile(io.BytesIO(rv.data)) as zf:
+        names = set(zf.namelist())
+        assert {'bundle.json', 'manifest.json', 'static/images/kconline/llama1.jpg',
+                'static/icons/grd_128a.png'} <= names
+        assert not any('does-not-exist' in name for name in names)
+
+        manifest = json.loads(zf.read('manifest.json'))
+        assert manifest['game_id'] == game_id
+        for entry in manifest['files']:
+            assert hashlib.sha256(zf.read(entry['path'])).hexdigest() == entry['sha256']
+
+        bundle = json.loads(zf.read('bundle.json'))
+        assert bundle['version']['token'] == manifest['version']['token']
+
+    rv = client.get(f'/api/game/{game_id}/asset_pack/manifest')
+    assert rv.get_json()['pack']['size'] == len(client.get(f'/api/game/{game_id}/asset_pack').data)
+
+
+def test_asset_pack_supports_range_and_is_cached_per_content_version(app, client, regular_user_id, pack_dir):
+    with app.app_context():
+        game_id, location_id = _create_pack_game(regular_user_id)
+
+    _login_existing_user(client, 'user@test.com', 'Test User')
+    url = f'/api/game/{game_id}/asset_pack'
+    full = client.get(url)
+    etag = full.headers['ETag']
+    packs = os.listdir(pack_dir)
+    assert len(packs) == 1
+    mtime = os.path.getmtime(pack_dir / packs[0])
+
+    # Resume an interrupted download.
+    rv = client.get(url, headers={'Range': 'bytes=100-', 'If-Range': etag})
+    assert rv.status_code == 206
+    assert rv.data == full.data[100:]
+
+    # Same content version: served from disk without rebuilding.
+    client.get(url)
+    assert os.path.getmtime(pack_dir / packs[0]) == mtime
+
+    # A content change produces a new pack and removes the stale one.
+    with app.app_context():
+        _db.session.get(Location, location_id).clue_text = 'Find the other llama'
+        _db.session.commit()
+
+    rv = client.get(url, headers={'Range': 'bytes=100-', 'If-Range': etag})
+    assert rv.status_code == 200
+    assert rv.headers['ETag'] != etag
+    assert os.listdir(pack_dir) != packs
+    assert len(os.listdir(pack_dir)) == 1
+
+
+def test_asset_pack_requires_membership_and_tile_proxy(app, client, regular_user_id, pack_dir):
+    with app.app_context():
+        game_id, _ = _create_pack_game(regular_user_id)
+
+    _login_existing_user(client, 'admin@test.com', 'Admin User')
+    assert client.get(f'/api/game/{game_id}/asset_pack').status_code == 403
+
+    _login_existing_user(client, 'user@test.com', 'Test User')
+    assert client.get(f'/api/game/{game_id}/asset_pack?tiles=1').status_code == 400
+
+
+def _join_tile_fills(app):
+    for job in list(app.extensions.get('tile_prefetch_jobs', {}).values()):
+        job.join(timeout=10)
+
+
+def test_asset_pack_with_tiles_uses_tile_store(app, client, regular_user_id, pack_dir, tmp_path, monkeypatch):
+    from app.main import utils
+    from app.tiles import store as tile_store
+
+    monkeypatch.setitem(app.config, 'TILE_PROXY_ENABLED', True)
+    monkeypatch.setitem(app.config, 'TILE_STORE_PATH', str(tmp_path / 'store' / 'tiles.mbtiles'))
+    monkeypatch.setattr(tile_store, 'fetch_upstream_tile', lambda z, x, y, app=None: f"{z}/{x}/{y}".encode())
+
+    with app.app_context():
+        game_id, _ = _create_pack_game(regular_user_id)
+
+    try:
+        _login_existing_user(client, 'user@test.com', 'Test User')
+        # A cold store is filled in the background, not inside the request.
+        rv = client.get(f'/api/game/{game_id}/asset_pack?tiles=1')
+        assert rv.status_code == 202
+        assert rv.get_json()['missing_tiles'] > 0
+        _join_tile_fills(app)
+
+        rv = client.get(f'/api/game/{game_id}/asset_pack?tiles=1')
+        assert rv.status_code == 200
+
+        with zipfile.ZipFile(io.BytesIO(rv.data)) as zf:
+            bundle = json.loads(zf.read('bundle.json'))
+            tiles = [name for name in zf.namelist() if name.startswith('tiles/')]
+            assert len(tiles) == bundle['tiles']['count'] > 0
+            z, x, y = next(utils.iter_tiles(bundle['tiles']['ranges']))
+            assert zf.read(f"tiles/{z}/{x}/{y}.png") == f"{z}/{x}/{y}".encode()
+    finally:
+        store = app.extensions.pop('tile_store', None)
+        if store is not None:
+            store.close()
+
+
+def test_asset_pack_tile_fill_is_per_team(app, client, regular_user_id, pack_dir, tmp_path, monkeypatch):
+    from app.main import utils
+    from app.tiles import store as tile_store
+
+    monkeypatch.setitem(app.config, 'TILE_PROXY_ENABLED', True)
+    monkeypatch.setitem(app.config, 'TILE_STORE_PATH', str(tmp_path / 'store' / 'tiles.mbtiles'))
+    monkeypatch.setattr(tile_store, 'fetch_upstream_tile', lambda z, x, y, app=None: f"{z}/{x}/{y}".encode())
+
+    with app.app_context():
+        game_id, _ = _create_pack_game(regular_user_id)
+        # A second team whose route lies well away from the first team's tiles.
+        far = Location(game_id=game_id, name='Far', latitude=44.2, longitude=-87.7, clue_text='Far away')
+        team = Team(name='Far Team', game_id=game_id)
+        other = User(email=f'pack-{uuid.uuid4().hex[:8]}@test.com', display_name='Far Player')
+        _db.session.add_all([far, team, other])
+        _db.session.flush()
+        other_email = other.email
+        _db.session.add(TeamMembership(user_id=other.id, team_id=team.id, role='captain'))
+        _db.session.add(TeamLocationAssignment(team_id=team.id, location_id=far.id, game_id=game_id, order_index=0))
+        _db.session.commit()
+
+    url = f'/api/game/{game_id}/asset_pack?tiles=1'
+    try:
+        _login_existing_user(client, 'user@test.com', 'Test User')
+        assert client.get(url).status_code == 202
+        _join_tile_fills(app)
+        assert client.get(url).status_code == 200
+
+        # The first team's fill does not cover the second team's corridor.
+        _login_existing_user(client, other_email, 'Far Player')
+        rv = client.get(url)
+        assert rv.status_code == 202
+        assert rv.get_json()['missing_tiles'] > 0
+        _join_tile_fills(app)
+
+        rv = client.get(url)
+        assert rv.status_code == 200
+        with zipfile.ZipFile(io.BytesIO(rv.data)) as zf:
+            bundle = json.loads(zf.read('bundle.json'))
+            tiles = {name for name in zf.namelist() if name.startswith('tiles/')}
+            assert tiles == {f"tiles/{z}/{x}/{y}.png" for z, x, y in utils.iter_tiles(bundle['tiles']['ranges'])}
+            assert len(tiles) == bundle['tiles']['count'] > 0
+    finally:
+        store = app.extensions.pop('tile_store', None)
+        if store is not None:
+            store.close()
@@ -0,0 +1,147 @@
+import random
+import uuid
+
+from sqlalchemy import event
+
+from app import db
+from app.models import Game, GameType, Location, Team, TeamLocationAssignment, TeamProgress
+
+
+def _create_game(team_count, location_count, data=None):
+    gametype = GameType.query.filter_by(name='findloc').first()
+    game = Game(name=f'assign-{uuid.uuid4().hex[:8]}', gametype=gametype, discoverable='public', mode='open')
+    db.session.add(game)
+    db.session.flush()
+
+    location_ids = []
+    for index in range(location_count):
+        location = Location(game_id=game.id, name=f'A{index}', latitude=44.0, longitude=-88.0)
+        db.session.add(location)
+        db.session.flush()
+        location_ids.append(location.id)
+
+    team_ids = []
+    for index in range(team_count):
+        team = Team(name=f'assign-team-{index}-{uuid.uuid4().hex[:6]}', game_id=game.id)
+        db.session.add(team)
+        db.session.flush()
+        team_ids.append(team.id)
+
+    game.data = dict(data(location_ids) if callable(data) else (data or {}))
+    db.session.commit()
+    return game.id, team_ids, location_ids
+
+
+def test_routes_mode_bulk_inserts_missing_pairs(app):
+    from app.api.routes import assign_locations_to_teams
+
+    with app.app_context():
+        game_id, team_ids, location_ids = _create_game(
+            3, 4, data=lambda ids: {'routes': [ids[:3], list(reversed(ids[1:]))]}
+        )
+        # One pair already exists and must be skipped.
+        db.session.add(TeamLocationAssignment(team_id=team_ids[0], location_id=location_ids[0],
+                                              game_id=game_id, order_index=0))
+        db.session.commit()
+
+        inserts = []
+
+        def _before_execute(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('INSERT INTO TEAM_LOCATION_ASSIGNMENT'):
+                inserts.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', _before_execute)
+        try:
+            report = assign_locations_to_teams(game_id)
+            db.session.commit()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', _before_execute)
+
+        assert report['mode'] == 'routes'
+        assert report['teams'] == 3
+        assert report['created'] == 8
+        assert report['skipped'] == 1
+        assert report['elapsed_ms'] >= 0
+        assert len(inserts) == 1
+
+        # Teams cycle through the routes in order.
+        third_route = [
+            a.location_id for a in TeamLocationAssignment.query
+            .filter_by(team_id=team_ids[2], game_id=game_id)
+            .order_by(TeamLocationAssignment.order_index)
+        ]
+        assert third_route == location_ids[:3]
+        assert db.session.get(TeamProgress, team_ids[1]).total == 3
+
+        again = assign_locations_to_teams(game_id)
+        assert (again['created'], again['skipped']) == (0, 9)
+
+
+def test_shuffled_mode_samples_per_team(app):
+    from app.api.routes import assign_locations_to_teams
+
+    with app.app_context():
+        game_id, team_ids, location_ids = _create_game(4, 6, data={'num_locations_per_team': 3})
+
+        report = assign_locations_to_teams(game_id, rng=random.Random(7))
+        db.session.commit()
+
+        assert report['mode'] == 'shuffled'
+        assert report['created'] == 12
+        for team_id in team_ids:
+            rows = TeamLocationAssignment.query.filter_by(team_id=team_id).all()
+            assert len(rows) == 3
+            assert {row.location_id for row in rows} <= set(location_ids)
+            assert sorted(row.order_index for row in rows) == [0, 1, 2]
+
+
+def _assign_and_find(game_id, team_ids, found_per_team):
+    from datetime import datetime
+    from app.api.routes import assign_locations_to_teams
+
+    assign_locations_to_teams(game_id)
+    db.session.commit()
+    for team_id in team_ids:
+        rows = (TeamLocationAssignment.query.filter_by(team_id=team_id)
+                .order_by(TeamLocationAssignment.order_index).limit(found_per_team).all())
+        for row in rows:
+            row.found = True
+            row.timestamp_found = datetime.utcnow()
+    db.session.commit()
+
+
+def test_resets_are_set_based_and_refresh_progress(app, client):
+    with app.app_context():
+        game_id, team_ids, location_ids = _create_game(2, 3, data=lambda ids: {'routes': [ids]})
+        _assign_and_find(game_id, team_ids, found_per_team=2)
+        versions_before = {t.id: t.progress_version for t in Team.query.filter(Team.id.in_(team_ids))}
+
+    client.post('/register_or_login', data={'email': 'admin@test.com', 'display_name': 'Admin User'})
+    try:
+        team_response = client.post(f'/api/team/{team_ids[0]}/reset_locations')
+        assert team_response.status_code == 200
+        assert team_response.get_json()['reset_assignments'] == 2
+
+        with app.app_context():
+            assert db.session.get(TeamProgress, team_ids[0]).found_count == 0
+            assert db.session.get(TeamProgress, team_ids[1]).found_count == 2
+
+        game_response = client.post(f'/api/game/{game_id}/reset_locations')
+        assert game_response.get_json()['reset_assignments'] == 2
+
+        with app.app_context():
+            # Objects already in the session see the bulk UPDATE.
+            rows = TeamLocationAssignment.query.filter_by(game_id=game_id).all()
+            assert rows and not any(row.found or row.timestamp_found for row in rows)
+            assert db.session.get(TeamProgress, team_ids[1]).found_count == 0
+            for team in Team.query.filter(Team.id.in_(team_ids)):
+                assert team.progress_version > versions_before[team.id]
+
+        clear_response = client.post(f'/api/game/{game_id}/clear_assignments')
+        assert clear_response.get_json()['deleted_assignments'] == 6
+
+        with app.app_context():
+            assert TeamLocationAssignment.query.filter_by(game_id=game_id).count() == 0
+            assert db.session.get(TeamProgress, team_ids[0]).total == 0
+    finally:
+        client.get('/logout', follow_redirects=False)
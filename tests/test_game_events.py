@@ -0,0 +1,161 @@
+import uuid
+from datetime import datetime
+
+from app import db
+from app.events import RESYNC, EventBroker, event_stream, get_event_broker, queue_game_event
+from app.models import Game, GameType, Location, Team, TeamLocationAssignment
+
+
+def _create_team():
+    gametype = GameType.query.filter_by(name='findloc').first()
+    if not gametype:
+        gametype = GameType(name='findloc')
+        db.session.add(gametype)
+
+    game = Game(name=f'events-{uuid.uuid4().hex[:8]}', gametype=gametype, discoverable='public', mode='open')
+    db.session.add(game)
+    db.session.flush()
+    team = Team(name=f'events-team-{uuid.uuid4().hex[:8]}', game_id=game.id)
+    location = Location(game_id=game.id, name='E1', latitude=44.0, longitude=-88.0)
+    db.session.add_all([team, location])
+    db.session.flush()
+    db.session.add(TeamLocationAssignment(team_id=team.id, location_id=location.id, game_id=game.id,
+                                          order_index=0, found=False))
+    db.session.commit()
+    return game.id, team.id, location.id
+
+
+def _drain(subscription):
+    items = []
+    while True:
+        item = subscription.get(timeout=0)
+        if item is None:
+            return items
+        items.append(item)
+
+
+def test_broker_fans_out_per_game_and_team():
+    broker = EventBroker()
+    everyone = broker.subscribe(1)
+    team_a = broker.subscribe(1, team_ids={10})
+    other_game = broker.subscribe(2)
+
+    broker.publish(1, 'found', {'team_id': 10})
+    broker.publish(1, 'found', {'team_id': 11})
+    broker.publish(1, 'reset', {'team_id': None})
+
+    assert [item[0] for item in _drain(everyone)] == [1, 2, 3]
+    assert [(item[0], item[1]) for item in _drain(team_a)] == [(1, 'found'), (3, 'reset')]
+    assert _drain(other_game) == []
+
+    broker.unsubscribe(everyone)
+    assert broker.subscriber_count(1) == 1
+
+
+def test_broker_replays_after_last_event_id_or_asks_for_resync():
+    broker = EventBroker(buffer_size=3)
+    for n in range(5):
+        broker.publish(1, 'found', {'team_id': 1, 'n': n})
+
+    replay = broker.subscribe(1, last_event_id=3).replay
+    assert [item[0] for item in replay] == [4, 5]
+
+    # Event 2 fell out of the three-event buffer; so did the client's future.
+    assert broker.subscribe(1, last_event_id=1).replay[0][1] == RESYNC
+    assert broker.subscribe(1, last_event_id=99).replay[0][1] == RESYNC
+    assert broker.subscribe(1, last_event_id=5).replay == []
+
+
+def test_slow_subscriber_gets_resync_instead_of_unbounded_queue():
+    broker = EventBroker(max_queue=2)
+    subscription = broker.subscribe(1)
+    for n in range(5):
+        broker.publish(1, 'found', {'team_id': 1, 'n': n})
+
+    items = _drain(subscription)
+    assert len(items) <= 2
+    assert RESYNC in [item[1] for item in items]
+
+
+def test_event_stream_emits_heartbeats_and_unsubscribes():
+    broker = EventBroker()
+    subscription = broker.subscribe(1)
+    broker.publish(1, 'found', {'team_id': 1})
+
+    ticks = iter([0, 0, 0.5, 1.5, 5])
+    chunks = list(event_stream(broker, subscription, heartbeat_s=0, max_duration_s=2,
+                               retry_ms=1000, clock=lambda: next(ticks)))
+
+    assert chunks[0] == 'retry: 1000\n\n'
+    assert chunks[1].startswith('id: 1\nevent: found\n')
+    assert chunks[2] == ': heartbeat\n\n'
+    assert broker.subscriber_count(1) == 0
+
+
+def test_found_is_published_after_commit_only(app):
+    with app.app_context():
+        game_id, team_id, location_id = _create_team()
+        subscription = get_event_broker().subscribe(game_id)
+        try:
+            assignment = TeamLocationAssignment.query.filter_by(team_id=team_id, location_id=location_id).one()
+            assignment.found = True
+            assignment.timestamp_found = datetime.utcnow()
+            db.session.flush()
+            assert _drain(subscription) == []
+            db.session.rollback()
+            assert _drain(subscription) == []
+
+            assignment = TeamLocationAssignment.query.filter_by(team_id=team_id, location_id=location_id).one()
+            assignment.found = True
+            assignment.timestamp_found = datetime.utcnow()
+            db.session.commit()
+
+            (event_id, event_type, data), = _drain(subscription)
+            assert event_type == 'found'
+            assert data['team_id'] == team_id
+            assert data['location_id'] == location_id
+            assert data['team_progress'] == {'found': 1, 'total': 1}
+
+            queue_game_event(db.session, game_id, 'override', {'team_id': team_id})
+            db.session.commit()
+            assert [item[1] for item in _drain(subscription)] == ['override']
+        finally:
+            get_event_broker().unsubscribe(subscription)
+
+
+def test_events_endpoint_streams_buffered_events(app, client):
+    with app.app_context():
+        game_id, team_id, _location_id = _create_team()
+        broker = get_event_broker()
+        first = broker.publish(game_id, 'found', {'team_id': team_id})
+        broker.publish(game_id, 'reset', {'team_id': team_id})
+
+    saved = {key: app.config.get(key) for key in ('EVENTS_HEARTBEAT_SECONDS', 'EVENTS_STREAM_MAX_SECONDS')}
+    app.config.update(EVENTS_HEARTBEAT_SECONDS=0.01, EVENTS_STREAM_MAX_SECONDS=0.05)
+    try:
+        client.post('/register_or_login', data={'email': 'admin@test.com', 'display_name': 'Admin User'})
+        response = client.get(f'/api/game/{game_id}/events', headers={'Last-Event-ID': str(first)})
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        assert response.headers['Cache-Control'] == 'no-cache'
+
+        body = response.get_data(as_text=True)
+        assert body.startswith('retry: ')
+        assert f'id: {first + 1}\nevent: reset\n' in body
+        assert 'event: found' not in body
+        assert ': heartbeat' in body
+
+        assert client.get('/api/game/999999/events').status_code == 404
+    finally:
+        app.config.update(saved)
+        client.get('/logout')
+
+
+def test_events_endpoint_requires_team_membership(app, client):
+    with app.app_context():
+        game_id, _team_id, _location_id = _create_team()
+    try:
+        client.post('/register_or_login', data={'email': 'user@test.com', 'display_name': 'Test User'})
+        assert client.get(f'/api/game/{game_id}/events').status_code == 403
+    finally:
+        client.get('/logout')
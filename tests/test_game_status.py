@@ -0,0 +1,76 @@
+import uuid
+
+from app import db
+from app.models import Game, GameType, Location, Team
+
+
+def _create_status_game(team_count=2):
+    gametype = GameType.query.filter_by(name='findloc').first()
+    game = Game(name=f'status-{uuid.uuid4().hex[:8]}', gametype=gametype, discoverable='public', mode='open')
+    db.session.add(game)
+    db.session.flush()
+    locations = []
+    for index in range(2):
+        location = Location(game_id=game.id, name=f'Stop {index}', latitude=44.0, longitude=-88.0)
+        db.session.add(location)
+        db.session.flush()
+        locations.append(location)
+    teams = []
+    for index in range(team_count):
+        team = Team(name=f'status-team-{index}', game_id=game.id,
+                    data={'selfies': {str(locations[0].id): f'selfie-{index}.jpg'}})
+        db.session.add(team)
+        teams.append(team)
+    db.session.commit()
+    return game.id, [team.id for team in teams], [location.id for location in locations]
+
+
+def test_status_snapshot_is_cached_until_versions_change(app):
+    from app.api.routes import get_game_status_data
+
+    with app.app_context():
+        game_id, team_ids, location_ids = _create_status_game()
+
+        games, total = get_game_status_data([game_id])
+        assert total == 1
+        snapshot = games[0]
+        assert snapshot['locations_map'] == {location_ids[0]: 'Stop 0', location_ids[1]: 'Stop 1'}
+        assert all('locations_map' not in team for team in snapshot['teams'])
+        assert sorted(s['filename'] for s in snapshot['all_game_selfies']) == ['selfie-0.jpg', 'selfie-1.jpg']
+
+        assert get_game_status_data([game_id])[0][0] is snapshot
+
+        team = db.session.get(Team, team_ids[0])
+        team.data = {'selfies': {str(location_ids[0]): 'a.jpg', str(location_ids[1]): 'b.jpg'}}
+        db.session.commit()
+        refreshed = get_game_status_data([game_id])[0][0]
+        assert refreshed is not snapshot
+        assert len(refreshed['all_game_selfies']) == 3
+
+        db.session.get(Location, location_ids[1]).name = 'Renamed'
+        db.session.commit()
+        assert get_game_status_data([game_id])[0][0]['locations_map'][location_ids[1]] == 'Renamed'
+
+
+def test_status_endpoints_filter_and_paginate(app, client):
+    with app.app_context():
+        first_id, _, _ = _create_status_game(team_count=1)
+        second_id, _, _ = _create_status_game(team_count=1)
+
+    client.post('/register_or_login', data={'email': 'user@test.com', 'display_name': 'Test User'})
+    try:
+        response = client.get(f'/api/game_status?games={first_id},{second_id}&limit=1')
+        assert response.status_code == 200
+        assert response.headers['X-Total-Count'] == '2'
+        payload = response.get_json()
+        assert len(payload) == 1
+
+        second_page = client.get(f'/api/game_status?games={first_id},{second_id}&limit=1&offset=1').get_json()
+        assert {payload[0]['id'], second_page[0]['id']} == {first_id, second_id}
+
+        page = client.get(f'/game_status?games={first_id}')
+        assert page.status_code == 200
+        assert f'data-game-id="{first_id}"'.encode() in page.data
+        assert f'data-game-id="{second_id}"'.encode() not in page.data
+    finally:
+        client.get('/logout', follow_redirects=False)
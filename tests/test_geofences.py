@@ -158,6 +158,51 @@ def test_game_model_normalizes_geofence_config(app):
         assert config['locations']['42'][0]['location_id'] == 42
 
 
+def test_compiled_geofences_are_immutable_and_memoized(app):
+    import pytest
+
+    with app.app_context():
+        game = Game(
+            name=_unique_name(),
+            data={
+                'geofences': {
+                    '7': [
+                        {'shape': 'circle', 'center': {'lat': 44.0, 'lon': -88.0}, 'radius_m': 30,
+                         'trigger': 'enter', 'message': 'Welcome'},
+                        {'shape': 'square', 'trigger': 'enter', 'message': 'dropped'},
+                    ],
+                    'not-a-location': [],
+                },
+            },
+        )
+        db.session.add(game)
+        db.session.commit()
+
+        compiled = game.get_compiled_geofences()
+        assert compiled is game.get_compiled_geofences()
+        assert game.has_geofences()
+        fences = compiled.fences_for(7)
+        assert len(fences) == 1
+        assert fences[0].radius_m == 30.0
+        assert compiled.fences_for('7') == fences
+        assert compiled.fences_for(8) == ()
+        with pytest.raises(AttributeError):
+            fences[0].radius_m = 5
+
+        # A fresh instance of the same game version reuses the compiled config.
+        game_id = game.id
+        db.session.expunge(game)
+        reloaded = db.session.get(Game, game_id)
+        assert reloaded.get_compiled_geofences() is compiled
+
+        # Editing fences invalidates it immediately, before any flush.
+        reloaded.set_location_geofences(7, [])
+        assert reloaded.get_compiled_geofences().fences_for(7) == ()
+        assert not reloaded.has_geofences()
+        db.session.commit()
+        assert reloaded.get_compiled_geofences() is not compiled
+
+
 def test_findloc_page_includes_geofence_payload(app, client, regular_user_id):
     with app.app_context():
         state = _create_geofence_team(regular_user_id)
@@ -236,3 +281,171 @@ def test_team_geofence_state_endpoint_persists_updates(app, client, regular_user
         assert team.get_geofence_runtime_state()['arrival-hint']['current_state'] == 'outside'
 
     client.get('/logout', follow_redirects=False)
+
+
+def _fence(fence_id, lat, lon, radius_m, trigger='enter', **extra):
+    return {'id': fence_id, 'shape': 'circle', 'center': {'lat': lat, 'lon': lon}, 'radius_m': radius_m,
+            'trigger': trigger, 'message': f'{fence_id} message', **extra}
+
+
+def test_fence_grid_returns_only_nearby_fences():
+    from app.geofences import compile_geofences
+
+    fences = [_fence(f'f{i}', 44.0 + i * 0.01, -88.0, 50) for i in range(100)]
+    fences.append(_fence('huge', 44.0, -88.0, 200000))
+    config = compile_geofences({'geofences': {'1': fences}})
+    grid = config.grid()
+
+    assert grid is config.grid()
+    candidates = grid.candidates(44.05, -88.0)
+    assert len(candidates) < 10
+    assert {fence.id for fence in grid.containing(44.05, -88.0)} == {'f5', 'huge'}
+    assert {fence.id for fence in grid.containing(44.0508, -88.0)} == {'huge'}
+
+
+def test_evaluate_positions_replays_transitions_cooldowns_and_reminders():
+    from app.geofences import compile_geofences, evaluate_positions, normalize_positions
+
+    config = compile_geofences({
+        'geofence_settings': {'enabled': True},
+        'geofences': {'1': [
+            _fence('arrive', 44.0, -88.0, 100, cooldown_s=60, repeat_while='inside', repeat_every_s=120),
+            _fence('leave', 44.0, -88.0, 100, trigger='exit', once_per_team=True),
+        ]},
+    })
+    inside, outside = (44.0, -88.0), (44.01, -88.0)
+    track = [(0, outside), (10, inside), (20, outside), (30, inside), (100, inside), (160, inside), (400, outside)]
+    positions = normalize_positions(
+        [{'lat': lat, 'lon': lon, 't': f'2026-05-01T10:{s // 60:02d}:{s % 60:02d}Z'} for s, (lat, lon) in track]
+    )
+
+    triggered, state, runtime = evaluate_positions(config, positions)
+
+    assert [(item['fence_id'], item['reason'], item['at'][11:19]) for item in triggered] == [
+        ('leave', 'transition', '10:00:00'),    # first look, outside an exit fence
+        ('arrive', 'transition', '10:00:10'),   # t=30 re-entry falls in the 60 s cooldown
+        ('arrive', 'reminder', '10:02:40'),     # 120 s after the last message, still inside
+    ]
+    assert state['leave']['times_triggered'] == 1
+    assert runtime['arrive']['current_state'] == 'outside'
+    assert runtime['leave']['last_evaluated_at'] == '2026-05-01T10:06:40.000Z'
+
+    # Re-sending the same stretch is a no-op.
+    again, state2, runtime2 = evaluate_positions(config, positions, state, runtime)
+    assert again == [] and state2 == state and runtime2 == runtime
+
+
+def test_geofence_positions_endpoint_evaluates_current_target(app, client, regular_user_id):
+    with app.app_context():
+        state = _create_geofence_team(regular_user_id)
+
+    _login_existing_user(client)
+    try:
+        url = f"/api/team/{state['team_id']}/geofence_positions"
+        response = client.post(url, json={'positions': [
+            {'lat': 44.3, 'lon': -88.5161, 't': '2026-05-01T10:00:00Z'},
+            {'lat': 44.22247, 'lon': -88.5161, 't': '2026-05-01T10:00:30Z'},
+            {'lat': 'bad', 'lon': 0},
+        ]})
+        assert response.status_code == 200
+        payload = response.get_json()
+        assert payload['evaluated'] == 2
+        assert [item['fence_id'] for item in payload['triggered']] == ['arrival-hint']
+        assert payload['triggered'][0]['message'] == 'You are getting close.'
+
+        with app.app_context():
+            team = db.session.get(Team, state['team_id'])
+            assert team.get_geofence_state()['arrival-hint']['times_triggered'] == 2
+            assert team.get_geofence_runtime_state()['arrival-hint']['current_state'] == 'inside'
+
+        # Fences of other locations are ignored.
+        response = client.post(url, json={'positions': [{'lat': 44.3, 'lon': -88.5161}], 'location_ids': [0]})
+        assert response.get_json()['triggered'] == []
+
+        assert client.post(url, json={'positions': 'nope'}).status_code == 400
+    finally:
+        client.get('/logout', follow_redirects=False)
+
+
+def _square(lat, lon, half):
+    return [[lon - half, lat - half], [lon + half, lat - half], [lon + half, lat + half], [lon - half, lat + half],
+            [lon - half, lat - half]]
+
+
+def test_polygon_fences_compile_with_holes_and_multiple_parts():
+    from app.geofences import compile_geofences
+
+    config = compile_geofences({'geofences': {'3': [
+        _fence('park', 0, 0, 0, shape='polygon', coordinates=[_square(44.0, -88.0, 0.01), _square(44.0, -88.0, 0.002)]),
+        _fence('blocks', 0, 0, 0, shape='multipolygon',
+               coordinates=[[_square(44.1, -88.0, 0.001)], [_square(44.2, -88.0, 0.001)]]),
+        _fence('sliver', 0, 0, 0, shape='polygon', coordinates=[[-88.0, 44.0], [-88.1, 44.1], [-88.0, 44.0]]),
+    ]}})
+    park, blocks = config.fences_for(3)
+
+    assert park.bbox == (43.99, -88.01, 44.01, -87.99)
+    assert park.contains(44.005, -88.0)
+    assert not park.contains(44.0, -88.0)       # inside the hole
+    assert not park.contains(44.02, -88.0)
+    assert blocks.contains(44.2, -88.0) and not blocks.contains(44.15, -88.0)
+
+    as_dict = park.to_dict()
+    assert as_dict['shape'] == 'polygon'
+    assert as_dict['radius_m'] is None
+    assert as_dict['bbox'] == [-88.01, 43.99, -87.99, 44.01]
+    assert len(as_dict['coordinates']) == 2 and len(as_dict['coordinates'][0]) == 4
+
+
+def test_polygon_batch_test_matches_point_by_point_ray_casting():
+    import math
+
+    import numpy as np
+
+    from app.geofences import compile_geofences
+
+    ring = [[-88.0 + 0.01 * math.cos(t) * (1 + 0.3 * math.sin(7 * t)), 44.0 + 0.01 * math.sin(t)]
+            for t in np.linspace(0, 2 * math.pi, 400, endpoint=False)]
+    fence, = compile_geofences({'geofences': {'1': [
+        _fence('wobbly', 0, 0, 0, shape='polygon', coordinates=[ring]),
+    ]}}).fences_for(1)
+
+    def ray_cast(lat, lon):
+        inside = False
+        for (lon0, lat0), (lon1, lat1) in zip(ring, ring[1:] + ring[:1]):
+            if (lat0 > lat) != (lat1 > lat) and lon < lon0 + (lat - lat0) * (lon1 - lon0) / (lat1 - lat0):
+                inside = not inside
+        return inside
+
+    rng = np.random.default_rng(7)
+    lats = 44.0 + rng.uniform(-0.015, 0.015, 3000)
+    lons = -88.0 + rng.uniform(-0.015, 0.015, 3000)
+    batch = fence.contains_many(lats, lons)
+    assert 0 < batch.sum() < len(batch)
+    assert batch.tolist() == [ray_cast(lat, lon) for lat, lon in zip(lats, lons)]
+
+
+def test_polygon_fences_reach_the_offline_bundle_and_evaluator(app, client, regular_user_id):
+    with app.app_context():
+        state = _create_geofence_team(regular_user_id)
+        game = db.session.get(Game, state['game_id'])
+        game.set_location_geofences(state['location_id'], [
+            _fence('plaza', 0, 0, 0, shape='polygon', coordinates=[_square(44.22247, -88.5161, 0.0005)]),
+        ])
+        db.session.commit()
+
+    _login_existing_user(client)
+    try:
+        with client.session_transaction() as sess:
+            sess['active_team_id'] = state['team_id']
+        bundle = client.get(f"/api/game/{state['game_id']}/offline_bundle").get_json()
+        fence, = bundle['game']['geofences'][str(state['location_id'])]
+        assert fence['shape'] == 'polygon'
+        assert len(fence['coordinates'][0]) == 4
+
+        response = client.post(f"/api/team/{state['team_id']}/geofence_positions", json={'positions': [
+            {'lat': 44.3, 'lon': -88.5161, 't': '2026-05-01T10:00:00Z'},
+            {'lat': 44.2226, 'lon': -88.5160, 't': '2026-05-01T10:00:30Z'},
+        ]})
+        assert [item['fence_id'] for item in response.get_json()['triggered']] == ['plaza']
+    finally:
+        client.get('/logout', follow_redirects=False)
@@ -1,3 +1,4 @@
+import json
 import uuid
 
 from app.models import Location
@@ -259,4 +260,42 @@ def test_location_geofence_editor_renders_and_persists(app, client):
         assert exit_fence['message'] == 'Return to the gate area.'
         assert exit_fence['repeat_every_s'] == 240
 
-    client.get('/logout', follow_redirects=False)
\ No newline at end of file
+    client.get('/logout', follow_redirects=False)
+
+def test_location_geofence_editor_saves_polygons(app, client):
+    with app.app_context():
+        game = _create_game(name='Polygon Editor Game')
+        location = Location(game_id=game.id, name='Park', latitude=44.2, longitude=-88.5, clue_text='Find the park.')
+        db.session.add(location)
+        db.session.commit()
+        game_id = game.id
+        location_id = location.id
+
+    login_response = _login_existing_user(client)
+    assert login_response.status_code in (301, 302)
+
+    url = f'/game_admin/{game_id}/locations/{location_id}/geofence'
+    polygon = {'type': 'Polygon', 'coordinates': [[[-88.501, 44.199], [-88.499, 44.199], [-88.499, 44.201],
+                                                    [-88.501, 44.201], [-88.501, 44.199]]]}
+    form = {
+        'enabled': '1',
+        'shape': 'polygon',
+        'polygon_geojson': '{"type": "Polygon", "coordinates": [[[-88.5, 44.2], [-88.4, 44.3]]]}',
+        'enter_message': 'Welcome to the park.',
+        'enter_repeat_every_s': '180',
+    }
+    response = client.post(url, data=form, follow_redirects=True)
+    assert b'at least three distinct points' in response.data
+
+    form['polygon_geojson'] = json.dumps({'type': 'Feature', 'geometry': polygon})
+    response = client.post(url, data=form, follow_redirects=True)
+    assert b'Geofence settings updated' in response.data
+    assert b'&#34;Polygon&#34;' in response.data or b'"Polygon"' in response.data
+
+    with app.app_context():
+        fence, = db.session.get(Game, game_id).get_location_geofences(location_id)
+        assert fence['shape'] == 'polygon'
+        assert fence['coordinates'][0][0] == [-88.501, 44.199]
+        assert fence['trigger'] == 'enter'
+
+    client.get('/logout', follow_redirects=False)
@@ -0,0 +1,93 @@
+import uuid
+
+from sqlalchemy import text
+
+from app import db
+from app.models import Game, Location
+
+
+def _create_nearby_game():
+    game = Game(name=f"nearby-{uuid.uuid4().hex[:8]}")
+    db.session.add(game)
+    db.session.flush()
+
+    # Roughly 0 m, ~111 m, ~556 m and ~5.5 km north of the origin.
+    origin_lat, origin_lon = 44.0, -88.0
+    locations = [
+        Location(game_id=game.id, name='Origin', latitude=origin_lat, longitude=origin_lon, clue_text='here'),
+        Location(game_id=game.id, name='Near', latitude=origin_lat + 0.001, longitude=origin_lon, clue_text='near'),
+        Location(game_id=game.id, name='Mid', latitude=origin_lat + 0.005, longitude=origin_lon, clue_text='mid'),
+        Location(game_id=game.id, name='Far', latitude=origin_lat + 0.05, longitude=origin_lon, clue_text='far'),
+        Location(game_id=game.id, name='Unplaced', clue_text='no coordinates'),
+    ]
+    db.session.add_all(locations)
+    db.session.commit()
+    return game.id, {loc.name: loc.id for loc in locations}
+
+
+def test_location_rtree_is_created(app):
+    with app.app_context():
+        assert app.extensions['location_rtree'] is True
+        row = db.session.execute(
+            text("SELECT name FROM sqlite_master WHERE name = 'location_rtree'")
+        ).first()
+        assert row is not None
+
+
+def test_nearby_locations_sorted_by_distance_within_radius(app, client):
+    with app.app_context():
+        game_id, _ids = _create_nearby_game()
+
+    rv = client.post('/api/get_nearby_locations', json={
+        'game_id': game_id,
+        'latitude': 44.0,
+        'longitude': -88.0,
+        'radius_m': 1000,
+    })
+    assert rv.status_code == 200
+
+    data = rv.get_json()
+    assert [item['name'] for item in data] == ['Origin', 'Near', 'Mid']
+    assert data[0]['distance_m'] == 0
+    assert data[1]['distance_m'] < data[2]['distance_m'] < 1000
+
+
+def test_nearby_locations_respects_limit_and_validates_params(app, client):
+    with app.app_context():
+        game_id, _ids = _create_nearby_game()
+
+    rv = client.post('/api/get_nearby_locations', json={
+        'game_id': game_id,
+        'latitude': 44.0,
+        'longitude': -88.0,
+        'radius_m': 10000,
+        'limit': 2,
+    })
+    assert [item['name'] for item in rv.get_json()] == ['Origin', 'Near']
+
+    bad = client.post('/api/get_nearby_locations', json={
+        'game_id': game_id,
+        'latitude': 44.0,
+        'longitude': -88.0,
+        'limit': 'many',
+    })
+    assert bad.status_code == 400
+
+
+def test_nearby_index_tracks_location_updates_and_deletes(app, client):
+    with app.app_context():
+        game_id, ids = _create_nearby_game()
+
+        far = db.session.get(Location, ids['Far'])
+        far.latitude = 44.0002
+        near = db.session.get(Location, ids['Near'])
+        db.session.delete(near)
+        db.session.commit()
+
+    rv = client.post('/api/get_nearby_locations', json={
+        'game_id': game_id,
+        'latitude': 44.0,
+        'longitude': -88.0,
+        'radius_m': 1000,
+    })
+    assert [item['name'] for item in rv.get_json()] == ['Origin', 'Far', 'Mid']
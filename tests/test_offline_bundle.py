@@ -136,7 +136,10 @@ def test_offline_bundle_returns_team_game_data(app, client, regular_user_id):
     assert 'image_url' in data['locations'][0]
     assert len(data['characters']) == 1
     assert data['tiles']['zooms'] == [14]
-    assert len(data['tiles']['urls']) > 0
+    assert data['tiles']['count'] > 0
+    assert data['tiles']['template'].endswith('/{z}/{x}/{y}.png')
+    assert {r['z'] for r in data['tiles']['ranges']} == {14}
+    assert data['tiles']['selection'] == 'corridor'
 
 
 def test_offline_bundle_for_non_member_is_forbidden(app, client, regular_user_id):
@@ -147,4 +150,272 @@ def test_offline_bundle_for_non_member_is_forbidden(app, client, regular_user_id
     assert login_rv.status_code in (301, 302)
 
     rv = client.get(f"/api/game/{state['game_id']}/offline_bundle")
-    assert rv.status_code == 403
\ No newline at end of file
+    assert rv.status_code == 403
+
+def test_offline_bundle_etag_and_not_modified(app, client, regular_user_id):
+    with app.app_context():
+        state = _create_offline_bundle_game(regular_user_id)
+
+    _login_existing_user(client, 'user@test.com', 'Test User')
+    url = f"/api/game/{state['game_id']}/offline_bundle"
+
+    rv = client.get(url)
+    assert rv.status_code == 200
+    etag = rv.headers['ETag']
+    version = rv.get_json()['version']
+
+    rv = client.get(url, headers={'If-None-Match': etag})
+    assert rv.status_code == 304
+    assert rv.headers['ETag'] == etag
+    assert rv.data == b''
+
+    # An admin edit to a location invalidates the bundle.
+    with app.app_context():
+        location = _db.session.get(Location, state['location_ids'][1])
+        location.clue_text = 'Climb the east steps'
+        _db.session.commit()
+
+    rv = client.get(url, headers={'If-None-Match': etag})
+    assert rv.status_code == 200
+    assert rv.headers['ETag'] != etag
+    assert rv.get_json()['version']['content'] == version['content'] + 1
+    assert rv.get_json()['version']['progress'] == version['progress']
+    etag = rv.headers['ETag']
+
+    # So does a found event for the team.
+    with app.app_context():
+        assignment = TeamLocationAssignment.query.filter_by(
+            team_id=state['team_id'], location_id=state['location_ids'][1]
+        ).one()
+        assignment.found = True
+        _db.session.commit()
+
+    rv = client.get(url, headers={'If-None-Match': etag})
+    assert rv.status_code == 200
+    assert rv.get_json()['version']['progress'] == version['progress'] + 1
+
+
+def test_offline_bundle_etag_changes_after_geofence_write(app, client, regular_user_id):
+    with app.app_context():
+        state = _create_offline_bundle_game(regular_user_id)
+
+    _login_existing_user(client, 'user@test.com', 'Test User')
+    url = f"/api/game/{state['game_id']}/offline_bundle"
+    try:
+        rv = client.get(url)
+        etag = rv.headers['ETag']
+        version = rv.get_json()['version']
+
+        patch = client.patch(f"/api/team/{state['team_id']}/geofence_state",
+                             json={'geofence_state': {'fence-1': {'times_triggered': 1}}})
+        assert patch.status_code == 200
+
+        rv = client.get(url, headers={'If-None-Match': etag})
+        assert rv.status_code == 200
+        assert rv.headers['ETag'] != etag
+        bundle = rv.get_json()
+        assert bundle['version']['geofence'] == version['geofence'] + 1
+        assert bundle['version']['progress'] == version['progress']
+        assert bundle['team']['geofence_state'] == {'fence-1': {'times_triggered': 1}}
+
+        # A delta request from the old token also sees the new state.
+        rv = client.get(f"{url}?since={version['token']}", headers={'If-None-Match': etag})
+        assert rv.status_code == 200
+        assert rv.get_json()['team']['geofence_state'] == {'fence-1': {'times_triggered': 1}}
+    finally:
+        client.get('/logout')
+
+
+def test_offline_bundle_version_tracks_branding_changes(app, client, regular_user_id):
+    from sqlalchemy.orm.attributes import flag_modified
+
+    with app.app_context():
+        state = _create_offline_bundle_game(regular_user_id)
+        game = _db.session.get(Game, state['game_id'])
+        before = game.content_version
+        game.data['branding']['icon_alt'] = 'Renamed Brand'
+        flag_modified(game, 'data')
+        _db.session.commit()
+        assert game.content_version == before + 1
+
+        # Touching only the version column itself must not bump it again.
+        game.content_version = game.content_version
+        _db.session.commit()
+        assert game.content_version == before + 1
+
+
+def test_game_state_etag_and_not_modified(app, client, regular_user_id):
+    with app.app_context():
+        state = _create_offline_bundle_game(regular_user_id)
+
+    _login_existing_user(client, 'user@test.com', 'Test User')
+    url = f"/api/game/state?game_id={state['game_id']}&team_id={state['team_id']}"
+
+    rv = client.get(url)
+    assert rv.status_code == 200
+    etag = rv.headers['ETag']
+    assert rv.get_json()['current_index'] == 1
+
+    rv = client.get(url, headers={'If-None-Match': etag})
+    assert rv.status_code == 304
+
+    with app.app_context():
+        TeamLocationAssignment.query.filter_by(team_id=state['team_id']).delete()
+        from app.versions import bump_versions
+        bump_versions(_db.session, team_ids=[state['team_id']])
+        _db.session.commit()
+
+    rv = client.get(url, headers={'If-None-Match': etag})
+    assert rv.status_code == 200
+    assert rv.headers['ETag'] != etag
+    assert rv.get_json()['locations_found'] == []
+
+
+def test_offline_bundle_delta_since_version(app, client, regular_user_id):
+    with app.app_context():
+        state = _create_offline_bundle_game(regular_user_id)
+
+    _login_existing_user(client, 'user@test.com', 'Test User')
+    url = f"/api/game/{state['game_id']}/offline_bundle"
+
+    full = client.get(url).get_json()
+    assert full['mode'] == 'full'
+    token = full['version']['token']
+
+    # Nothing changed: an empty delta.
+    rv = client.get(url, query_string={'since': token})
+    data = rv.get_json()
+    assert data['mode'] == 'delta'
+    assert data['locations'] == []
+    assert data['characters'] == []
+    assert 'tiles' not in data
+
+    with app.app_context():
+        location = _db.session.get(Location, state['location_ids'][1])
+        location.clue_text = 'Look under the second step'
+        character = Character.query.filter_by(game_id=state['game_id']).one()
+        character_id = character.id
+        _db.session.delete(character)
+        _db.session.commit()
+
+    rv = client.get(url, query_string={'since': token})
+    data = rv.get_json()
+    assert data['mode'] == 'delta'
+    assert [loc['id'] for loc in data['locations']] == [state['location_ids'][1]]
+    assert data['locations'][0]['clue_text'] == 'Look under the second step'
+    assert data['characters'] == []
+    assert data['deleted'] == {'locations': [], 'characters': [character_id]}
+    assert data['team']['progress'] == {'found': 1, 'total': 2}
+    assert data['version']['content'] > full['version']['content']
+
+    # Removing an assignment shows up as a location tombstone.
+    token = data['version']['token']
+    with app.app_context():
+        assignment = TeamLocationAssignment.query.filter_by(
+            team_id=state['team_id'], location_id=state['location_ids'][0]
+        ).one()
+        _db.session.delete(assignment)
+        _db.session.commit()
+
+    data = client.get(url, query_string={'since': token}).get_json()
+    assert data['mode'] == 'delta'
+    assert data['deleted']['locations'] == [state['location_ids'][0]]
+    assert data['team']['progress'] == {'found': 0, 'total': 1}
+
+
+def test_offline_bundle_delta_falls_back_to_full(app, client, regular_user_id):
+    with app.app_context():
+        state = _create_offline_bundle_game(regular_user_id)
+
+    _login_existing_user(client, 'user@test.com', 'Test User')
+    url = f"/api/game/{state['game_id']}/offline_bundle"
+    token = client.get(url).get_json()['version']['token']
+
+    # Unknown / malformed versions get the full bundle.
+    assert client.get(url, query_string={'since': '999.999'}).get_json()['mode'] == 'full'
+    assert client.get(url, query_string={'since': 'garbage'}).get_json()['mode'] == 'full'
+
+    # A bulk reset leaves a gap in the change log.
+    with app.app_context():
+        from app.versions import bump_versions
+        TeamLocationAssignment.query.filter_by(team_id=state['team_id']).delete()
+        bump_versions(_db.session, team_ids=[state['team_id']])
+        _db.session.commit()
+    data = client.get(url, query_string={'since': token}).get_json()
+    assert data['mode'] == 'full'
+    assert data['locations'] == []
+
+    # Touching every item makes the delta no smaller than the full bundle.
+    token = data['version']['token']
+    with app.app_context():
+        for location_id in state['location_ids']:
+            _db.session.add(TeamLocationAssignment(
+                team_id=state['team_id'], location_id=location_id, game_id=state['game_id'],
+            ))
+        for character in Character.query.filter_by(game_id=state['game_id']).all():
+            character.bio = 'Updated bio'
+        _db.session.commit()
+    data = client.get(url, query_string={'since': token}).get_json()
+    assert data['mode'] == 'full'
+    assert len(data['locations']) == 2
+
+
+def test_single_flight_cache_coalesces_concurrent_misses(app):
+    import threading
+    from app.main.cache import SingleFlightCache
+
+    cache = SingleFlightCache(max_entries=2)
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(1)
+        return {'value': len(calls)}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute))) for _ in range(5)]
+    threads[0].start()
+    started.wait(1)
+    for t in threads[1:]:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == [{'value': 1}] * 5
+
+    cache.get_or_compute('a', lambda: 'a')
+    cache.get_or_compute('b', lambda: 'b')
+    assert len(cache) == 2  # 'k' was evicted as least recently used
+
+
+def test_offline_bundle_reuses_game_part_per_content_version(app, client, regular_user_id, monkeypatch):
+    from app.api import routes as api_routes
+
+    with app.app_context():
+        state = _create_offline_bundle_game(regular_user_id)
+
+    calls = []
+    real_bundle_game = api_routes._bundle_game
+    monkeypatch.setattr(api_routes, '_bundle_game', lambda game: calls.append(game.id) or real_bundle_game(game))
+
+    _login_existing_user(client, 'user@test.com', 'Test User')
+    url = f"/api/game/{state['game_id']}/offline_bundle"
+    first = client.get(url).get_json()
+    second = client.get(url).get_json()
+    assert calls == [state['game_id']]
+    assert first['game'] == second['game']
+    assert first['locations'] == second['locations']
+
+    with app.app_context():
+        _db.session.get(Location, state['location_ids'][0]).name = 'North Gate (moved)'
+        _db.session.commit()
+
+    data = client.get(url).get_json()
+    assert calls == [state['game_id'], state['game_id']]
+    assert data['locations'][0]['name'] == 'North Gate (moved)'
+    assert data['locations'][0]['found'] is True
@@ -286,3 +286,70 @@ def test_regular_user_cannot_access_admin_confirm_endpoint(app, client, regular_
         },
     )
     assert rv.status_code in (302, 403)
+
+
+def test_sync_batch_applies_events_and_reports_each_result(app, client, regular_user_id):
+    with app.app_context():
+        state = _create_sync_game(regular_user_id)
+
+    login_rv = _login_existing_user(client, 'user@test.com', 'Test User')
+    assert login_rv.status_code in (301, 302)
+
+    base = {'game_id': state['game_id'], 'team_id': state['team_id'], 'method': 'direct'}
+    rv = client.post('/api/sync/batch', json={'events': [
+        {**base, 'location_id': state['location_1_id'], 'client_event_id': 'evt-batch-1'},
+        {**base, 'location_id': state['location_2_id'], 'client_event_id': 'evt-batch-2'},
+        {**base, 'location_id': state['location_1_id'], 'client_event_id': 'evt-batch-1'},
+        {**base, 'location_id': 999999, 'client_event_id': 'evt-batch-missing'},
+        {**base, 'location_id': state['location_2_id'], 'method': 'geo', 'client_event_id': 'evt-batch-geo'},
+    ]})
+    assert rv.status_code == 200
+
+    data = rv.get_json()
+    statuses = [(r['client_event_id'], r['status'], r['http_status']) for r in data['results']]
+    assert statuses == [
+        ('evt-batch-1', 'synced', 200),
+        ('evt-batch-2', 'synced', 200),
+        ('evt-batch-1', 'duplicate', 200),
+        ('evt-batch-missing', 'failed', 404),
+        ('evt-batch-geo', 'duplicate', 200),
+    ]
+    assert data['results'][2]['duplicate_of'] == 0
+    assert data['applied'] == 2
+    assert data['team_progress'] == [{'team_id': state['team_id'], 'found': 2, 'total': 2}]
+
+    with app.app_context():
+        found = TeamLocationAssignment.query.filter_by(team_id=state['team_id'], found=True).count()
+        assert found == 2
+
+
+def test_sync_batch_dedupes_by_queue_key_and_rejects_non_member(app, client, regular_user_id):
+    with app.app_context():
+        state = _create_sync_game(regular_user_id)
+
+    login_rv = _login_existing_user(client, 'admin@test.com', 'Admin User')
+    assert login_rv.status_code in (301, 302)
+
+    queue_key = f"location_found:{state['game_id']}:{state['team_id']}:{state['location_1_id']}"
+    event = {
+        'game_id': state['game_id'],
+        'location_id': state['location_1_id'],
+        'method': 'direct',
+        'queue_key': queue_key,
+    }
+    rv = client.post('/api/sync/batch', json={'events': [event, dict(event)]})
+    assert rv.status_code == 200
+
+    results = rv.get_json()['results']
+    assert results[0]['status'] == 'failed'
+    assert results[0]['http_status'] == 403
+    assert results[1]['duplicate_of'] == 0
+    assert results[1]['status'] == 'failed'
+
+
+def test_sync_batch_requires_event_list(app, client):
+    login_rv = _login_existing_user(client, 'user@test.com', 'Test User')
+    assert login_rv.status_code in (301, 302)
+
+    rv = client.post('/api/sync/batch', json={'events': 'nope'})
+    assert rv.status_code == 400
@@ -1,7 +1,7 @@
 import uuid
 
 from app import db
-from app.models import Game, GameType, Location, Team, TeamLocationAssignment, TeamMembership
+from app.models import Game, GameType, Location, QRToken, Team, TeamLocationAssignment, TeamMembership
 
 
 def _unique_name(prefix='qr-game'):
@@ -223,3 +223,49 @@ def test_qr_validation_rejects_wrong_or_future_clue_token(app, client, regular_u
     assert payload['success'] is False
 
     client.get('/logout', follow_redirects=False)
+
+
+def test_qr_token_table_tracks_set_and_ensure(app):
+    with app.app_context():
+        game_id, location_ids = _create_qr_game(qr_enabled=True, location_count=2)
+        game = db.session.get(Game, game_id)
+
+        rows = QRToken.query.filter_by(game_id=game_id).all()
+        assert {row.location_id: row.token for row in rows} == {
+            location_id: game.get_qr_token(location_id) for location_id in location_ids
+        }
+
+        new_token = f'token-{uuid.uuid4().hex[:10]}'
+        game.set_qr_token(location_ids[0], new_token)
+        db.session.commit()
+
+        assert QRToken.query.filter_by(game_id=game_id).count() == 2
+        assert game.find_location_id_for_qr_token(f'geokr:qr:{new_token}') == location_ids[0]
+        assert game.find_location_id_for_qr_token('geokr:qr:no-such-token') is None
+
+        _tokens, changed = game.ensure_qr_tokens(location_ids)
+        assert changed is False
+
+
+def test_qr_resolve_finds_game_and_location(app, client, regular_user_id):
+    with app.app_context():
+        state = _create_qr_team(regular_user_id, qr_enabled=True, location_count=2)
+        game = db.session.get(Game, state['game_id'])
+        second_location_id = state['location_ids'][1]
+        token = game.get_qr_token(second_location_id)
+
+        disabled_game_id, disabled_location_ids = _create_qr_game(qr_enabled=False, location_count=1)
+        disabled_token = db.session.get(Game, disabled_game_id).get_qr_token(disabled_location_ids[0])
+
+    _login_existing_user(client, email='user@test.com', display_name='Test User')
+
+    response = client.get(f'/api/qr/resolve/geokr:qr:{token}')
+    assert response.status_code == 200
+    payload = response.get_json()
+    assert payload['game_id'] == state['game_id']
+    assert payload['location_id'] == second_location_id
+
+    assert client.get('/api/qr/resolve/unknown-token').status_code == 404
+    assert client.get(f'/api/qr/resolve/{disabled_token}').status_code == 403
+
+    client.get('/logout', follow_redirects=False)
@@ -0,0 +1,131 @@
+import re
+import uuid
+from contextlib import contextmanager
+
+from sqlalchemy import event, text
+
+from app import db
+from app.models import Game, GameType, Location, Team, TeamLocationAssignment, TeamMembership
+
+TABLE = 'team_location_assignment'
+# "SCAN team_location_assignment" (and older "SCAN TABLE ...") is a full table
+# scan; "SCAN ... USING COVERING INDEX" is a full index scan. Both regress.
+_SCAN_RE = re.compile(rf'\bSCAN (TABLE )?{TABLE}\b')
+
+
+def _unique_name(prefix):
+    return f"{prefix}-{uuid.uuid4().hex[:8]}"
+
+
+def _create_team_with_route(user_id, location_count=3):
+    gametype = GameType.query.filter_by(name='findloc').first()
+    if not gametype:
+        gametype = GameType(name='findloc')
+        db.session.add(gametype)
+
+    game = Game(name=_unique_name('plan-game'), gametype=gametype, discoverable='public', mode='open')
+    db.session.add(game)
+    db.session.flush()
+    team = Team(name=_unique_name('plan-team'), game_id=game.id)
+    db.session.add(team)
+    db.session.flush()
+    db.session.add(TeamMembership(user_id=user_id, team_id=team.id, role='captain'))
+
+    location_ids = []
+    for index in range(location_count):
+        location = Location(game_id=game.id, name=f'Plan {index}', latitude=44.0 + index * 0.001,
+                            longitude=-88.0, clue_text=f'Clue {index}')
+        db.session.add(location)
+        db.session.flush()
+        location_ids.append(location.id)
+        db.session.add(TeamLocationAssignment(team_id=team.id, location_id=location.id, game_id=game.id,
+                                              order_index=index, found=False))
+    db.session.commit()
+    return game.id, team.id, location_ids
+
+
+@contextmanager
+def _capture_statements():
+    """Collect (sql, params) for every SELECT touching team_location_assignment."""
+    captured = []
+
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith('SELECT') and TABLE in statement:
+            captured.append((statement, parameters))
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_execute)
+    try:
+        yield captured
+    finally:
+        event.remove(engine, 'before_cursor_execute', _before_execute)
+
+
+def _query_plan(statement, parameters):
+    conn = db.session.connection().connection.driver_connection
+    rows = conn.execute(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    return [row[-1] for row in rows]
+
+
+def _assert_no_table_scans(captured):
+    assert captured, 'expected team_location_assignment queries'
+    for statement, parameters in captured:
+        plan = _query_plan(statement, parameters)
+        scans = [line for line in plan if _SCAN_RE.search(line)]
+        assert not scans, f"table scan in plan {plan} for:\n{statement}"
+
+
+def test_declared_indexes_exist(app):
+    with app.app_context():
+        names = {row[0] for row in db.session.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :t"), {'t': TABLE}
+        )}
+    assert {'ix_tla_team_game_order', 'ix_tla_team_game_found', 'ix_tla_game_team'} <= names
+
+
+def test_route_queries_use_indexes(app, regular_user_id):
+    with app.app_context():
+        game_id, team_id, location_ids = _create_team_with_route(regular_user_id)
+
+        route = (
+            TeamLocationAssignment.query
+            .filter_by(team_id=team_id, game_id=game_id)
+            .order_by(TeamLocationAssignment.order_index)
+        )
+        next_unfound = (
+            TeamLocationAssignment.query
+            .filter_by(team_id=team_id, game_id=game_id, found=False)
+            .order_by(TeamLocationAssignment.order_index)
+        )
+        with _capture_statements() as captured:
+            route.all()
+            next_unfound.first()
+            TeamLocationAssignment.query.filter_by(game_id=game_id).all()
+
+        _assert_no_table_scans(captured)
+        for statement, parameters in captured[:2]:
+            plan = ' | '.join(_query_plan(statement, parameters))
+            assert 'TEMP B-TREE' not in plan, plan
+
+
+def test_player_endpoints_do_not_scan_assignments(app, client, regular_user_id):
+    with app.app_context():
+        game_id, team_id, location_ids = _create_team_with_route(regular_user_id)
+        db.session.get(Game, game_id).data = {'require_proximity': False}
+        db.session.commit()
+
+    client.post('/register_or_login', data={'email': 'user@test.com', 'display_name': 'Test User'})
+    with client.session_transaction() as sess:
+        sess['active_team_id'] = team_id
+
+    try:
+        with _capture_statements() as captured:
+            client.get('/findloc')
+            client.get('/map')
+            client.get(f'/api/game/state?game_id={game_id}&team_id={team_id}')
+            client.post(f'/api/location/{location_ids[0]}/found',
+                        json={'game_id': game_id, 'method': 'direct'})
+        with app.app_context():
+            _assert_no_table_scans(captured)
+    finally:
+        client.get('/logout', follow_redirects=False)
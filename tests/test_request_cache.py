@@ -0,0 +1,73 @@
+import uuid
+
+from sqlalchemy import event
+
+from app import db
+from app.models import Game, GameType, Location, Team, TeamLocationAssignment, TeamMembership
+
+
+def _create_team(user_id, navbar_color):
+    gametype = GameType.query.filter_by(name='findloc').first()
+    game = Game(name=f'cache-game-{uuid.uuid4().hex[:8]}', gametype=gametype, discoverable='public',
+                mode='open', data={'branding': {'navbar_color': navbar_color}})
+    db.session.add(game)
+    db.session.flush()
+    team = Team(name=f'cache-team-{uuid.uuid4().hex[:8]}', game_id=game.id)
+    db.session.add(team)
+    db.session.flush()
+    db.session.add(TeamMembership(user_id=user_id, team_id=team.id, role='captain'))
+    location = Location(game_id=game.id, name='Cache Stop', latitude=44.0, longitude=-88.0, clue_text='Clue')
+    db.session.add(location)
+    db.session.flush()
+    db.session.add(TeamLocationAssignment(team_id=team.id, location_id=location.id, game_id=game.id, order_index=0))
+    db.session.commit()
+    return game.id, team.id
+
+
+def _login(client, team_id):
+    client.post('/register_or_login', data={'email': 'user@test.com', 'display_name': 'Test User'})
+    with client.session_transaction() as sess:
+        sess['active_team_id'] = team_id
+
+
+def test_page_render_runs_one_membership_query(app, client, regular_user_id):
+    with app.app_context():
+        _game_id, team_id = _create_team(regular_user_id, '#123456')
+
+    _login(client, team_id)
+    statements = []
+
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and 'FROM team_membership' in statement:
+            statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', _before_execute)
+    try:
+        response = client.get('/findloc')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', _before_execute)
+        client.get('/logout', follow_redirects=False)
+
+    assert response.status_code == 200
+    assert b'#123456' in response.data
+    assert len(statements) == 1
+
+
+def test_branding_follows_game_updates(app, client, regular_user_id):
+    with app.app_context():
+        game_id, team_id = _create_team(regular_user_id, '#abcdef')
+
+    _login(client, team_id)
+    try:
+        assert b'#abcdef' in client.get('/findloc').data
+
+        with app.app_context():
+            game = db.session.get(Game, game_id)
+            game.data = {'branding': {'navbar_color': '#fedcba'}}
+            db.session.commit()
+
+        body = client.get('/findloc').data
+        assert b'#fedcba' in body
+        assert b'#abcdef' not in body
+    finally:
+        client.get('/logout', follow_redirects=False)
@@ -0,0 +1,121 @@
+import uuid
+
+import numpy as np
+
+from app import db
+from app.models import Game, GameType, Location
+from app.route_planner import distance_matrix, get_distance_matrix, plan_routes
+
+
+def _grid(n=6, step=0.001):
+    lats, lons = np.meshgrid(44.0 + np.arange(n) * step, -88.0 + np.arange(n) * step)
+    return lats.ravel(), lons.ravel()
+
+
+def test_distance_matrix_matches_scalar_haversine(app):
+    from app.main.utils import haversine
+
+    lats, lons = np.array([44.0, 44.01, 43.5]), np.array([-88.0, -88.02, -87.1])
+    dist = distance_matrix(lats, lons)
+
+    assert dist.shape == (3, 3)
+    assert np.allclose(dist, dist.T) and np.all(np.diag(dist) == 0)
+    for i in range(3):
+        for j in range(3):
+            assert abs(dist[i, j] - haversine(lats[i], lons[i], lats[j], lons[j])) < 1e-6
+
+
+def test_two_opt_untangles_a_crossing_route():
+    # Corners of a square with fixed start and finish: seeding at corner 12
+    # gives the crossing path 10-12-11-13, which 2-opt must turn into the
+    # perimeter; seeding at 11 gives the perimeter directly.
+    lats, lons = np.array([0.0, 0.0, 0.01, 0.01]), np.array([0.0, 0.01, 0.01, 0.0])
+    dist = distance_matrix(lats, lons)
+    for seed in range(4):
+        (route, length), = plan_routes(dist, [10, 11, 12, 13], 1, start_id=10, finish_id=13, seed=seed)
+
+        assert route == [10, 11, 12, 13]
+        assert abs(length - (dist[0, 1] + dist[1, 2] + dist[2, 3])) < 1e-6
+
+
+def test_routes_respect_fixed_ends_and_length():
+    lats, lons = _grid()
+    ids = list(range(100, 136))
+    dist = distance_matrix(lats, lons)
+
+    planned = plan_routes(dist, ids, 8, route_length=7, start_id=100, finish_id=135, seed=1)
+    assert len(planned) == 8
+    for route, length in planned:
+        assert route[0] == 100 and route[-1] == 135
+        assert len(route) == len(set(route)) == 7
+        assert length > 0
+    # Different seeds give teams different first stops after the start.
+    assert len({route[1] for route, _length in planned}) > 1
+
+    full, = plan_routes(dist, ids, 1, seed=1)
+    assert sorted(full[0]) == ids
+    # A 6x6 grid with 111 m spacing has a 35-edge serpentine path.
+    assert full[1] < 35 * 112
+
+
+def test_balancing_narrows_route_length_spread():
+    rng = np.random.default_rng(5)
+    lats, lons = 44.0 + rng.uniform(0, 0.03, 60), -88.0 + rng.uniform(0, 0.04, 60)
+    dist = distance_matrix(lats, lons)
+    ids = list(range(60))
+
+    def spread(planned):
+        lengths = [length for _route, length in planned]
+        return max(lengths) - min(lengths)
+
+    balanced = plan_routes(dist, ids, 10, route_length=12, seed=3)
+    unbalanced = plan_routes(dist, ids, 10, route_length=12, seed=3, balance=False)
+    assert spread(balanced) <= spread(unbalanced)
+
+
+def test_invalid_options_raise_value_error():
+    dist = distance_matrix([0.0, 0.0], [0.0, 0.01])
+    for kwargs in ({'start_id': 99}, {'start_id': 1, 'finish_id': 1}, {'route_length': 2, 'start_id': 1, 'finish_id': 2}):
+        try:
+            plan_routes(dist, [1, 2], 1, **kwargs)
+        except ValueError:
+            continue
+        raise AssertionError(f"expected ValueError for {kwargs}")
+
+
+def test_generate_endpoint_writes_game_routes(app, client):
+    with app.app_context():
+        gametype = GameType.query.filter_by(name='findloc').first()
+        game = Game(name=f'routes-{uuid.uuid4().hex[:8]}', gametype=gametype, discoverable='public', mode='open')
+        db.session.add(game)
+        db.session.flush()
+        lats, lons = _grid(4)
+        db.session.add_all([
+            Location(game_id=game.id, name=f'R{i}', latitude=float(lat), longitude=float(lon))
+            for i, (lat, lon) in enumerate(zip(lats, lons))
+        ])
+        db.session.commit()
+        game_id = game.id
+        location_ids = [loc.id for loc in Location.query.filter_by(game_id=game_id).order_by(Location.id)]
+
+        first = get_distance_matrix(db.session, game)
+        assert get_distance_matrix(db.session, game) is first
+
+    client.post('/register_or_login', data={'email': 'admin@test.com', 'display_name': 'Admin User'})
+    try:
+        url = f'/api/game/{game_id}/routes/generate'
+        response = client.post(url, json={'count': 3, 'route_length': 5, 'start_location_id': location_ids[0]})
+        payload = response.get_json()
+        assert response.status_code == 200 and payload['saved'] is True
+        assert len(payload['routes']) == len(payload['lengths_m']) == 3
+        assert all(route[0] == location_ids[0] and len(route) == 5 for route in payload['routes'])
+        assert client.get(f'/api/game/{game_id}/routes').get_json()['routes'] == payload['routes']
+
+        preview = client.post(url, json={'count': 2, 'save': False}).get_json()
+        assert preview['saved'] is False and len(preview['routes'][0]) == 16
+        assert client.get(f'/api/game/{game_id}/routes').get_json()['routes'] == payload['routes']
+
+        assert client.post(url, json={'start_location_id': 999999}).status_code == 400
+        assert client.post(url, json={'count': 'many'}).status_code == 400
+    finally:
+        client.get('/logout')
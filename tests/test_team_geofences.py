@@ -0,0 +1,160 @@
+import uuid
+
+from sqlalchemy import event
+
+from app import db
+from app.models import Game, GameType, Team, TeamGeofenceState, TeamMembership
+from app.team_geofences import apply_geofence_patch, geofence_changes_since
+
+
+def _create_team(user_id=None, data=None):
+    gametype = GameType.query.filter_by(name='findloc').first()
+    if not gametype:
+        gametype = GameType(name='findloc')
+        db.session.add(gametype)
+
+    game = Game(name=f'fence-state-{uuid.uuid4().hex[:8]}', gametype=gametype, discoverable='public', mode='open')
+    db.session.add(game)
+    db.session.flush()
+    team = Team(name=f'fence-state-team-{uuid.uuid4().hex[:8]}', game_id=game.id, data=data or {})
+    db.session.add(team)
+    db.session.flush()
+    if user_id is not None:
+        db.session.add(TeamMembership(user_id=user_id, team_id=team.id, role='captain'))
+    db.session.commit()
+    return team.id
+
+
+def _capture_sql():
+    statements = []
+
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+    return statements, lambda: event.remove(db.engine, 'before_cursor_execute', _before_cursor_execute)
+
+
+def test_patch_writes_only_changed_fences_and_leaves_team_row_alone(app):
+    with app.app_context():
+        team = db.session.get(Team, _create_team(data={'selfies': {'1': 'a.jpg'}}))
+        progress_version = team.progress_version
+
+        version, changed = apply_geofence_patch(db.session, team, state={'a': {'times_triggered': 1}},
+                                                runtime={'a': {'current_state': 'inside', 'location_id': 4},
+                                                         'b': {'current_state': 'outside'}})
+        db.session.commit()
+        assert (version, changed) == (1, ['a', 'b'])
+
+        statements, stop = _capture_sql()
+        try:
+            version, changed = apply_geofence_patch(db.session, team, runtime={
+                'a': {'current_state': 'inside', 'location_id': 4},
+                'b': {'current_state': 'inside'},
+            })
+            db.session.commit()
+        finally:
+            stop()
+        assert (version, changed) == (2, ['b'])
+        writes = [sql for sql in statements if sql.lstrip().upper().startswith(('UPDATE', 'INSERT'))]
+        assert not any('SET data' in sql for sql in writes)
+        assert sum('team_geofence_state' in sql for sql in writes) == 1
+
+        # Nothing changed: no version bump and no writes.
+        assert apply_geofence_patch(db.session, team, runtime={'b': {'current_state': 'inside'}}) == (2, [])
+
+        team = db.session.get(Team, team.id)
+        assert team.progress_version == progress_version
+        assert team.geofence_version == 2
+        assert team.data == {'selfies': {'1': 'a.jpg'}}
+        state, runtime = team.get_geofence_tracking()
+        assert state == {'a': {'times_triggered': 1}}
+        assert runtime['b'] == {'current_state': 'inside'}
+        assert db.session.query(TeamGeofenceState.location_id).filter_by(team_id=team.id, fence_id='a').scalar() == 4
+
+
+def test_patch_reads_only_the_fences_it_names(app):
+    with app.app_context():
+        team = db.session.get(Team, _create_team())
+        apply_geofence_patch(db.session, team, state={f'f{n}': {'n': n} for n in range(20)})
+        db.session.commit()
+
+        statements, stop = _capture_sql()
+        try:
+            assert apply_geofence_patch(db.session, team, state={'f3': {'n': 30}}) == (2, ['f3'])
+            db.session.commit()
+        finally:
+            stop()
+        reads = [sql for sql in statements if sql.lstrip().upper().startswith('SELECT') and 'team_geofence_state' in sql]
+        assert reads and all(' IN ' in sql.upper() for sql in reads)
+
+        # The whole-dict replace still sees every row, so it can clear the rest.
+        version, changed = apply_geofence_patch(db.session, team, state={'f3': {'n': 30}}, replace=True)
+        assert len(changed) == 19
+
+
+def test_changes_since_reports_updates_and_deletions(app):
+    with app.app_context():
+        team = db.session.get(Team, _create_team())
+        apply_geofence_patch(db.session, team, state={'a': {'n': 1}, 'b': {'n': 1}, 'c': {'n': 1}})
+        apply_geofence_patch(db.session, team, state={'b': {'n': 2}}, deleted=['c'])
+        db.session.commit()
+
+        delta = geofence_changes_since(db.session, team, 1)
+        assert delta['full'] is False and delta['version'] == 2
+        assert delta['geofence_state'] == {'b': {'n': 2}}
+        assert delta['deleted'] == ['c']
+
+        assert geofence_changes_since(db.session, team, 2)['geofence_state'] == {}
+        full = geofence_changes_since(db.session, team, 99)
+        assert full['full'] is True
+        assert full['geofence_state'] == {'a': {'n': 1}, 'b': {'n': 2}}
+
+
+def test_legacy_team_data_moves_into_rows_on_first_write(app):
+    with app.app_context():
+        team = db.session.get(Team, _create_team(data={
+            'selfies': {},
+            'geofence_state': {'old': {'times_triggered': 3}},
+            'geofence_runtime': {'old': {'current_state': 'outside'}},
+        }))
+        assert team.get_geofence_state() == {'old': {'times_triggered': 3}}
+
+        version, changed = apply_geofence_patch(db.session, team, runtime={'new': {'current_state': 'inside'}})
+        db.session.commit()
+
+        team = db.session.get(Team, team.id)
+        assert changed == ['new', 'old']
+        assert team.data == {'selfies': {}}
+        assert team.get_geofence_state() == {'old': {'times_triggered': 3}}
+        assert set(team.get_geofence_runtime_state()) == {'old', 'new'}
+
+
+def test_geofence_state_endpoint_patch_and_since(app, client, regular_user_id):
+    with app.app_context():
+        team_id = _create_team(regular_user_id)
+
+    client.post('/register_or_login', data={'email': 'user@test.com', 'display_name': 'Test User'})
+    try:
+        url = f'/api/team/{team_id}/geofence_state'
+        response = client.post(url, json={'geofence_state': {'a': {'n': 1}, 'b': {'n': 1}}, 'geofence_runtime': {}})
+        assert response.get_json()['version'] == 1
+
+        response = client.patch(url, json={'geofence_runtime': {'a': {'current_state': 'inside'}}, 'deleted': ['b']})
+        payload = response.get_json()
+        assert payload['changed'] == ['a', 'b'] and payload['version'] == 2
+
+        delta = client.get(f'{url}?since=1').get_json()
+        assert delta['geofence_runtime'] == {'a': {'current_state': 'inside'}}
+        assert delta['deleted'] == ['b']
+
+        full = client.get(url).get_json()
+        assert full['version'] == 2
+        assert full['geofence_state'] == {'a': {'n': 1}}
+
+        # POST replaces the whole dicts: fences it omits are cleared.
+        response = client.post(url, json={'geofence_state': {}, 'geofence_runtime': {'a': {'current_state': 'inside'}}})
+        assert response.get_json()['geofence_state'] == {}
+        assert client.patch(url, json={'deleted': 'b'}).status_code == 400
+    finally:
+        client.get('/logout')
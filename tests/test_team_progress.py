@@ -0,0 +1,104 @@
+import uuid
+from datetime import datetime
+
+from app import db
+from app.models import Game, GameType, Location, Team, TeamLocationAssignment, TeamProgress
+from app.progress import get_team_progress, refresh_team_progress
+
+
+def _create_team(location_count=3):
+    gametype = GameType.query.filter_by(name='findloc').first()
+    if not gametype:
+        gametype = GameType(name='findloc')
+        db.session.add(gametype)
+
+    game = Game(name=f'progress-{uuid.uuid4().hex[:8]}', gametype=gametype, discoverable='public', mode='open')
+    db.session.add(game)
+    db.session.flush()
+    team = Team(name=f'progress-team-{uuid.uuid4().hex[:8]}', game_id=game.id)
+    db.session.add(team)
+    db.session.flush()
+
+    location_ids = []
+    for index in range(location_count):
+        location = Location(game_id=game.id, name=f'P{index}', latitude=44.0, longitude=-88.0)
+        db.session.add(location)
+        db.session.flush()
+        location_ids.append(location.id)
+        db.session.add(TeamLocationAssignment(team_id=team.id, location_id=location.id, game_id=game.id,
+                                              order_index=index, found=False))
+    db.session.commit()
+    return game.id, team.id, location_ids
+
+
+def _find(team_id, location_id):
+    assignment = TeamLocationAssignment.query.filter_by(team_id=team_id, location_id=location_id).one()
+    assignment.found = True
+    assignment.timestamp_found = datetime.utcnow()
+    db.session.commit()
+
+
+def test_progress_follows_assignment_writes(app):
+    with app.app_context():
+        game_id, team_id, location_ids = _create_team()
+
+        progress = db.session.get(TeamProgress, team_id)
+        assert (progress.found_count, progress.total) == (0, 3)
+        assert progress.next_location_id == location_ids[0]
+        assert progress.completed_at is None
+
+        _find(team_id, location_ids[0])
+        progress = db.session.get(TeamProgress, team_id)
+        assert progress.found_count == 1
+        assert progress.next_order_index == 1
+        assert progress.next_location_id == location_ids[1]
+        assert progress.last_found_at is not None
+
+        _find(team_id, location_ids[1])
+        _find(team_id, location_ids[2])
+        progress = db.session.get(TeamProgress, team_id)
+        assert progress.is_complete
+        assert progress.next_location_id is None
+        assert progress.completed_at is not None
+
+
+def test_progress_rolls_back_with_the_write(app):
+    with app.app_context():
+        _game_id, team_id, location_ids = _create_team()
+
+        assignment = TeamLocationAssignment.query.filter_by(team_id=team_id, location_id=location_ids[0]).one()
+        assignment.found = True
+        db.session.flush()
+        assert db.session.get(TeamProgress, team_id).found_count == 1
+        db.session.rollback()
+
+        assert db.session.get(TeamProgress, team_id).found_count == 0
+
+
+def test_bulk_delete_requires_refresh(app):
+    with app.app_context():
+        game_id, team_id, _location_ids = _create_team()
+
+        TeamLocationAssignment.query.filter_by(game_id=game_id).delete()
+        refresh_team_progress(db.session, game_ids=[game_id])
+        db.session.commit()
+
+        progress = get_team_progress(db.session, team_id)
+        assert (progress.found_count, progress.total) == (0, 0)
+        assert progress.next_location_id is None
+        assert not progress.is_complete
+
+
+def test_moving_an_assignment_refreshes_both_teams(app):
+    with app.app_context():
+        game_id, team_id, location_ids = _create_team()
+        other = Team(name=f'progress-team-{uuid.uuid4().hex[:8]}', game_id=game_id)
+        db.session.add(other)
+        db.session.commit()
+
+        assignment = TeamLocationAssignment.query.filter_by(team_id=team_id, location_id=location_ids[2]).one()
+        assignment.team_id = other.id
+        db.session.commit()
+
+        assert db.session.get(TeamProgress, team_id).total == 2
+        assert db.session.get(TeamProgress, other.id).total == 1
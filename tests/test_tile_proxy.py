@@ -0,0 +1,224 @@
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app import db as _db
+from app.models import Game, Location, Team, TeamLocationAssignment, TeamMembership
+
+
+class _StandInTileHandler(BaseHTTPRequestHandler):
+    """Serves '<z>/<x>/<y>' as the tile body; 404 for zoom 0."""
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        z, x, y = self.path.strip('/').removesuffix('.png').split('/')
+        if z == '0':
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = f"{z}/{x}/{y}".encode().ljust(100, b'.')
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def tile_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StandInTileHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def tile_proxy(app, tile_server, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'TILE_PROXY_ENABLED', True)
+    monkeypatch.setitem(app.config, 'TILE_STORE_PATH', str(tmp_path / 'tiles.mbtiles'))
+    monkeypatch.setitem(app.config, 'TILE_UPSTREAM_URL', f"http://127.0.0.1:{tile_server.server_port}/{{z}}/{{x}}/{{y}}.png")
+    monkeypatch.setitem(app.config, 'TILE_STORE_MAX_BYTES', 0)
+    yield tile_server
+    store = app.extensions.pop('tile_store', None)
+    if store is not None:
+        store.close()
+
+
+def test_tile_proxy_disabled_by_default(client):
+    assert client.get('/tiles/14/100/100.png').status_code == 404
+
+
+def _create_game_around_test_tile():
+    # Tile 14/4221/5981 has its north-west corner at 43.6281, -87.2534.
+    game = Game(name=f"proxy-area-{uuid.uuid4().hex[:8]}", min_lat=43.62, max_lat=43.625,
+                min_lon=-87.25, max_lon=-87.245, data={'offline_zooms': [0, 14]})
+    _db.session.add(game)
+    _db.session.commit()
+    return game.id
+
+
+def test_tile_proxy_fetches_once_then_serves_from_store(app, client, tile_proxy):
+    with app.app_context():
+        _create_game_around_test_tile()
+
+    rv = client.get('/tiles/14/4221/5981.png')
+    assert rv.status_code == 200
+    assert rv.headers['X-Tile-Cache'] == 'MISS'
+    assert 'immutable' in rv.headers['Cache-Control']
+    assert rv.data.startswith(b'14/4221/5981')
+
+    rv = client.get('/tiles/14/4221/5981.png')
+    assert rv.headers['X-Tile-Cache'] == 'HIT'
+    assert rv.data.startswith(b'14/4221/5981')
+    assert tile_proxy.requests == ['/14/4221/5981.png']
+
+    assert client.get('/tiles/3/8/0.png').status_code == 404      # outside the zoom's grid
+    assert client.get('/tiles/0/0/0.png').status_code == 502      # upstream error
+
+
+def test_tile_proxy_does_not_fetch_tiles_outside_every_game(app, client, tile_proxy):
+    from app.tiles.store import get_tile_store
+
+    with app.app_context():
+        _create_game_around_test_tile()
+        get_tile_store(app).put(14, 0, 1, b'stored')
+
+    assert client.get('/tiles/14/0/0.png').status_code == 404     # far from any game
+    assert client.get('/tiles/16/16884/23924.png').status_code == 404  # zoom the game does not use
+    assert tile_proxy.requests == []
+    # Tiles already in the store are still served.
+    assert client.get('/tiles/14/0/1.png').data == b'stored'
+
+
+def test_tile_proxy_fetches_bundle_tiles_of_a_game_without_bounds(app, client, tile_proxy, regular_user_id):
+    from app.main import utils
+
+    # No bounds: the only allowed tiles are the team's corridor, recorded
+    # when its bundle is built.
+    lat, lon = -33.8675, 151.2075
+    (r,) = utils.tile_ranges(lat, lon, lat, lon, [14])
+    url = f"/tiles/14/{r['x_min']}/{r['y_min']}.png"
+    with app.app_context():
+        game = Game(name=f"proxy-route-{uuid.uuid4().hex[:8]}", data={'offline_zooms': [14]})
+        _db.session.add(game)
+        _db.session.flush()
+        location = Location(game_id=game.id, name='Harbour', latitude=lat, longitude=lon)
+        team = Team(name=f"proxy-team-{uuid.uuid4().hex[:8]}", game_id=game.id)
+        _db.session.add_all([location, team])
+        _db.session.flush()
+        _db.session.add(TeamMembership(user_id=regular_user_id, team_id=team.id, role='captain'))
+        _db.session.add(TeamLocationAssignment(team_id=team.id, location_id=location.id, game_id=game.id,
+                                               order_index=0))
+        _db.session.commit()
+        game_id = game.id
+
+    assert client.get(url).status_code == 404
+
+    client.post('/register_or_login', data={'email': 'user@test.com', 'display_name': 'Test User'})
+    try:
+        bundle = client.get(f'/api/game/{game_id}/offline_bundle').get_json()
+        assert bundle['tiles']['count'] > 0
+    finally:
+        client.get('/logout')
+
+    rv = client.get(url)
+    assert rv.status_code == 200
+    assert rv.headers['X-Tile-Cache'] == 'MISS'
+
+
+def test_tile_store_evicts_least_recently_used(app, tmp_path):
+    from app.tiles.store import MBTilesStore
+
+    store = MBTilesStore(str(tmp_path / 'lru.mbtiles'), max_bytes=1000)
+    try:
+        for i in range(8):
+            store.put(10, i, 0, b'x' * 100)
+        assert store.get(10, 0, 0) is not None          # refresh the oldest tile
+
+        for i in range(8, 12):
+            store.put(10, i, 0, b'x' * 100)
+
+        assert store.total_bytes <= 1000
+        assert store.get(10, 0, 0) is not None          # recently used: kept
+        assert store.get(10, 1, 0) is None              # least recently used: evicted
+        assert store.get(10, 11, 0) is not None
+    finally:
+        store.close()
+
+
+def test_prefetch_game_tiles_fills_store_with_limited_concurrency(app, tile_proxy):
+    from app.main import utils
+    from app.tiles.store import get_tile_store, prefetch_game_tiles
+
+    with app.app_context():
+        game = Game(
+            name=f"prefetch-{uuid.uuid4().hex[:8]}",
+            min_lat=44.0, max_lat=44.01, min_lon=-88.0, max_lon=-87.99,
+            data={'offline_zooms': [14, 15]},
+        )
+        _db.session.add(game)
+        _db.session.commit()
+        game_id = game.id
+        expected = utils.count_tiles(utils.tile_ranges(44.0, -88.0, 44.01, -87.99, [14, 15]))
+
+    stats = prefetch_game_tiles(app, game_id)
+    assert stats == {'fetched': expected, 'skipped': 0, 'failed': 0}
+    assert len(tile_proxy.requests) == expected
+
+    # A second run finds everything in the store.
+    assert prefetch_game_tiles(app, game_id)['skipped'] == expected
+    assert len(tile_proxy.requests) == expected
+
+    with app.app_context():
+        store = get_tile_store(app)
+        z, x, y = next(utils.iter_tiles(utils.tile_ranges(44.0, -88.0, 44.01, -87.99, [14])))
+        assert store.get(z, x, y).startswith(f"{z}/{x}/{y}".encode())
+
+
+def test_prefetch_respects_concurrency_limit(app, tile_proxy, monkeypatch):
+    from app.tiles import store as tile_store
+
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+    release = threading.Event()
+
+    def slow_fetch(z, x, y, app=None):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        release.wait(0.05)
+        with lock:
+            in_flight -= 1
+        return b'tile'
+
+    monkeypatch.setattr(tile_store, 'fetch_upstream_tile', slow_fetch)
+    stats = tile_store.prefetch_tiles(app, ((12, x, 0) for x in range(20)), concurrency=3)
+    assert stats['fetched'] == 20
+    assert peak <= 3
+
+
+def test_bundle_points_at_proxy_when_enabled(app, client, tile_proxy):
+    with app.app_context():
+        from app.api.routes import _bundle_tiles
+        game = Game(name=f"proxy-bundle-{uuid.uuid4().hex[:8]}",
+                    min_lat=44.0, max_lat=44.01, min_lon=-88.0, max_lon=-87.99)
+        _db.session.add(game)
+        _db.session.commit()
+
+        with app.test_request_context():
+            assert _bundle_tiles(game)['template'] == '/tiles/{z}/{x}/{y}.png'
+
+    rv = client.get('/api/tile-list', query_string={
+        'min_lat': 44.0, 'min_lng': -88.0, 'max_lat': 44.01, 'max_lng': -87.99, 'zooms': '14',
+    })
+    assert rv.get_json()['template'] == '/tiles/{z}/{x}/{y}.png'
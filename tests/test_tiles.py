@@ -0,0 +1,110 @@
+TEMPLATE = "https://tile.openstreetmap.org/{z}/{x}/{y}.png"
+
+
+def _expand(ranges, template):
+    return [
+        template.format(z=r['z'], x=x, y=y)
+        for r in ranges
+        for x in range(r['x_min'], r['x_max'] + 1)
+        for y in range(r['y_min'], r['y_max'] + 1)
+    ]
+
+
+def test_tile_ranges_match_explicit_enumeration(app):
+    from app.main import utils
+
+    ranges = utils.tile_ranges(44.0, -88.0, 44.02, -87.97, [16, 14, 15, 14])
+    assert [r['z'] for r in ranges] == [14, 15, 16]
+
+    urls = _expand(ranges, TEMPLATE)
+    assert len(urls) == len(set(urls)) == utils.count_tiles(ranges)
+    assert list(utils.iter_tile_urls(ranges, TEMPLATE)) == urls
+
+    # Paging skips ahead arithmetically and lines up with the full listing.
+    assert list(utils.iter_tile_urls(ranges, TEMPLATE, offset=3, limit=7)) == urls[3:10]
+    assert list(utils.iter_tile_urls(ranges, TEMPLATE, offset=len(urls))) == []
+
+
+def test_cap_tile_ranges_drops_highest_zooms(app):
+    from app.main import utils
+
+    ranges = utils.tile_ranges(44.0, -88.0, 44.1, -87.9, [12, 13, 17, 18])
+    kept, dropped = utils.cap_tile_ranges(ranges, max_tiles=200)
+    assert dropped == [17, 18]
+    assert [r['z'] for r in kept] == [12, 13]
+    assert utils.count_tiles(kept) <= 200
+
+
+def test_tile_list_compact_and_paged(client):
+    params = {'min_lat': 44.0, 'min_lng': -88.0, 'max_lat': 44.02, 'max_lng': -87.97, 'zooms': '14,15'}
+
+    compact = client.get('/api/tile-list', query_string=params).get_json()
+    assert 'urls' not in compact
+    assert compact['count'] == sum(
+        (r['x_max'] - r['x_min'] + 1) * (r['y_max'] - r['y_min'] + 1) for r in compact['ranges']
+    )
+    expected = _expand(compact['ranges'], compact['template'])
+
+    urls = []
+    offset = 0
+    while offset is not None:
+        page = client.get('/api/tile-list', query_string={**params, 'format': 'urls', 'offset': offset, 'limit': 4}).get_json()
+        assert page['count'] == compact['count']
+        urls.extend(page['urls'])
+        offset = page['next_offset']
+    assert urls == expected
+
+
+def test_tile_list_rejects_bad_or_oversized_requests(client):
+    assert client.get('/api/tile-list', query_string={'min_lat': 44.0}).status_code == 400
+
+    rv = client.get('/api/tile-list', query_string={
+        'min_lat': 40.0, 'min_lng': -90.0, 'max_lat': 45.0, 'max_lng': -85.0, 'zooms': '18',
+    })
+    assert rv.status_code == 400
+    assert rv.get_json()['count'] > rv.get_json()['max_count']
+
+    rv = client.get('/api/tile-list', query_string={
+        'min_lat': 44.0, 'min_lng': -88.0, 'max_lat': 44.1, 'max_lng': -87.9, 'zooms': '25',
+    })
+    assert rv.status_code == 400
+
+
+def test_route_corridor_is_smaller_than_bounding_box(app):
+    from app.main import tile_selector, utils
+
+    # An L-shaped route across a ~4 km box: the corridor skips the far corner.
+    points = [(44.0, -88.0), (44.0, -87.95), (44.035, -87.95)]
+    zooms = [15, 16]
+    corridor = tile_selector.select_route_tiles(points, zooms, buffer_m=100)
+    disks = tile_selector.select_route_tiles(points, zooms, buffer_m=100, mode='disks')
+    box = utils.tile_ranges(44.0, -88.0, 44.035, -87.95, zooms)
+
+    assert utils.count_tiles(disks) < utils.count_tiles(corridor) < utils.count_tiles(box)
+
+    corridor_tiles = set(utils.iter_tiles(corridor))
+    buffered_box = utils.tile_ranges(43.998, -88.003, 44.037, -87.947, zooms)
+    assert corridor_tiles <= set(utils.iter_tiles(buffered_box))
+    assert len(corridor_tiles) == utils.count_tiles(corridor)  # merged ranges do not overlap
+    for lat, lon in points:
+        for z in zooms:
+            assert (z, *utils.latlng_to_tile(lat, lon, z)) in corridor_tiles
+
+    # The far corner of the box is never visited.
+    assert (16, *utils.latlng_to_tile(44.034, -87.999, 16)) not in corridor_tiles
+
+
+def test_byte_budget_drops_highest_zooms_first(app):
+    from app.main import tile_selector, utils
+
+    ranges = tile_selector.select_route_tiles([(44.0, -88.0), (44.02, -87.98)], [14, 15, 16, 17], buffer_m=200)
+    per_zoom = {z: utils.count_tiles([r for r in ranges if r['z'] == z]) for z in (14, 15, 16, 17)}
+
+    budget = (per_zoom[14] + per_zoom[15] + per_zoom[16]) * 1000
+    kept, dropped, estimated = tile_selector.apply_byte_budget(ranges, budget, avg_tile_bytes=1000)
+    assert dropped == [17]
+    assert {r['z'] for r in kept} == {14, 15, 16}
+    assert estimated <= budget
+
+    kept, dropped, _ = tile_selector.apply_byte_budget(ranges, per_zoom[14] * 1000, avg_tile_bytes=1000)
+    assert dropped == [15, 16, 17]
@@ -0,0 +1,97 @@
+import uuid
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Game, Location, Team, TeamLocationAssignment, TeamMembership, Tombstone
+
+
+def _login_existing_user(client, email='user@test.com', display_name='Test User'):
+    return client.post(
+        '/register_or_login',
+        data={'email': email, 'display_name': display_name},
+        follow_redirects=False,
+    )
+
+
+def _create_tombstone_team(user_id):
+    game = Game(name=f"tombstone-{uuid.uuid4().hex[:8]}")
+    db.session.add(game)
+    db.session.flush()
+
+    location = Location(game_id=game.id, name='Grave Marker', latitude=44.0, longitude=-88.0)
+    team = Team(name='Tombstone Team', game_id=game.id)
+    db.session.add_all([location, team])
+    db.session.flush()
+
+    db.session.add(TeamMembership(user_id=user_id, team_id=team.id, role='captain'))
+    assignment = TeamLocationAssignment(team_id=team.id, location_id=location.id, game_id=game.id)
+    db.session.add(assignment)
+    db.session.commit()
+    return {
+        'game_id': game.id,
+        'team_id': team.id,
+        'location_id': location.id,
+        'assignment_id': assignment.id,
+    }
+
+
+def test_tombstone_expires_and_is_purged(app):
+    from app.main.cache import add_tombstone, is_tombstoned, purge_expired_tombstones
+
+    with app.app_context():
+        add_tombstone('test:live', ttl_seconds=60)
+        add_tombstone('test:expired', ttl_seconds=60)
+        db.session.commit()
+        assert is_tombstoned('test:live')
+
+        db.session.get(Tombstone, 'test:expired').expires_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        assert not is_tombstoned('test:expired')
+
+        assert purge_expired_tombstones() >= 1
+        assert db.session.get(Tombstone, 'test:expired') is None
+        assert db.session.get(Tombstone, 'test:live') is not None
+
+
+def test_admin_delete_writes_tombstone_and_blocks_legacy_found(app, client, regular_user_id):
+    from app.main.cache import assignment_tombstone_key, is_tombstoned
+
+    with app.app_context():
+        state = _create_tombstone_team(regular_user_id)
+
+    _login_existing_user(client, 'admin@test.com', 'Admin User')
+    rv = client.post('/admin/teamlocationassignment/delete/', data={'id': state['assignment_id']})
+    assert rv.status_code in (200, 302)
+
+    with app.app_context():
+        assert db.session.get(TeamLocationAssignment, state['assignment_id']) is None
+        assert is_tombstoned(assignment_tombstone_key(state['team_id'], state['location_id'], state['game_id']))
+
+    client.get('/logout')
+    _login_existing_user(client)
+    rv = client.post('/api/location/found', json={
+        'team_id': state['team_id'],
+        'location_id': state['location_id'],
+        'game_id': state['game_id'],
+        'method': 'direct',
+    })
+    assert rv.status_code == 409
+
+
+def test_sync_batch_replay_is_answered_from_idempotency_store(app, client, regular_user_id):
+    with app.app_context():
+        state = _create_tombstone_team(regular_user_id)
+
+    _login_existing_user(client)
+    event = {
+        'game_id': state['game_id'],
+        'location_id': state['location_id'],
+        'method': 'direct',
+        'client_event_id': f"evt-{uuid.uuid4().hex}",
+    }
+    first = client.post('/api/sync/batch', json={'events': [event]}).get_json()
+    assert first['results'][0]['status'] == 'synced'
+
+    second = client.post('/api/sync/batch', json={'events': [event]}).get_json()
+    assert second['results'][0]['status'] == 'duplicate'
+    assert second['results'][0]['replayed'] is True
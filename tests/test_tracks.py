@@ -0,0 +1,177 @@
+import uuid
+
+import numpy as np
+
+from app import db
+from app.models import Game, GameType, Team, TeamMembership, TrackChunk
+from app.tracks import (TrackBuffer, decode_chunk, encode_chunk, flush_tracks, get_track_buffer, parse_samples,
+                        simplify_mask)
+
+
+def _create_team(user_id=None):
+    gametype = GameType.query.filter_by(name='findloc').first()
+    if not gametype:
+        gametype = GameType(name='findloc')
+        db.session.add(gametype)
+
+    game = Game(name=f'tracks-{uuid.uuid4().hex[:8]}', gametype=gametype, discoverable='public', mode='open')
+    db.session.add(game)
+    db.session.flush()
+    team = Team(name=f'tracks-team-{uuid.uuid4().hex[:8]}', game_id=game.id)
+    db.session.add(team)
+    db.session.flush()
+    if user_id is not None:
+        db.session.add(TeamMembership(user_id=user_id, team_id=team.id, role='captain'))
+    db.session.commit()
+    return team.id
+
+
+def test_chunk_round_trip_keeps_microdegree_precision():
+    rng = np.random.default_rng(7)
+    n = 500
+    t_ms = 1_760_000_000_000 + np.cumsum(rng.integers(900, 1100, n))
+    lat = 44.05 + np.cumsum(rng.normal(0, 1e-5, n))
+    lon = -88.12 + np.cumsum(rng.normal(0, 1e-5, n))
+    acc = rng.uniform(3, 30, n)
+    acc[10] = np.nan
+
+    blob = encode_chunk(t_ms, lat, lon, acc)
+    out_t, out_lat, out_lon, out_acc = decode_chunk(blob)
+
+    assert np.array_equal(out_t, t_ms)
+    assert np.abs(out_lat - lat).max() <= 5e-7
+    assert np.abs(out_lon - lon).max() <= 5e-7
+    assert np.isnan(out_acc[10])
+    assert np.array_equal(np.delete(out_acc, 10), np.rint(np.delete(acc, 10)))
+    # Raw float64 columns would be 32 bytes per sample.
+    assert len(blob) < n * 12
+
+    single = decode_chunk(encode_chunk([5], [1.5], [2.5], [np.nan]))
+    assert single[0].tolist() == [5] and single[1].tolist() == [1.5]
+
+
+def test_simplify_keeps_endpoints_and_corners():
+    # An L: east along the equator, then north, with jitter well under 5 m.
+    east = np.linspace(0, 0.01, 50)
+    north = np.linspace(0, 0.01, 50)[1:]
+    lon = np.concatenate([east, np.full(49, 0.01)])
+    lat = np.concatenate([np.zeros(50), north])
+    lat[1:-1] += np.where(np.arange(1, 98) % 2, 1e-6, -1e-6)
+
+    keep = simplify_mask(lat, lon, 5)
+    assert np.flatnonzero(keep).tolist() == [0, 49, 98]
+    assert simplify_mask(lat, lon, 0).all()
+
+
+def test_parse_samples_accepts_rows_and_dicts_and_rejects_bad_ones():
+    (t_ms, lat, lon, acc), rejected = parse_samples([
+        [1000, 44.0, -88.0, 5],
+        {'t': 2000, 'lat': 44.1, 'lon': -88.1},
+        [None, 44.2, -88.2],
+        [3000, 91, 0],
+        [4000, 'x', 0],
+        'junk',
+    ], now_ms=10_000)
+
+    assert rejected == 3
+    assert t_ms.tolist() == [1000, 2000, 10_000]
+    assert lat.tolist() == [44.0, 44.1, 44.2]
+    assert acc[0] == 5 and np.isnan(acc[1])
+
+
+def test_buffer_flushes_when_full_or_old():
+    now = [0.0]
+    buffer = TrackBuffer(chunk_max_points=3, flush_seconds=10, clock=lambda: now[0])
+    sample = (np.array([1]), np.array([1.0]), np.array([2.0]), np.array([np.nan]))
+
+    buffer.add(1, 9, sample)
+    buffer.add(2, 9, sample)
+    assert buffer.take(due_only=True) == {}
+
+    buffer.add(1, 9, sample)
+    buffer.add(1, 9, sample)
+    assert list(buffer.take(due_only=True)) == [1]
+
+    now[0] = 11
+    taken = buffer.take(due_only=True)
+    assert list(taken) == [2] and taken[2][0] == 9
+    assert buffer.buffered(2) == 0
+
+
+def test_failed_flush_puts_samples_back(app):
+    class FailingSession:
+        rolled_back = False
+
+        def connection(self):
+            raise RuntimeError("database is down")
+
+        def commit(self):
+            raise AssertionError("commit after a failed write")
+
+        def rollback(self):
+            self.rolled_back = True
+
+    with app.app_context():
+        team_id = _create_team()
+        buffer = get_track_buffer()
+        buffer.add(team_id, 1, (np.array([1, 2]), np.array([1.0, 1.1]), np.array([2.0, 2.1]), np.full(2, np.nan)))
+
+        session = FailingSession()
+        try:
+            flush_tracks(session, team_ids=[team_id])
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("expected the write error to propagate")
+        assert session.rolled_back
+        assert buffer.buffered(team_id) == 2
+
+        buffer.add(team_id, 1, (np.array([3]), np.array([1.2]), np.array([2.2]), np.array([5.0])))
+        assert flush_tracks(db.session, team_ids=[team_id]) == 3
+        assert TrackChunk.query.filter_by(team_id=team_id).one().point_count == 3
+
+
+def test_track_endpoint_ingests_and_reads_back_in_one_chunk_scan(app, client, regular_user_id):
+    with app.app_context():
+        team_id = _create_team(regular_user_id)
+
+    client.post('/register_or_login', data={'email': 'user@test.com', 'display_name': 'Test User'})
+    try:
+        url = f'/api/team/{team_id}/track'
+        # Sent newest batch first: reads come back in time order anyway.
+        second = [[1_760_000_060_000 + i * 1000, 44.01 + i * 1e-5, -88.0, 4] for i in range(60)]
+        first = [[1_760_000_000_000 + i * 1000, 44.0 + i * 1e-5, -88.0, None] for i in range(60)]
+        response = client.post(url, json={'samples': second + [['bad']]})
+        assert response.status_code == 202
+        assert response.get_json()['accepted'] == 60
+        assert response.get_json()['rejected'] == 1
+        assert client.post(url, json={'samples': first}).get_json()['buffered'] == 120
+
+        track = client.get(url).get_json()
+        assert track['count'] == 120
+        times = [point[0] for point in track['points']]
+        assert times == sorted(times) and times[0] == first[0][0]
+        assert track['points'][0][3] is None and track['points'][-1][3] == 4
+        assert track['points'][-1][1] == second[-1][1]
+
+        with app.app_context():
+            assert TrackChunk.query.filter_by(team_id=team_id).count() == 1
+            assert get_track_buffer().buffered(team_id) == 0
+
+        # A straight line simplifies to its two ends.
+        assert client.get(f'{url}?simplify=5').get_json()['count'] == 2
+
+        assert client.post(url, json={'samples': 'nope'}).status_code == 400
+    finally:
+        client.get('/logout')
+
+
+def test_track_endpoint_requires_team_membership(app, client):
+    with app.app_context():
+        team_id = _create_team()
+    client.post('/register_or_login', data={'email': 'user@test.com', 'display_name': 'Test User'})
+    try:
+        assert client.post(f'/api/team/{team_id}/track', json={'samples': []}).status_code == 403
+        assert client.get(f'/api/team/{team_id}/track').status_code == 403
+    finally:
+        client.get('/logout')
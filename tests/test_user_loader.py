@@ -0,0 +1,83 @@
+import uuid
+
+from sqlalchemy import event
+
+from app import db
+from app.models import Role, User, UserRole
+from app.users import clear_user_cache, load_user
+
+
+def _create_user():
+    user = User(email=f'loader-{uuid.uuid4().hex[:8]}@test.com', display_name='Loader')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(UserRole(user_id=user.id, role_id=Role.query.filter_by(name='user').one().id))
+    db.session.commit()
+    return user.id
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(db.engine, 'before_cursor_execute', self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(db.engine, 'before_cursor_execute', self)
+
+
+def test_loader_primes_roles_and_caches(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'USER_CACHE_TTL_SECONDS', 10)
+    with app.app_context():
+        user_id = _create_user()
+        clear_user_cache()
+        db.session.expunge_all()
+
+        with _QueryCounter() as counter:
+            user = load_user(str(user_id))
+            assert user.role_names == frozenset({'user'})
+            assert not user.is_admin
+            assert user.has_role('user')
+        assert counter.count == 1
+
+        db.session.expunge_all()
+        with _QueryCounter() as counter:
+            cached = load_user(user_id)
+            assert cached.id == user_id
+            assert cached.email.startswith('loader-')
+            assert cached.role_names == frozenset({'user'})
+        assert counter.count == 0
+
+
+def test_role_change_invalidates_cached_user(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'USER_CACHE_TTL_SECONDS', 10)
+    with app.app_context():
+        user_id = _create_user()
+        assert not load_user(user_id).is_admin
+
+        db.session.add(UserRole(user_id=user_id, role_id=Role.query.filter_by(name='admin').one().id))
+        db.session.commit()
+        assert load_user(user_id).is_admin
+
+        db.session.expunge_all()
+        assert load_user(user_id).is_admin
+
+
+def test_loader_respects_disabled_cache(app):
+    # Disabled by default.
+    assert app.config['USER_CACHE_TTL_SECONDS'] == 0
+    with app.app_context():
+        user_id = _create_user()
+        clear_user_cache()
+        db.session.expunge_all()
+        with _QueryCounter() as counter:
+            load_user(user_id)
+            db.session.expunge_all()
+            load_user(user_id)
+        assert counter.count == 2
+        assert load_user('not-a-number') is None